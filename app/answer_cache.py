@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_PATH,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class _Entry:
+    __slots__ = ("context_key", "vector", "answer", "sources", "created")
+
+    def __init__(self, context_key: str, vector: np.ndarray, answer: str, sources: List[str], created: float) -> None:
+        self.context_key = context_key
+        self.vector = vector
+        self.answer = answer
+        self.sources = sources
+        self.created = created
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def context_key(hits: List[Dict], max_tokens: int) -> str:
+    # The same chunks (in rank order) and generation budget produce an equivalent prompt.
+    ids = "|".join(str(h.get("id", f'{h.get("source")}#{h.get("chunk_index")}')) for h in hits)
+    return hashlib.sha1(f"{max_tokens}|{ids}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Semantic cache of RAG answers keyed on query embedding + retrieved chunk ids."""
+
+    def __init__(self, max_entries: int, threshold: float, ttl: float, path: str = "") -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_context: Dict[str, Set[int]] = {}
+        self._by_source: Dict[str, Set[int]] = {}
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, query_vector: List[float], hits: List[Dict], max_tokens: int) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+        candidates = self._by_context.get(context_key(hits, max_tokens))
+        if not candidates:
+            self.misses += 1
+            return None
+        q = _unit(query_vector)
+        now = time.time()
+        best_id, best_score = None, self.threshold
+        for entry_id in list(candidates):
+            entry = self._entries[entry_id]
+            if self.ttl and now - entry.created > self.ttl:
+                self._drop(entry_id)
+                continue
+            if entry.vector.shape != q.shape:
+                continue
+            score = float(np.dot(entry.vector, q))
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        if best_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        logger.info("Answer cache: hit similarity=%.4f", best_score)
+        return self._entries[best_id].answer
+
+    def store(self, query_vector: List[float], hits: List[Dict], max_tokens: int, answer: str) -> None:
+        if self.max_entries <= 0 or not answer.strip():
+            return
+        sources = sorted({str(h.get("source", "unknown")) for h in hits})
+        self._add(_Entry(context_key(hits, max_tokens), _unit(query_vector), answer, sources, time.time()))
+
+    def _add(self, entry: _Entry) -> None:
+        entry_id = next(self._ids)
+        self._entries[entry_id] = entry
+        self._by_context.setdefault(entry.context_key, set()).add(entry_id)
+        for source in entry.sources:
+            self._by_source.setdefault(source, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate_source(self, source: str) -> int:
+        entry_ids = self._by_source.pop(source, set())
+        for entry_id in entry_ids:
+            self._drop(entry_id)
+        if entry_ids:
+            self.invalidations += len(entry_ids)
+            logger.info("Answer cache: invalidated entries=%d source=%s", len(entry_ids), source)
+        return len(entry_ids)
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._by_context.get(entry.context_key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_context[entry.context_key]
+        for source in entry.sources:
+            ids = self._by_source.get(source)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_source[source]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        rows = [
+            {
+                "context_key": e.context_key,
+                "vector": e.vector.tolist(),
+                "answer": e.answer,
+                "sources": e.sources,
+                "created": e.created,
+            }
+            for e in self._entries.values()
+        ]
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp, self.path)
+        logger.info("Answer cache: saved entries=%d path=%s", len(rows), self.path)
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except Exception as e:
+            logger.warning("Answer cache: load failed path=%s: %s", self.path, e)
+            return
+        now = time.time()
+        for row in rows:
+            if self.ttl and now - row["created"] > self.ttl:
+                continue
+            self._add(_Entry(row["context_key"], np.asarray(row["vector"], dtype=np.float32), row["answer"], row["sources"], row["created"]))
+        logger.info("Answer cache: loaded entries=%d path=%s", len(self._entries), self.path)
+
+
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+    path=ANSWER_CACHE_PATH,
+)
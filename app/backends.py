@@ -0,0 +1,366 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import logging
+import time
+
+import httpx
+
+from .config import (
+    LLAMA_BASES,
+    EMBEDDINGS_BASES,
+    LLM_TIMEOUT,
+    LLM_CONNECT_TIMEOUT,
+    LLM_MAX_CONCURRENCY,
+    EMBEDDINGS_TIMEOUT,
+    EMBEDDINGS_CONNECT_TIMEOUT,
+    EMBEDDINGS_MAX_CONCURRENCY,
+    HTTP_MAX_KEEPALIVE,
+    BACKEND_HEALTH_INTERVAL,
+    BACKEND_HEALTH_PATH,
+    BACKEND_HEALTH_TIMEOUT,
+    BACKEND_FAILURE_THRESHOLD,
+    BACKEND_COOLDOWN_S,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+# Statuses that mean the node itself is down or overloaded. Any other response (4xx, or a 500 for
+# one bad prompt) shows the node is up, so it neither trips the circuit nor moves the call elsewhere.
+_NODE_DOWN_STATUSES = (502, 503, 504)
+# Errors raised before the request reached the node: safe to send to another one.
+_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class Backend:
+    """Shared keep-alive HTTP client for one upstream, with a concurrency cap."""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float,
+        connect_timeout: float,
+        max_concurrency: int,
+    ) -> None:
+        self.name = name
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_concurrency = max(1, max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Utilization: wall time with at least one request in flight.
+        self.requests = 0
+        self._in_flight = 0
+        self._busy_s = 0.0
+        self._busy_since = 0.0
+        # Pool bookkeeping: calls routed here and not finished (queued on the semaphore included),
+        # circuit breaker state, last health probe latency, per-node API details (e.g. embeddings path).
+        self.pending = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.probe_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.capabilities: Dict[str, Any] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=min(self.max_concurrency, HTTP_MAX_KEEPALIVE),
+                ),
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _enter(self) -> None:
+        if not self._in_flight:
+            self._busy_since = time.perf_counter()
+        self._in_flight += 1
+        self.requests += 1
+
+    def _exit(self) -> None:
+        self._in_flight -= 1
+        if not self._in_flight:
+            self._busy_s += time.perf_counter() - self._busy_since
+
+    @property
+    def busy_s(self) -> float:
+        if self._in_flight:
+            return self._busy_s + time.perf_counter() - self._busy_since
+        return self._busy_s
+
+    @property
+    def circuit_open(self) -> bool:
+        return self.failures >= BACKEND_FAILURE_THRESHOLD and time.monotonic() < self.open_until
+
+    def record_success(self) -> None:
+        if self.failures >= BACKEND_FAILURE_THRESHOLD:
+            logger.info("Backend %s: %s recovered", self.name, self.base_url)
+        self.failures = 0
+
+    def record_failure(self, error: str) -> None:
+        self.failures += 1
+        self.last_error = error
+        if self.failures >= BACKEND_FAILURE_THRESHOLD:
+            # Past the cooldown the circuit is half-open: one more failure re-opens it straight away.
+            if not self.circuit_open:
+                logger.warning(
+                    "Backend %s: %s marked down for %.0fs after %d failures (%s)",
+                    self.name, self.base_url, BACKEND_COOLDOWN_S, self.failures, error,
+                )
+            self.open_until = time.monotonic() + BACKEND_COOLDOWN_S
+
+    def _timeout(self, timeout: Optional[float]) -> Any:
+        # Per-call cap (e.g. what is left of a client deadline); the backend default otherwise.
+        if timeout is None:
+            return httpx.USE_CLIENT_DEFAULT
+        return httpx.Timeout(timeout, connect=min(timeout, self.timeout.connect or timeout))
+
+    async def post(self, path: str, json: Dict[str, Any], timeout: Optional[float] = None) -> httpx.Response:
+        async with self.semaphore:
+            self._enter()
+            try:
+                return await self.client.post(path, json=json, timeout=self._timeout(timeout))
+            finally:
+                self._exit()
+
+    @asynccontextmanager
+    async def stream(self, path: str, json: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[httpx.Response]:
+        async with self.semaphore:
+            self._enter()
+            try:
+                async with self.client.stream("POST", path, json=json, timeout=self._timeout(timeout)) as r:
+                    yield r
+            finally:
+                self._exit()
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+def _describe(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+
+class BackendPool:
+    """One or more upstreams of the same kind behind the Backend call interface.
+
+    Calls go to the node with the fewest outstanding requests whose circuit is closed. Connection
+    errors, timeouts and 502/503/504 count as node failures; enough in a row open the circuit for
+    BACKEND_COOLDOWN_S. Calls that never reached a node are retried on the next one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_urls: List[str],
+        timeout: float,
+        connect_timeout: float,
+        max_concurrency: int,
+    ) -> None:
+        self.name = name
+        self.nodes = [Backend(name, url, timeout, connect_timeout, max_concurrency) for url in base_urls]
+        self._probe_client: Optional[httpx.AsyncClient] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    @property
+    def requests(self) -> int:
+        return sum(n.requests for n in self.nodes)
+
+    @property
+    def busy_s(self) -> float:
+        # Mean over nodes, so busy_s / elapsed stays a 0..1 utilization.
+        return sum(n.busy_s for n in self.nodes) / len(self.nodes)
+
+    def _pick(self, tried: List[Backend]) -> Optional[Backend]:
+        candidates = [n for n in self.nodes if n not in tried]
+        if not candidates:
+            return None
+        closed = [n for n in candidates if not n.circuit_open]
+        if not closed:
+            # Everything left is marked down: try the node due back first rather than fail outright.
+            return min(candidates, key=lambda n: n.open_until)
+        return min(closed, key=lambda n: (n.pending, n.probe_ms or 0.0))
+
+    def _failed(self, node: Backend, error: str, retry: bool) -> None:
+        node.record_failure(error)
+        logger.warning(
+            "Backend %s: %s failed (%s)%s", self.name, node.base_url, error, ", trying next node" if retry else ""
+        )
+
+    async def call(self, fn: Callable[[Backend], Awaitable[Any]]) -> Any:
+        # fn runs against a single node (e.g. several posts in one embeddings call).
+        tried: List[Backend] = []
+        while True:
+            node = self._pick(tried)
+            tried.append(node)
+            retry = len(tried) < len(self.nodes)
+            node.pending += 1
+            try:
+                result = await fn(node)
+            except _RETRYABLE_ERRORS as e:
+                self._failed(node, _describe(e), retry)
+                if retry:
+                    continue
+                raise
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in _NODE_DOWN_STATUSES:
+                    self._failed(node, f"HTTP {e.response.status_code}", retry)
+                    if retry:
+                        continue
+                raise
+            except httpx.TransportError as e:
+                # Read timeouts and dropped connections: the node may have done the work, so no retry.
+                self._failed(node, _describe(e), False)
+                raise
+            finally:
+                node.pending -= 1
+            if isinstance(result, httpx.Response) and result.status_code in _NODE_DOWN_STATUSES:
+                self._failed(node, f"HTTP {result.status_code}", retry)
+                if retry:
+                    continue
+                return result
+            node.record_success()
+            return result
+
+    async def post(self, path: str, json: Dict[str, Any], timeout: Optional[float] = None) -> httpx.Response:
+        return await self.call(lambda node: node.post(path, json=json, timeout=timeout))
+
+    @asynccontextmanager
+    async def stream(self, path: str, json: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[httpx.Response]:
+        # Fails over only until the response headers arrive; after that the body belongs to the caller.
+        tried: List[Backend] = []
+        while True:
+            node = self._pick(tried)
+            tried.append(node)
+            retry = len(tried) < len(self.nodes)
+            node.pending += 1
+            try:
+                async with AsyncExitStack() as stack:
+                    try:
+                        r = await stack.enter_async_context(node.stream(path, json=json, timeout=timeout))
+                    except _RETRYABLE_ERRORS as e:
+                        self._failed(node, _describe(e), retry)
+                        if retry:
+                            continue
+                        raise
+                    except httpx.TransportError as e:
+                        self._failed(node, _describe(e), False)
+                        raise
+                    if r.status_code in _NODE_DOWN_STATUSES:
+                        self._failed(node, f"HTTP {r.status_code}", retry)
+                        if retry:
+                            continue
+                    else:
+                        node.record_success()
+                    try:
+                        yield r
+                    except httpx.TransportError as e:
+                        self._failed(node, _describe(e), False)
+                        raise
+                    return
+            finally:
+                node.pending -= 1
+
+    async def _check(self, node: Backend) -> None:
+        # Separate client: a node with every pooled connection busy generating is slow, not down.
+        if self._probe_client is None or self._probe_client.is_closed:
+            self._probe_client = httpx.AsyncClient(timeout=BACKEND_HEALTH_TIMEOUT)
+        start = time.perf_counter()
+        try:
+            r = await self._probe_client.get(f"{node.base_url}{BACKEND_HEALTH_PATH}")
+        except httpx.HTTPError as e:
+            node.record_failure(f"health check: {_describe(e)}")
+            return
+        node.probe_ms = (time.perf_counter() - start) * 1000
+        if r.status_code in _NODE_DOWN_STATUSES:
+            node.record_failure(f"health check: HTTP {r.status_code}")
+        else:
+            node.record_success()
+
+    async def check_health(self) -> None:
+        await asyncio.gather(*(self._check(n) for n in self.nodes))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(BACKEND_HEALTH_INTERVAL)
+            await self.check_health()
+
+    async def start(self) -> None:
+        await self.check_health()
+        for node in self.nodes:
+            if node.failures:
+                logger.warning("Backend %s: %s not reachable at startup (%s)", self.name, node.base_url, node.last_error)
+        if BACKEND_HEALTH_INTERVAL > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "nodes": [
+                {
+                    "base_url": n.base_url,
+                    "up": not n.circuit_open,
+                    "retry_in_s": round(n.open_until - now, 1) if n.circuit_open else 0.0,
+                    "pending": n.pending,
+                    "requests": n.requests,
+                    "consecutive_failures": n.failures,
+                    "last_error": n.last_error,
+                    "probe_ms": round(n.probe_ms, 2) if n.probe_ms is not None else None,
+                    "capabilities": dict(n.capabilities),
+                }
+                for n in self.nodes
+            ]
+        }
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        if self._probe_client is not None:
+            await self._probe_client.aclose()
+            self._probe_client = None
+        for node in self.nodes:
+            await node.aclose()
+
+
+llm_backend = BackendPool(
+    "llm",
+    LLAMA_BASES,
+    timeout=LLM_TIMEOUT,
+    connect_timeout=LLM_CONNECT_TIMEOUT,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+)
+
+embeddings_backend = BackendPool(
+    "embeddings",
+    EMBEDDINGS_BASES,
+    timeout=EMBEDDINGS_TIMEOUT,
+    connect_timeout=EMBEDDINGS_CONNECT_TIMEOUT,
+    max_concurrency=EMBEDDINGS_MAX_CONCURRENCY,
+)
+
+
+async def start_backends() -> None:
+    # Initial health round (so dead nodes are skipped from the first request) + periodic checks.
+    for backend in (llm_backend, embeddings_backend):
+        await backend.start()
+
+
+async def close_backends() -> None:
+    for backend in (llm_backend, embeddings_backend):
+        await backend.aclose()
@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import glob
+import logging
+import os
+import re
+import time
+
+from .backends import close_backends, embeddings_backend
+from .chunking import Chunk, document_chunks
+from .config import BULK_WORKERS, BULK_CONCURRENT_DOCS, BULK_WINDOW_CHUNKS, BULK_EXTENSIONS
+from .embeddings import embedding_cache
+from .index_lock import acquire_index_lock, release_index_lock
+from .ingest import aiter_list, ingest_chunks
+from .vector_store import close as close_store, load as load_store
+
+logger = logging.getLogger("uvicorn.error")
+
+# Control characters other than tab/newline (NULs from PDF extraction, form feeds, ...).
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+
+def expand_paths(args: List[str]) -> List[Tuple[str, str]]:
+    # (path, source) for every file named by a directory, glob or file argument.
+    # Sources are paths relative to the directory (or glob root), so re-runs diff cleanly.
+    out: List[Tuple[str, str]] = []
+    seen = set()
+    for arg in args:
+        if os.path.isdir(arg):
+            root = arg
+            paths = []
+            for dirpath, _, files in os.walk(arg):
+                paths.extend(os.path.join(dirpath, f) for f in files if f.lower().endswith(BULK_EXTENSIONS))
+        elif glob.has_magic(arg):
+            # Root is the directory part before the first wildcard.
+            parts = arg.replace(os.sep, "/").split("/")
+            fixed = next(i for i, p in enumerate(parts) if glob.has_magic(p))
+            root = "/".join(parts[:fixed]) or ("/" if arg.startswith("/") else ".")
+            paths = glob.glob(arg, recursive=True)
+        else:
+            root = os.path.dirname(arg) or "."
+            paths = [arg]
+        for path in sorted(paths):
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                out.append((path, os.path.relpath(path, root).replace(os.sep, "/")))
+    return out
+
+
+def normalize_text(text: str) -> str:
+    text = text.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    return _CONTROL_RE.sub(" ", text)
+
+
+def prepare_document(path: str) -> Tuple[int, List[Union[Chunk, str]]]:
+    # Runs in a worker process: read, normalize and chunk one file.
+    with open(path, "rb") as f:
+        raw = f.read()
+    return len(raw), document_chunks(normalize_text(raw.decode("utf-8", errors="ignore")))
+
+
+async def bulk_ingest(
+    files: List[Tuple[str, str]],
+    on_progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    # Chunking fans out to a process pool; prepared documents queue up for BULK_CONCURRENT_DOCS
+    # ingest workers that share the embeddings connection pool and batch sizer and write
+    # straight to the vector store (no HTTP hop through the API, which must be stopped: it would
+    # not see these writes and would overwrite the saved lexicon; see index_lock).
+    workers = BULK_WORKERS or os.cpu_count() or 1
+    consumers = max(1, BULK_CONCURRENT_DOCS)
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Optional[Tuple[str, int, List]]]" = asyncio.Queue(maxsize=workers * 2)
+    totals = {
+        "docs": 0, "failed": 0, "bytes": 0, "chunks": 0,
+        "upserted": 0, "moved": 0, "unchanged": 0, "duplicates": 0, "deleted": 0,
+        "prepare_s": 0.0,
+    }
+    errors: List[Dict[str, str]] = []
+    start = time.perf_counter()
+    busy_start = embeddings_backend.busy_s
+    requests_start = embeddings_backend.requests
+
+    def snapshot() -> Dict:
+        elapsed = time.perf_counter() - start
+        return {
+            **totals,
+            "prepare_s": round(totals["prepare_s"], 3),
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_s": round(totals["docs"] / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_s": round(totals["chunks"] / elapsed, 1) if elapsed else 0.0,
+            "embedded_per_s": round(totals["upserted"] / elapsed, 1) if elapsed else 0.0,
+            "embed_requests": embeddings_backend.requests - requests_start,
+            "embed_utilization": round((embeddings_backend.busy_s - busy_start) / elapsed, 3) if elapsed else 0.0,
+            "chunk_workers": workers,
+        }
+
+    async def prepare(pool: ProcessPoolExecutor, path: str, source: str, slots: asyncio.Semaphore) -> None:
+        try:
+            t0 = time.perf_counter()
+            size, chunks = await loop.run_in_executor(pool, prepare_document, path)
+            totals["prepare_s"] += time.perf_counter() - t0
+            await queue.put((source, size, chunks))
+        except Exception as e:
+            totals["failed"] += 1
+            errors.append({"source": source, "error": str(e)})
+        finally:
+            slots.release()
+
+    async def produce(pool: ProcessPoolExecutor) -> None:
+        slots = asyncio.Semaphore(workers * 2)
+        tasks = []
+        for path, source in files:
+            await slots.acquire()
+            tasks.append(asyncio.create_task(prepare(pool, path, source, slots)))
+        await asyncio.gather(*tasks)
+        for _ in range(consumers):
+            await queue.put(None)
+
+    async def consume() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            source, size, chunks = item
+            try:
+                stats = await ingest_chunks(source, aiter_list(chunks), window=BULK_WINDOW_CHUNKS)
+            except Exception as e:
+                totals["failed"] += 1
+                errors.append({"source": source, "error": getattr(e, "detail", None) or str(e)})
+                continue
+            totals["docs"] += 1
+            totals["bytes"] += size
+            for key in ("chunks", "upserted", "moved", "unchanged", "duplicates", "deleted"):
+                totals[key] += stats[key]
+            if on_progress is not None:
+                on_progress(snapshot())
+
+    lock = acquire_index_lock(exclusive=True)
+    try:
+        await load_store()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                await asyncio.gather(produce(pool), *(consume() for _ in range(consumers)))
+        finally:
+            embedding_cache.save()
+            await close_store()
+            await close_backends()
+    finally:
+        release_index_lock(lock)
+    return {**snapshot(), "errors": errors}
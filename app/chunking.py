@@ -1,14 +1,242 @@
-from typing import List
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, List, NamedTuple, Tuple, Union
+import asyncio
+import re
+
+from .config import CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+from .tokens import token_cost
+
+class _StreamChunker:
+    # Incremental form of chunk_text: whitespace is collapsed across piece boundaries and
+    # the emitted chunks are identical to chunk_text over the concatenated pieces.
+
+    def __init__(self, chunk_size: int, overlap: int) -> None:
+        self.chunk_size = chunk_size
+        self.step = max(1, chunk_size - overlap)
+        self._buf = ""
+        self._started = False
+        self._sep = False
+
+    def feed(self, piece: str) -> List[str]:
+        if not piece:
+            return []
+        words = piece.split()
+        if not words:
+            self._sep = self._started
+            return []
+        if self._started and (self._sep or piece[0].isspace()):
+            self._buf += " "
+        self._buf += " ".join(words)
+        self._started = True
+        self._sep = piece[-1].isspace()
+
+        # Only emit windows that are provably not the last one (more text follows them).
+        out: List[str] = []
+        i = 0
+        while len(self._buf) - i > self.chunk_size:
+            out.append(self._buf[i:i + self.chunk_size])
+            i += self.step
+        if i:
+            self._buf = self._buf[i:]
+        return out
+
+    def finish(self) -> List[str]:
+        out = [self._buf] if self._buf else []
+        self._buf = ""
+        return out
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int, overlap: int) -> Iterator[str]:
+    chunker = _StreamChunker(chunk_size, overlap)
+    for piece in pieces:
+        yield from chunker.feed(piece)
+    yield from chunker.finish()
+
+async def _step(offload: bool, fn: Callable[..., List[Any]], *args: Any) -> List[Any]:
+    # Chunking is CPU-bound: offloaded callers run each feed/finish in a worker thread so a
+    # large document does not stall the event loop (the chunker is only touched by one step at a time).
+    return await asyncio.to_thread(fn, *args) if offload else fn(*args)
+
+async def aiter_chunks(pieces: AsyncIterable[str], chunk_size: int, overlap: int, offload: bool = False) -> AsyncIterator[str]:
+    chunker = _StreamChunker(chunk_size, overlap)
+    async for piece in pieces:
+        for chunk in await _step(offload, chunker.feed, piece):
+            yield chunk
+    for chunk in await _step(offload, chunker.finish):
+        yield chunk
 
 def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    return list(iter_chunks([text], chunk_size, overlap))
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # character offsets of `text` in the source document
+    end: int
+
+
+# Segment ends: paragraph break, sentence end, or a newline before a list item.
+_BOUNDARY_RE = re.compile(
+    r"\n[ \t]*\n\s*"
+    r"|[.!?\u2026][\"'\u201d\u2019)\]]*\s+"
+    r"|\n[ \t]*(?=(?:[-*\u2022]|\d+[.)])\s)"
+)
+_WORD_SPAN_RE = re.compile(r"\S+\s*")
+# A paragraph break closes the chunk early once it is at least this full.
+_PARAGRAPH_FILL = 0.5
+
+
+class _StructuredChunker:
+    # Packs sentence/paragraph segments into chunks of at most max_tokens (estimated), with
+    # whole-sentence overlap. Works on a sliding buffer with absolute offsets: every character
+    # is scanned once and sliced once per chunk it ends up in, so cost is linear in the input.
+
+    def __init__(self, max_tokens: int, overlap_tokens: int) -> None:
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        # Longest run without a boundary before it is cut at whitespace (bounds the buffer).
+        self.max_pending = self.max_tokens * 16
+        self._buf = ""
+        self._base = 0  # absolute offset of _buf[0]
+        self._scan = 0  # absolute offset up to which text has been segmented
+        self._cur: List[Tuple[int, int, float]] = []  # (start, end, tokens) of the open chunk
+        self._cur_tokens = 0.0
+        self._fresh = False  # open chunk has segments not yet emitted
+
+    def feed(self, piece: str) -> List[Chunk]:
+        if not piece:
+            return []
+        self._buf += piece
+        out: List[Chunk] = []
+        limit = self._base + len(self._buf)
+        for m in _BOUNDARY_RE.finditer(self._buf, self._scan - self._base):
+            if m.end() >= len(self._buf):
+                # The whitespace run may continue in the next piece.
+                limit = self._base + m.start()
+                break
+            out.extend(self._cut_long(self._base + m.start()))
+            out.extend(self._segment(self._scan, self._base + m.end(), m.group().count("\n") >= 2))
+        out.extend(self._cut_long(limit))
+        self._trim()
+        return out
+
+    def finish(self) -> List[Chunk]:
+        end = self._base + len(self._buf)
+        out = self._cut_long(end)
+        if end > self._scan:
+            out.extend(self._segment(self._scan, end, True))
+        if self._fresh:
+            out.append(self._emit())
+        self._buf = ""
+        self._cur = []
+        self._cur_tokens = 0.0
+        self._fresh = False
+        return out
+
+    def _cut_long(self, limit: int) -> List[Chunk]:
+        # Text with no boundary for max_pending chars is cut at its last whitespace, at
+        # positions that depend only on the text (so streamed and one-shot input agree).
+        out: List[Chunk] = []
+        while limit - self._scan > self.max_pending:
+            lo = self._scan - self._base
+            hi = lo + self.max_pending
+            ws = max(self._buf.rfind(" ", lo, hi), self._buf.rfind("\n", lo, hi))
+            cut = self._base + (ws + 1 if ws > lo else hi)
+            out.extend(self._segment(self._scan, cut, False))
+        return out
+
+    def _segment(self, start: int, end: int, paragraph: bool) -> List[Chunk]:
+        self._scan = end
+        tokens = token_cost(self._buf, start - self._base, end - self._base)
+        if tokens <= self.max_tokens:
+            return self._add(start, end, tokens, paragraph)
+        # Oversized sentence: split at word boundaries.
+        out: List[Chunk] = []
+        piece_start = start
+        piece_tokens = 0.0
+        for m in _WORD_SPAN_RE.finditer(self._buf, start - self._base, end - self._base):
+            t = token_cost(self._buf, m.start(), m.end())
+            if piece_tokens and piece_tokens + t > self.max_tokens:
+                out.extend(self._add(piece_start, self._base + m.start(), piece_tokens, False))
+                piece_start, piece_tokens = self._base + m.start(), 0.0
+            piece_tokens += t
+        out.extend(self._add(piece_start, end, piece_tokens, paragraph))
+        return out
+
+    def _add(self, start: int, end: int, tokens: float, paragraph: bool) -> List[Chunk]:
+        out: List[Chunk] = []
+        if self._cur_tokens + tokens > self.max_tokens:
+            if self._fresh:
+                out.append(self._emit())
+                self._carry_overlap()
+            while self._cur and self._cur_tokens + tokens > self.max_tokens:
+                self._cur_tokens -= self._cur.pop(0)[2]
+        self._cur.append((start, end, tokens))
+        self._cur_tokens += tokens
+        self._fresh = True
+        if paragraph and self._cur_tokens >= self.max_tokens * _PARAGRAPH_FILL:
+            # No overlap is carried across a paragraph break.
+            out.append(self._emit())
+            self._cur = []
+            self._cur_tokens = 0.0
+        return out
+
+    def _carry_overlap(self) -> None:
+        # Keep the trailing whole segments that fit the overlap, always dropping at least one.
+        keep = 0
+        tokens = 0.0
+        for seg in reversed(self._cur[1:]):
+            if tokens + seg[2] > self.overlap_tokens:
+                break
+            tokens += seg[2]
+            keep += 1
+        self._cur = self._cur[len(self._cur) - keep:] if keep else []
+        self._cur_tokens = tokens
+
+    def _emit(self) -> Chunk:
+        start, end = self._cur[0][0], self._cur[-1][1]
+        raw = self._buf[start - self._base:end - self._base]
+        text = raw.strip()
+        start += len(raw) - len(raw.lstrip())
+        self._fresh = False
+        return Chunk(text, start, start + len(text))
+
+    def _trim(self) -> None:
+        # Drop text no open segment can reference; amortised so the buffer is copied O(1) times per char.
+        keep = self._cur[0][0] if self._cur else self._scan
+        cut = keep - self._base
+        if cut > 0 and cut * 2 >= len(self._buf):
+            self._buf = self._buf[cut:]
+            self._base = keep
+
+
+def iter_structured_chunks(pieces: Iterable[str], max_tokens: int, overlap_tokens: int) -> Iterator[Chunk]:
+    chunker = _StructuredChunker(max_tokens, overlap_tokens)
+    for piece in pieces:
+        yield from (c for c in chunker.feed(piece) if c.text)
+    yield from (c for c in chunker.finish() if c.text)
+
+async def aiter_structured_chunks(
+    pieces: AsyncIterable[str], max_tokens: int, overlap_tokens: int, offload: bool = False
+) -> AsyncIterator[Chunk]:
+    chunker = _StructuredChunker(max_tokens, overlap_tokens)
+    async for piece in pieces:
+        for chunk in await _step(offload, chunker.feed, piece):
+            if chunk.text:
+                yield chunk
+    for chunk in await _step(offload, chunker.finish):
+        if chunk.text:
+            yield chunk
+
+def structured_chunks(text: str, max_tokens: int, overlap_tokens: int) -> List[Chunk]:
+    return list(iter_structured_chunks([text], max_tokens, overlap_tokens))
+
+# ---- configured engine (CHUNKER): "structured" yields Chunk, "chars" the legacy strings ----
+
+def document_chunks(text: str) -> List[Union[Chunk, str]]:
+    if CHUNKER == "chars":
+        return chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+    return structured_chunks(text, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
 
-    text = " ".join(text.split())
-    chunks: List[str] = []
-    i = 0
-    while i < len(text):
-        j = min(i + chunk_size, len(text))
-        chunks.append(text[i:j])
-        if j == len(text):
-            break
-        i = max(0, j - overlap)
-    return chunks
+def aiter_document_chunks(pieces: AsyncIterable[str], offload: bool = False) -> AsyncIterator[Union[Chunk, str]]:
+    if CHUNKER == "chars":
+        return aiter_chunks(pieces, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, offload=offload)
+    return aiter_structured_chunks(pieces, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, offload=offload)
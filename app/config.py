@@ -3,8 +3,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-LLAMA_BASE = os.getenv("LLAMA_BASE", "http://localhost:11434").rstrip("/")
-EMBEDDINGS_BASE = os.getenv("EMBEDDINGS_BASE", "").strip().rstrip("/")
+# Comma-separated base URLs; several entries form a pool balanced on least outstanding requests.
+# The embeddings pool defaults to the LLM servers.
+LLAMA_BASES = [u.strip().rstrip("/") for u in os.getenv("LLAMA_BASE", "").split(",") if u.strip()] or ["http://localhost:11434"]
+EMBEDDINGS_BASES = [u.strip().rstrip("/") for u in os.getenv("EMBEDDINGS_BASE", "").split(",") if u.strip()] or LLAMA_BASES
 EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "nomic-embed-text")
 # Optional override for embeddings endpoint path (e.g. "/v1/embeddings" or "/api/embeddings")
 EMBEDDINGS_ENDPOINT = os.getenv("EMBEDDINGS_ENDPOINT", "").strip()
@@ -15,3 +17,137 @@ QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "it_poc")
 TOP_K = int(os.getenv("TOP_K", "3"))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# "structured" packs whole sentences/paragraphs into CHUNK_TOKENS-sized chunks with char offsets;
+# "chars" is the original CHUNK_SIZE/CHUNK_OVERLAP character window
+CHUNKER = os.getenv("CHUNKER", "structured").strip().lower()
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "128"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+
+# Per-backend timeouts (seconds) and concurrency limits
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "900"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# LLM scheduler: calls queued beyond LLM_MAX_CONCURRENCY before new ones get 429 (0 = unbounded),
+# max_tokens up to which a generation goes in the "short" lane, identical in-flight prompts shared
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_SHORT_MAX_TOKENS = int(os.getenv("LLM_SHORT_MAX_TOKENS", "128"))
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1").lower() in ("1", "true", "yes")
+EMBEDDINGS_TIMEOUT = float(os.getenv("EMBEDDINGS_TIMEOUT", "1200"))
+EMBEDDINGS_CONNECT_TIMEOUT = float(os.getenv("EMBEDDINGS_CONNECT_TIMEOUT", "10"))
+EMBEDDINGS_MAX_CONCURRENCY = int(os.getenv("EMBEDDINGS_MAX_CONCURRENCY", "8"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+QDRANT_MAX_CONCURRENCY = int(os.getenv("QDRANT_MAX_CONCURRENCY", "32"))
+
+# Qdrant collection layout, applied when the collection is created (scripts/migrate_collection.py
+# rebuilds an existing one). Quantization: "none", "scalar" (int8) or "binary", searched with rescoring.
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").strip().lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "1").lower() in ("1", "true", "yes")
+QDRANT_SCALAR_QUANTILE = float(os.getenv("QDRANT_SCALAR_QUANTILE", "0.99"))
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "1").lower() in ("1", "true", "yes")
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "0").lower() in ("1", "true", "yes")
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "0").lower() in ("1", "true", "yes")
+# HNSW graph (0 = Qdrant default) and search-time ef
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "0"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "0"))
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "0").lower() in ("1", "true", "yes")
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "0"))
+# Seconds the collection metadata (existence, dimension, embedding model) is cached between Qdrant lookups.
+QDRANT_META_TTL = float(os.getenv("QDRANT_META_TTL", "60"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "32"))
+
+# Backend pools: health probe every N seconds (0 = off; a response other than 502/503/504 means up),
+# consecutive failures that open a node's circuit, seconds it stays open before a trial call
+BACKEND_HEALTH_INTERVAL = float(os.getenv("BACKEND_HEALTH_INTERVAL", "10"))
+BACKEND_HEALTH_PATH = os.getenv("BACKEND_HEALTH_PATH", "/v1/models").strip()
+BACKEND_HEALTH_TIMEOUT = float(os.getenv("BACKEND_HEALTH_TIMEOUT", "2"))
+BACKEND_FAILURE_THRESHOLD = int(os.getenv("BACKEND_FAILURE_THRESHOLD", "3"))
+BACKEND_COOLDOWN_S = float(os.getenv("BACKEND_COOLDOWN_S", "15"))
+
+# Per-request stage timings as a Server-Timing response header (histograms are always on /metrics)
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0").lower() in ("1", "true", "yes")
+
+# Streamed chats send an assistant role chunk as soon as the LLM request starts, before its first token
+STREAM_EARLY_ROLE = os.getenv("STREAM_EARLY_ROLE", "1").lower() in ("1", "true", "yes")
+
+# Start query embedding + retrieval concurrently with the router LLM call
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "1").lower() in ("1", "true", "yes")
+
+# Query/chunk embedding cache (0 MB disables; TTL 0 = never expire; empty path = memory only)
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "64"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "").strip()
+
+# Query embedding micro-batching: concurrent chat queries wait up to this long (0 disables) to share one call
+EMBED_QUERY_BATCH_WAIT_MS = float(os.getenv("EMBED_QUERY_BATCH_WAIT_MS", "2"))
+EMBED_QUERY_BATCH_MAX = int(os.getenv("EMBED_QUERY_BATCH_MAX", "32"))
+
+# Semantic answer cache (0 entries disables; threshold is cosine similarity between query embeddings)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "").strip()
+
+# Ingest embedding pipeline: in-flight batches and adaptive batch sizing
+EMBED_INGEST_CONCURRENCY = int(os.getenv("EMBED_INGEST_CONCURRENCY", "4"))
+EMBED_BATCH_INITIAL = int(os.getenv("EMBED_BATCH_INITIAL", "16"))
+EMBED_BATCH_MIN = int(os.getenv("EMBED_BATCH_MIN", "1"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "256"))
+EMBED_BATCH_TARGET_MS = float(os.getenv("EMBED_BATCH_TARGET_MS", "2000"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "200000"))
+
+# Streaming ingest: chunks per embed/upsert window, bytes per read from uploads
+INGEST_WINDOW_CHUNKS = int(os.getenv("INGEST_WINDOW_CHUNKS", "256"))
+INGEST_READ_BYTES = int(os.getenv("INGEST_READ_BYTES", "65536"))
+
+# Background ingest jobs: spooled uploads + state file live here; jobs run concurrently up to the limit
+INGEST_JOBS_DIR = os.getenv("INGEST_JOBS_DIR", "data/ingest_jobs").strip()
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "1"))
+
+# Held shared by the API and exclusively by the bulk ingest CLI, so the two never write at once (empty = off)
+INDEX_LOCK_PATH = os.getenv("INDEX_LOCK_PATH", "data/index.lock").strip()
+
+# Vector store backend: "qdrant" (default) or "local" (in-process NumPy index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").strip().lower()
+# Local index: directory for memory-mapped persistence (empty = memory only); IVF lists (0 = exact search)
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "").strip()
+LOCAL_INDEX_IVF_LISTS = int(os.getenv("LOCAL_INDEX_IVF_LISTS", "0"))
+LOCAL_INDEX_IVF_PROBES = int(os.getenv("LOCAL_INDEX_IVF_PROBES", "8"))
+
+# Hybrid retrieval: BM25 over the same chunks, fused with vector hits by reciprocal rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1").lower() in ("1", "true", "yes")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_RRF_K = float(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+# Lexical-only hits pass the score threshold when their BM25 score reaches this
+HYBRID_MIN_BM25 = float(os.getenv("HYBRID_MIN_BM25", "5.0"))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "").strip()
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Rerank stage between retrieval and prompt building: "none", "lexical", "mmr" or "cross_encoder"
+RERANK_MODE = os.getenv("RERANK_MODE", "lexical").strip().lower()
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+# Token budget for the kept hits (before overlap is merged away; 0 disables)
+RERANK_MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", "1500"))
+# Cross-encoder served by the embeddings backend (llama.cpp / Jina style rerank API)
+RERANK_MODEL = os.getenv("RERANK_MODEL", "").strip()
+RERANK_ENDPOINT = os.getenv("RERANK_ENDPOINT", "/v1/rerank").strip()
+
+# Prompt context: neighbouring chunks are merged (overlap removed) and fit to this many tokens (0 = no limit)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+
+# Bulk ingest CLI (scripts/ingest_paste.py with paths): chunking processes, documents ingested at once,
+# chunks per embed/upsert window, file extensions picked up from directories
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "0"))  # 0 = CPU count
+BULK_CONCURRENT_DOCS = int(os.getenv("BULK_CONCURRENT_DOCS", "4"))
+BULK_WINDOW_CHUNKS = int(os.getenv("BULK_WINDOW_CHUNKS", "512"))
+BULK_EXTENSIONS = tuple(e.strip().lower() for e in os.getenv("BULK_EXTENSIONS", ".txt,.md").split(",") if e.strip())
+
+# Batch chat (/v1/chat/batch): questions per request, LLM generations in flight per request
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "512"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple
+import logging
+
+from .tokens import estimate_tokens
+
+logger = logging.getLogger("uvicorn.error")
+
+SEPARATOR = "\n\n---\n\n"
+
+# Running totals for /admin/retrieval_stats
+context_stats = {"requests": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0, "merged": 0, "truncated": 0}
+
+
+def _overlap(a: str, b: str, min_len: int = 32) -> int:
+    # Length of the longest suffix of `a` that is also a prefix of `b`; overlaps shorter
+    # than min_len are treated as coincidence (chunk overlaps are CHUNK_OVERLAP chars).
+    probe = b[:min(min_len, len(b))]
+    if not probe:
+        return 0
+    pos = a.find(probe, max(0, len(a) - len(b)))
+    while pos != -1:
+        n = len(a) - pos
+        if b.startswith(a[pos:]):
+            return n
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # Cut at a word boundary so the estimate of the result stays within max_tokens.
+    words = text.split(" ")
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def _merge(hits: List[Dict]) -> List[Tuple[int, str, int]]:
+    # Join runs of adjacent/overlapping chunks per source. Returns (best rank, text, chunks merged),
+    # ordered by the best-ranked hit in each run so relevance order is kept. Chunks with char
+    # offsets are joined by offset; others by matching the overlapping text.
+    by_source: Dict[str, List[Tuple[int, int, str, int, int]]] = {}
+    for rank, h in enumerate(hits):
+        text = h.get("text", "")
+        if text.strip():
+            by_source.setdefault(h.get("source", ""), []).append(
+                (h.get("chunk_index", -1), rank, text, h.get("char_start", -1), h.get("char_end", -1))
+            )
+
+    blocks: List[Tuple[int, str, int]] = []
+    for items in by_source.values():
+        items.sort()
+        run_idx, run_rank, run_text, _, run_end = items[0]
+        run_size = 1
+        for idx, rank, text, start, end in items[1:]:
+            if idx >= 0 and idx == run_idx:
+                continue
+            if start >= 0 and run_end >= 0:
+                n = min(max(0, run_end - start), len(text))
+            else:
+                n = _overlap(run_text, text)
+            if n or (run_idx >= 0 and idx == run_idx + 1):
+                run_text += text[n:] if n else " " + text
+                run_idx, run_rank, run_end, run_size = idx, min(run_rank, rank), end, run_size + 1
+                continue
+            blocks.append((run_rank, run_text, run_size))
+            run_idx, run_rank, run_text, run_end, run_size = idx, rank, text, end, 1
+        blocks.append((run_rank, run_text, run_size))
+    blocks.sort(key=lambda b: b[0])
+    return blocks
+
+
+def pack_context(hits: List[Dict], max_tokens: int) -> Tuple[str, Dict[str, int]]:
+    # Merge neighbouring chunks (dropping the repeated overlap) and fit the result to
+    # max_tokens (0 = no limit). Stats compare against joining every hit's text as-is.
+    tokens_in = sum(estimate_tokens(h.get("text", "")) for h in hits if h.get("text", "").strip())
+    sep_tokens = estimate_tokens(SEPARATOR)
+    parts: List[str] = []
+    used = 0
+    merged = 0
+    truncated = 0
+    for _, text, size in _merge(hits):
+        cost = estimate_tokens(text) + (sep_tokens if parts else 0)
+        if max_tokens and used + cost > max_tokens:
+            room = max_tokens - used - (sep_tokens if parts else 0)
+            text = _truncate(text, room) if room > 0 else ""
+            if not text:
+                break
+            cost = estimate_tokens(text) + (sep_tokens if parts else 0)
+            truncated += 1
+        parts.append(text)
+        used += cost
+        merged += size - 1
+        if truncated:
+            break
+
+    tokens_in += sep_tokens * max(0, len([h for h in hits if h.get("text", "").strip()]) - 1)
+    stats = {
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": max(0, tokens_in - used),
+        "merged": merged,
+        "truncated": truncated,
+    }
+    context_stats["requests"] += 1
+    for key, value in stats.items():
+        context_stats[key] += value
+    logger.info("Context: hits=%d blocks=%d %s", len(hits), len(parts), stats)
+    return SEPARATOR.join(parts), stats
@@ -0,0 +1,97 @@
+from typing import Callable, List, Optional
+import asyncio
+import logging
+
+from .config import (
+    EMBED_INGEST_CONCURRENCY,
+    EMBED_BATCH_INITIAL,
+    EMBED_BATCH_MIN,
+    EMBED_BATCH_MAX,
+    EMBED_BATCH_TARGET_MS,
+    EMBED_BATCH_MAX_CHARS,
+)
+from .embeddings import embed_texts
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class AdaptiveBatchSizer:
+    """Grows batches while the server answers quickly, halves them when it slows down."""
+
+    def __init__(self, initial: int, min_size: int, max_size: int, target_ms: float, max_chars: int) -> None:
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial, self.min_size), self.max_size)
+        self.target_ms = target_ms
+        self.max_chars = max_chars
+
+    def next_end(self, texts: List[str], start: int) -> int:
+        # Cut at `size` items or `max_chars` of payload, whichever comes first (always >= 1 item).
+        end = start
+        chars = 0
+        limit = min(len(texts), start + self.size)
+        while end < limit:
+            chars += len(texts[end])
+            if end > start and chars > self.max_chars:
+                break
+            end += 1
+        return end
+
+    def observe(self, batch_size: int, elapsed_ms: float) -> None:
+        if elapsed_ms > self.target_ms * 1.5:
+            self.size = max(self.min_size, self.size // 2)
+        elif elapsed_ms < self.target_ms / 2 and batch_size >= self.size:
+            self.size = min(self.max_size, self.size + max(1, self.size // 2))
+
+
+batch_sizer = AdaptiveBatchSizer(
+    initial=EMBED_BATCH_INITIAL,
+    min_size=EMBED_BATCH_MIN,
+    max_size=EMBED_BATCH_MAX,
+    target_ms=EMBED_BATCH_TARGET_MS,
+    max_chars=EMBED_BATCH_MAX_CHARS,
+)
+
+
+async def embed_all(
+    texts: List[str],
+    concurrency: int = EMBED_INGEST_CONCURRENCY,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> List[List[float]]:
+    # Keeps at most `concurrency` batches in flight; the next batch is only cut once a slot frees up.
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    slots = asyncio.Semaphore(max(1, concurrency))
+    tasks: List[asyncio.Task] = []
+    done = 0
+
+    async def run(start: int, batch: List[str]) -> None:
+        nonlocal done
+        try:
+            # Sized by backend calls only: batches served from the embedding cache say nothing about latency.
+            vectors = await embed_texts(batch, on_backend_call=batch_sizer.observe)
+            results[start:start + len(batch)] = vectors
+            done += len(batch)
+            if on_progress is not None:
+                on_progress(done)
+        finally:
+            slots.release()
+
+    try:
+        i = 0
+        while i < len(texts):
+            await slots.acquire()
+            failed = next((t for t in tasks if t.done() and not t.cancelled() and t.exception() is not None), None)
+            if failed is not None:
+                slots.release()
+                failed.result()
+            j = batch_sizer.next_end(texts, i)
+            tasks.append(asyncio.create_task(run(i, texts[i:j])))
+            i = j
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+
+    return results  # type: ignore[return-value]
+
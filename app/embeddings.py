@@ -1,83 +1,342 @@
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
 import logging
-import requests
+import os
+import time
+
+import numpy as np
 from fastapi import HTTPException
-from .config import LLAMA_BASE, EMBEDDINGS_BASE, EMBEDDINGS_MODEL, EMBEDDINGS_ENDPOINT
+from .backends import Backend, embeddings_backend
+from .config import (
+    EMBEDDINGS_MODEL,
+    EMBEDDINGS_ENDPOINT,
+    EMBED_CACHE_MAX_MB,
+    EMBED_CACHE_TTL,
+    EMBED_CACHE_PATH,
+    EMBED_QUERY_BATCH_WAIT_MS,
+    EMBED_QUERY_BATCH_MAX,
+)
+from .metrics import Histogram
 
 logger = logging.getLogger("uvicorn.error")
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    base_url = EMBEDDINGS_BASE or LLAMA_BASE
-    logger.info("Embeddings: count=%d model=%s base=%s endpoint=%s", len(texts), EMBEDDINGS_MODEL, base_url, EMBEDDINGS_ENDPOINT or "auto")
+CacheKey = Tuple[str, str]
 
-    def openai_embeddings() -> Optional[List[List[float]]]:
-        r = requests.post(
-            f"{base_url}/v1/embeddings",
-            json={"model": EMBEDDINGS_MODEL, "input": texts},
-            timeout=1200,
-        )
-        if r.status_code == 404:
-            if "model" in r.text.lower():
-                r.raise_for_status()
+def cache_key(text: str, model: str = EMBEDDINGS_MODEL, query: bool = False) -> CacheKey:
+    # Chunks are keyed on their exact text (case and layout change the embedding of code, tables,
+    # acronyms). Chat queries are keyed case- and whitespace-insensitively, in their own namespace,
+    # so retyped questions still hit.
+    if query:
+        text = "query:" + " ".join(text.split()).casefold()
+    return model, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """LRU + TTL cache of float32 vectors, bounded by total vector bytes."""
+
+    def __init__(self, max_bytes: int, ttl: float, path: str = "") -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[CacheKey, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: CacheKey) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
             return None
-        r.raise_for_status()
-        data = r.json()["data"]
-        return [item["embedding"] for item in data]
-
-    def ollama_embeddings() -> Optional[List[List[float]]]:
-        vectors: List[List[float]] = []
-        for text in texts:
-            r = requests.post(
-                f"{base_url}/api/embeddings",
-                json={"model": EMBEDDINGS_MODEL, "prompt": text},
-                timeout=1200,
+        created, vec = entry
+        if self.ttl and time.time() - created > self.ttl:
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vec
+
+    def put(self, key: CacheKey, vector: List[float], created: Optional[float] = None) -> None:
+        if self.max_bytes <= 0:
+            return
+        vec = np.asarray(vector, dtype=np.float32)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (created or time.time(), vec)
+        self._bytes += vec.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: CacheKey) -> None:
+        _, vec = self._entries.pop(key)
+        self._bytes -= vec.nbytes
+
+    def dimension(self, model: str) -> Optional[int]:
+        # Vector size of any live entry for `model` (all of a model's vectors share it).
+        for (entry_model, _), (_, vec) in self._entries.items():
+            if entry_model == model:
+                return len(vec)
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def save(self) -> None:
+        if not self.path or not self._entries:
+            return
+        keys = list(self._entries.keys())
+        created = np.array([self._entries[k][0] for k in keys], dtype=np.float64)
+        vecs = [self._entries[k][1] for k in keys]
+        lengths = np.array([v.shape[0] for v in vecs], dtype=np.int32)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                models=np.array([k[0] for k in keys]),
+                hashes=np.array([k[1] for k in keys]),
+                created=created,
+                lengths=lengths,
+                vectors=np.concatenate(vecs),
             )
-            if r.status_code == 404:
-                return None
+        os.replace(tmp, self.path)
+        logger.info("Embedding cache: saved entries=%d path=%s", len(keys), self.path)
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                offsets = np.concatenate(([0], np.cumsum(data["lengths"])))
+                vectors = data["vectors"]
+                # Oldest first so LRU order survives the round trip.
+                for i, (model, digest, created) in enumerate(zip(data["models"], data["hashes"], data["created"])):
+                    vec = vectors[offsets[i]:offsets[i + 1]]
+                    if self.ttl and time.time() - created > self.ttl:
+                        continue
+                    self.put((str(model), str(digest)), vec, created=float(created))
+        except Exception as e:
+            logger.warning("Embedding cache: load failed path=%s: %s", self.path, e)
+            return
+        logger.info("Embedding cache: loaded entries=%d path=%s", len(self._entries), self.path)
+
+embedding_cache = EmbeddingCache(
+    max_bytes=int(EMBED_CACHE_MAX_MB * 1024 * 1024),
+    ttl=EMBED_CACHE_TTL,
+    path=EMBED_CACHE_PATH,
+)
+
+# Vector size per embedding model, learned from the first response.
+_dimensions: Dict[str, int] = {}
+
+async def embed_texts(
+    texts: List[str],
+    query: bool = False,
+    on_backend_call: Optional[Callable[[int, float], None]] = None,
+) -> List[List[float]]:
+    # on_backend_call(misses, elapsed_ms) runs only when cache misses went to the backend.
+    keys = [cache_key(t, query=query) for t in texts]
+    found: Dict[CacheKey, np.ndarray] = {}
+    missing: Dict[CacheKey, str] = {}
+    for key, text in zip(keys, texts):
+        if key in found or key in missing:
+            continue
+        vec = embedding_cache.get(key)
+        if vec is None:
+            missing[key] = text
+        else:
+            found[key] = vec
+    if found:
+        _dimensions.setdefault(EMBEDDINGS_MODEL, len(next(iter(found.values()))))
+
+    if missing:
+        t0 = time.perf_counter()
+        for key, vec in zip(missing.keys(), await _embed_and_cache(list(missing.keys()), list(missing.values()))):
+            found[key] = vec
+        if on_backend_call is not None:
+            on_backend_call(len(missing), (time.perf_counter() - t0) * 1000)
+
+    return [found[key].tolist() for key in keys]
+
+async def _embed_and_cache(keys: List[CacheKey], texts: List[str]) -> List[np.ndarray]:
+    vectors = await _embed_uncached(texts)
+    if vectors:
+        _dimensions[EMBEDDINGS_MODEL] = len(vectors[0])
+    out = []
+    for key, vec in zip(keys, vectors):
+        embedding_cache.put(key, vec)
+        out.append(np.asarray(vec, dtype=np.float32))
+    return out
+
+class QueryBatcher:
+    """Coalesces concurrent single-query embeddings (cache misses) into one backend call.
+
+    The first waiting query opens a window of `max_wait_ms`; the window closes early once
+    `max_batch` queries are waiting.
+    """
+
+    def __init__(self, max_wait_ms: float, max_batch: int) -> None:
+        self.max_wait_ms = max_wait_ms
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[CacheKey, str, float, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50])
+        self.call_ms = Histogram([5, 10, 25, 50, 100, 250, 500, 1000])
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_wait_ms > 0 and self.max_batch > 1
+
+    async def embed(self, text: str) -> List[float]:
+        key = cache_key(text, query=True)
+        vec = embedding_cache.get(key)
+        if vec is not None:
+            _dimensions.setdefault(EMBEDDINGS_MODEL, len(vec))
+            return vec.tolist()
+        if not self.enabled:
+            return (await _embed_and_cache([key], [text]))[0].tolist()
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._pending.append((key, text, time.perf_counter(), fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return (await fut).tolist()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[CacheKey, str, float, asyncio.Future]]) -> None:
+        now = time.perf_counter()
+        for _, _, queued, _ in batch:
+            self.wait_ms.observe((now - queued) * 1000)
+        # Identical concurrent questions share one input.
+        unique: Dict[CacheKey, str] = {}
+        for key, text, _, _ in batch:
+            unique.setdefault(key, text)
+        self.batch_sizes.observe(len(unique))
+        try:
+            vectors = dict(zip(unique.keys(), await _embed_and_cache(list(unique.keys()), list(unique.values()))))
+        except Exception as e:
+            for _, _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self.call_ms.observe((time.perf_counter() - now) * 1000)
+        for key, _, _, fut in batch:
+            if not fut.done():
+                fut.set_result(vectors[key])
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch": self.max_batch,
+            "batch_size": self.batch_sizes.to_dict(),
+            "wait_ms": self.wait_ms.to_dict(),
+            "call_ms": self.call_ms.to_dict(),
+        }
+
+query_batcher = QueryBatcher(EMBED_QUERY_BATCH_WAIT_MS, EMBED_QUERY_BATCH_MAX)
+
+async def embed_query(text: str) -> List[float]:
+    # Chat path: one question per request, micro-batched across concurrent requests.
+    return await query_batcher.embed(text)
+
+async def embedding_dimension() -> int:
+    # Known from any earlier call or cached vector; a live probe only on a cold start.
+    dim = _dimensions.get(EMBEDDINGS_MODEL) or embedding_cache.dimension(EMBEDDINGS_MODEL)
+    if dim is None:
+        dim = len((await _embed_uncached(["dimension probe"]))[0])
+    _dimensions[EMBEDDINGS_MODEL] = dim
+    return dim
+
+async def _endpoint_for(node: Backend) -> str:
+    # Which embeddings API a node speaks is settled once (at startup or on its first call) and
+    # cached on the node; EMBEDDINGS_ENDPOINT skips the probe.
+    endpoint = node.capabilities.get("embeddings")
+    if endpoint:
+        return endpoint
+    endpoint = EMBEDDINGS_ENDPOINT
+    if not endpoint:
+        probes = (
+            ("/v1/embeddings", {"model": EMBEDDINGS_MODEL, "input": ["endpoint probe"]}),
+            ("/api/embeddings", {"model": EMBEDDINGS_MODEL, "prompt": "endpoint probe"}),
+        )
+        for path, body in probes:
+            r = await node.post(path, json=body)
+            # A 404 naming the model is a missing model, not a missing route.
+            if r.status_code == 404 and "model" not in r.text.lower():
+                continue
+            r.raise_for_status()
+            endpoint = path
+            break
+        else:
+            raise HTTPException(
+                status_code=502,
+                detail=(
+                    "Embedding call failed: no embeddings endpoint found. Check EMBEDDINGS_BASE/LLAMA_BASE. "
+                    f"Tried: {node.base_url}/v1/embeddings, {node.base_url}/api/embeddings -> 404"
+                ),
+            )
+    node.capabilities["embeddings"] = endpoint
+    logger.info("Embeddings: %s uses %s", node.base_url, endpoint)
+    return endpoint
+
+async def probe_embedding_endpoints() -> None:
+    for node in embeddings_backend.nodes:
+        if node.circuit_open:
+            continue
+        try:
+            await _endpoint_for(node)
+        except Exception as e:
+            logger.warning("Embeddings: endpoint probe failed for %s: %s", node.base_url, getattr(e, "detail", None) or e)
+
+async def _embed_on(node: Backend, texts: List[str]) -> List[List[float]]:
+    endpoint = await _endpoint_for(node)
+    if endpoint.endswith("/api/embeddings"):
+        # Ollama: one request per text; fan out concurrently (the node semaphore bounds in-flight calls).
+        async def one(text: str) -> List[float]:
+            r = await node.post(endpoint, json={"model": EMBEDDINGS_MODEL, "prompt": text})
             r.raise_for_status()
-            vectors.append(r.json()["embedding"])
-        return vectors
+            return r.json()["embedding"]
 
+        return list(await asyncio.gather(*(one(t) for t in texts)))
+    r = await node.post(endpoint, json={"model": EMBEDDINGS_MODEL, "input": texts})
+    r.raise_for_status()
+    return [item["embedding"] for item in r.json()["data"]]
+
+async def _embed_uncached(texts: List[str]) -> List[List[float]]:
+    logger.info("Embeddings: count=%d model=%s", len(texts), EMBEDDINGS_MODEL)
     try:
-        errors: List[str] = []
-
-        # Allow explicit override if needed.
-        if EMBEDDINGS_ENDPOINT:
-            if EMBEDDINGS_ENDPOINT.endswith("/api/embeddings"):
-                vectors = ollama_embeddings()
-                if vectors is not None:
-                    return vectors
-                errors.append(f"{base_url}{EMBEDDINGS_ENDPOINT} -> 404")
-            r = requests.post(
-                f"{base_url}{EMBEDDINGS_ENDPOINT}",
-                json={"model": EMBEDDINGS_MODEL, "input": texts},
-                timeout=1200,
-            )
-            if r.status_code == 404:
-                errors.append(f"{base_url}{EMBEDDINGS_ENDPOINT} -> 404")
-            else:
-                r.raise_for_status()
-                data = r.json()["data"]
-                return [item["embedding"] for item in data]
-
-        vectors = openai_embeddings()
-        if vectors is not None:
-            return vectors
-        errors.append(f"{base_url}/v1/embeddings -> 404")
-
-        vectors = ollama_embeddings()
-        if vectors is not None:
-            return vectors
-        errors.append(f"{base_url}/api/embeddings -> 404")
-
-        raise HTTPException(
-            status_code=502,
-            detail=(
-                "Embedding call failed: no embeddings endpoint found. "
-                f"Check EMBEDDINGS_BASE/LLAMA_BASE. Tried: {', '.join(errors)}"
-            ),
-        )
+        return await embeddings_backend.call(lambda node: _embed_on(node, texts))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Embedding call failed: {e}")
-
-    
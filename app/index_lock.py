@@ -0,0 +1,39 @@
+from typing import IO, Optional
+import logging
+import os
+
+from .config import INDEX_LOCK_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, the check is skipped.
+    fcntl = None
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class IndexLockError(RuntimeError):
+    pass
+
+
+def acquire_index_lock(exclusive: bool) -> Optional[IO]:
+    # The API mirrors every write into its in-memory BM25 index and answer cache and saves the
+    # lexicon on close, so the bulk ingest CLI (which writes straight to the store) must not run
+    # alongside it. API processes hold the lock shared, the CLI exclusively; the OS drops it if
+    # the holder dies. Only covers processes on this host using the same INDEX_LOCK_PATH.
+    if fcntl is None or not INDEX_LOCK_PATH:
+        return None
+    os.makedirs(os.path.dirname(INDEX_LOCK_PATH) or ".", exist_ok=True)
+    f = open(INDEX_LOCK_PATH, "a+")
+    try:
+        fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        holder = "the API" if exclusive else "a bulk ingest run"
+        raise IndexLockError(f"Index is in use by {holder} (lock {INDEX_LOCK_PATH}); stop it first")
+    return f
+
+
+def release_index_lock(handle: Optional[IO]) -> None:
+    if handle is not None:
+        handle.close()
@@ -0,0 +1,163 @@
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import codecs
+import logging
+import time
+
+from .chunking import Chunk
+from .config import INGEST_WINDOW_CHUNKS, INGEST_READ_BYTES
+from .embedding_pipeline import embed_all
+from .embeddings import embedding_dimension
+from .points import content_hash, point_id, position
+from .vector_store import (
+    delete_points,
+    ensure_collection,
+    flush as flush_store,
+    index_lexical,
+    set_positions,
+    source_points,
+    upsert_chunks,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+async def decode_utf8(blocks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    # Incremental decode so multi-byte characters split across reads survive.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    async for block in blocks:
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def read_upload(upload) -> AsyncIterator[bytes]:
+    # Starlette UploadFile (spooled to disk by the multipart parser); read in bounded blocks.
+    while True:
+        block = await upload.read(INGEST_READ_BYTES)
+        if not block:
+            break
+        yield block
+
+
+async def aiter_list(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def ingest_chunks(
+    source: str,
+    chunks: AsyncIterable[Union[Chunk, str]],
+    window: int = INGEST_WINDOW_CHUNKS,
+    on_progress: Optional[Callable[[Dict[str, float]], None]] = None,
+) -> Dict[str, int]:
+    # Embed window N+1 while window N is being written; at most one write in flight,
+    # so memory stays at ~two windows regardless of document size.
+    # Point ids are content-addressed, so only chunks not already stored for `source` are
+    # embedded and upserted; stored chunks that moved (index or char offsets) get a payload-only update, and
+    # stored chunks that no longer appear are deleted at the end.
+    start = time.time()
+    existing = await source_points(source)
+    seen: Set[str] = set()
+    stats = {"chunks": 0, "upserted": 0, "moved": 0, "unchanged": 0, "duplicates": 0, "deleted": 0}
+    indexed = 0
+    embedded = 0
+    pending: Optional[asyncio.Task] = None
+    collection_ready = False
+
+    def _report() -> None:
+        elapsed = time.time() - start
+        progress = {
+            "chunks_embedded": embedded,
+            "chunks_indexed": indexed,
+            "elapsed_s": round(elapsed, 3),
+            "chunks_per_s": round(indexed / elapsed, 1) if elapsed else 0.0,
+        }
+        logger.info("Ingest progress: source=%s %s", source, progress)
+        if on_progress is not None:
+            on_progress(progress)
+
+    async def write(
+        fresh: List[str],
+        fresh_indexes: List[int],
+        fresh_spans: List[Optional[Tuple[int, int]]],
+        vectors: List[List[float]],
+        moved: Dict[str, Dict[str, int]],
+        size: int,
+    ) -> int:
+        if fresh:
+            await upsert_chunks(source, fresh, vectors, chunk_indexes=fresh_indexes, spans=fresh_spans)
+        await set_positions(moved)
+        return size
+
+    async def flush(batch: List[Union[Chunk, str]], start_index: int) -> None:
+        nonlocal pending, embedded, collection_ready, indexed
+        fresh: List[str] = []
+        fresh_indexes: List[int] = []
+        fresh_spans: List[Optional[Tuple[int, int]]] = []
+        moved: Dict[str, Dict[str, int]] = {}
+        for idx, chunk in enumerate(batch, start=start_index):
+            # Structured chunks carry char offsets; legacy character chunks are plain strings.
+            text, span = (chunk, None) if isinstance(chunk, str) else (chunk.text, (chunk.start, chunk.end))
+            pid = point_id(source, content_hash(text))
+            if pid in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(pid)
+            pos = position(idx, span)
+            if pid not in existing:
+                fresh.append(text)
+                fresh_indexes.append(idx)
+                fresh_spans.append(span)
+                continue
+            index_lexical(pid, text)
+            if existing[pid] != pos:
+                moved[pid] = pos
+            else:
+                stats["unchanged"] += 1
+        stats["upserted"] += len(fresh)
+        stats["moved"] += len(moved)
+
+        vectors = await embed_all(fresh) if fresh else []
+        embedded += len(fresh)
+        if fresh and not collection_ready:
+            await ensure_collection(await embedding_dimension())
+            collection_ready = True
+        if pending is not None:
+            indexed += await pending
+            _report()
+        pending = asyncio.create_task(write(fresh, fresh_indexes, fresh_spans, vectors, moved, len(batch)))
+
+    batch: List[Union[Chunk, str]] = []
+    next_index = 0
+    try:
+        async for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= window:
+                await flush(batch, next_index)
+                next_index += len(batch)
+                batch = []
+        if batch:
+            await flush(batch, next_index)
+            next_index += len(batch)
+        if pending is not None:
+            indexed += await pending
+            pending = None
+            _report()
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+    stats["chunks"] = next_index
+    if not next_index:
+        # Empty input never wipes a stored document.
+        return stats
+    stale = [pid for pid in existing if pid not in seen]
+    await delete_points(stale)
+    stats["deleted"] = len(stale)
+    await flush_store()
+    logger.info("Ingest diff: source=%s %s", source, stats)
+    return stats
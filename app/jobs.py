@@ -0,0 +1,235 @@
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import codecs
+import json
+import logging
+import os
+import time
+import uuid
+
+from .answer_cache import answer_cache
+from .chunking import aiter_document_chunks
+from .config import (
+    INGEST_JOBS_DIR,
+    INGEST_MAX_CONCURRENT_JOBS,
+    INGEST_READ_BYTES,
+)
+from .embeddings import embedding_cache
+from .ingest import ingest_chunks
+
+logger = logging.getLogger("uvicorn.error")
+
+_STATE_FILE = "jobs.json"
+_SAVE_INTERVAL_S = 1.0
+
+
+class IngestJob:
+    def __init__(self, job_id: str, source: str, path: str, total_bytes: int) -> None:
+        self.id = job_id
+        self.source = source
+        self.path = path
+        self.total_bytes = total_bytes
+        self.status = "queued"
+        self.bytes_read = 0
+        self.chunks_indexed = 0
+        self.diff: Optional[Dict[str, int]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.resumes = 0
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "source": self.source,
+            "status": self.status,
+            "total_bytes": self.total_bytes,
+            "bytes_read": self.bytes_read,
+            "progress": round(self.bytes_read / self.total_bytes, 4) if self.total_bytes else 0.0,
+            "chunks_indexed": self.chunks_indexed,
+            "diff": self.diff,
+            "elapsed_s": round(elapsed, 3),
+            "chunks_per_s": round(self.chunks_indexed / elapsed, 1) if elapsed else 0.0,
+            "bytes_per_s": round(self.bytes_read / elapsed, 1) if elapsed else 0.0,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "resumes": self.resumes,
+        }
+
+    def _state(self) -> Dict:
+        return {**self.to_dict(), "path": self.path}
+
+    @classmethod
+    def _from_state(cls, row: Dict) -> "IngestJob":
+        job = cls(row["id"], row["source"], row["path"], row["total_bytes"])
+        job.status = row["status"]
+        job.chunks_indexed = row.get("chunks_indexed", 0)
+        job.diff = row.get("diff")
+        job.error = row.get("error")
+        job.created_at = row.get("created_at", job.created_at)
+        job.started_at = row.get("started_at")
+        job.finished_at = row.get("finished_at")
+        job.resumes = row.get("resumes", 0)
+        return job
+
+
+class JobManager:
+    """Bounded pool of ingest workers fed from a queue, with state persisted for crash recovery."""
+
+    def __init__(self, state_dir: str, max_concurrent: int) -> None:
+        self.state_dir = state_dir
+        self.max_concurrent = max(1, max_concurrent)
+        self._jobs: Dict[str, IngestJob] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._last_save = 0.0
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.state_dir, _STATE_FILE)
+
+    async def start(self) -> None:
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._load()
+        for _ in range(self.max_concurrent):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._save(force=True)
+
+    async def submit(self, source: str, blocks: AsyncIterable[bytes]) -> IngestJob:
+        # Spool the upload to disk first so the job survives restarts and the request returns quickly.
+        os.makedirs(self.state_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.state_dir, f"{job_id}.txt")
+        total = 0
+        with open(path, "wb") as f:
+            async for block in blocks:
+                await asyncio.to_thread(f.write, block)
+                total += len(block)
+        job = IngestJob(job_id, source, path, total)
+        self._jobs[job_id] = job
+        self._save(force=True)
+        await self._queue.put(job_id)
+        logger.info("Ingest job: queued id=%s source=%s bytes=%d", job_id, source, total)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[IngestJob]:
+        return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is not None and job.status in ("queued", "running"):
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _read(self, job: IngestJob) -> AsyncIterator[str]:
+        # Read and decode in a worker thread (incremental, so characters split across blocks survive).
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+        def read(f) -> Tuple[int, str]:
+            block = f.read(INGEST_READ_BYTES)
+            return len(block), decoder.decode(block, final=not block)
+
+        with open(job.path, "rb") as f:
+            while True:
+                n, text = await asyncio.to_thread(read, f)
+                job.bytes_read += n
+                if text:
+                    yield text
+                if not n:
+                    break
+
+    async def _run(self, job: IngestJob) -> None:
+        # A resumed job re-reads the spooled file from the start; chunks it already stored
+        # have content-addressed ids, so ingest_chunks sees them as unchanged and skips them.
+        job.status = "running"
+        job.started_at = job.started_at or time.time()
+        job.bytes_read = 0
+        self._save(force=True)
+        logger.info("Ingest job: start id=%s source=%s resumes=%d", job.id, job.source, job.resumes)
+
+        def on_progress(progress: Dict[str, float]) -> None:
+            job.chunks_indexed = int(progress["chunks_indexed"])
+            self._save()
+
+        try:
+            # Workers share the API's event loop: file I/O, decoding and chunking run in threads,
+            # so the loop only sees one INGEST_READ_BYTES block of bookkeeping at a time.
+            chunks = aiter_document_chunks(self._read(job), offload=True)
+            job.diff = await ingest_chunks(job.source, chunks, on_progress=on_progress)
+            job.chunks_indexed = job.diff["chunks"]
+            job.status = "done"
+            answer_cache.invalidate_source(job.source)
+            embedding_cache.save()
+        except asyncio.CancelledError:
+            # Shutdown: leave the job "running" so it is resumed on the next start.
+            self._save(force=True)
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+            logger.warning("Ingest job: failed id=%s: %s", job.id, job.error)
+        job.finished_at = time.time()
+        if job.status == "done":
+            job.bytes_read = job.total_bytes
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+        self._save(force=True)
+        logger.info("Ingest job: %s id=%s chunks=%d", job.status, job.id, job.chunks_indexed)
+
+    def _save(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_save < _SAVE_INTERVAL_S:
+            return
+        self._last_save = now
+        tmp = f"{self._state_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([j._state() for j in self._jobs.values()], f)
+            os.replace(tmp, self._state_path)
+        except OSError as e:
+            logger.warning("Ingest jobs: state save failed: %s", e)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._state_path):
+            return
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except Exception as e:
+            logger.warning("Ingest jobs: state load failed: %s", e)
+            return
+        for row in rows:
+            job = IngestJob._from_state(row)
+            self._jobs[job.id] = job
+            if job.status in ("queued", "running"):
+                if not os.path.exists(job.path):
+                    job.status = "failed"
+                    job.error = "Spooled upload missing after restart"
+                    continue
+                if job.status == "running":
+                    job.resumes += 1
+                self._queue.put_nowait(job.id)
+                logger.info("Ingest job: resuming id=%s status=%s chunks_indexed=%d", job.id, job.status, job.chunks_indexed)
+
+
+job_manager = JobManager(INGEST_JOBS_DIR, INGEST_MAX_CONCURRENT_JOBS)
@@ -0,0 +1,386 @@
+from array import array
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import json
+import logging
+import math
+import os
+import re
+
+import numpy as np
+
+from .config import LEXICAL_INDEX_PATH, BM25_K1, BM25_B
+
+logger = logging.getLogger("uvicorn.error")
+
+# Keeps identifiers such as "ERR-404", "policy_7.2" or "v1/api" intact as one token.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./:]")
+
+# Once this fraction of the saved docnos is deleted, the next save renumbers and rewrites everything.
+_DEAD_FRACTION = 0.25
+_NO_POSTINGS = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16))
+
+
+def tokenize(text: str) -> List[str]:
+    # Compound identifiers are indexed whole and as their parts.
+    out: List[str] = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        out.append(tok)
+        if _SPLIT_RE.search(tok):
+            out.extend(p for p in _SPLIT_RE.split(tok) if p)
+    return out
+
+
+class _Segment(NamedTuple):
+    """Saved postings for docnos [lo, hi): term -> (offset, count) into the flat arrays."""
+
+    name: str
+    lo: int
+    hi: int
+    vocab: Dict[str, Tuple[int, int]]
+    docs: np.ndarray
+    tfs: np.ndarray
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        entry = self.vocab.get(term)
+        if entry is None:
+            return _NO_POSTINGS
+        off, n = entry
+        return self.docs[off:off + n], self.tfs[off:off + n]
+
+
+class BM25Index:
+    """Inverted index with memory-mapped saved segments and an in-memory delta for new docs."""
+
+    def __init__(self, path: str = "", k1: float = 1.2, b: float = 0.75) -> None:
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._ids: List[str] = []
+        self._docnos: Dict[str, int] = {}
+        # Per-docno state, preallocated and grown by doubling; search indexes into it in place.
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._live_len_total = 0
+        # Saved segments, in docno order, covering docnos [0, _saved).
+        self._segments: List[_Segment] = []
+        # Delta segment: term -> (docnos, tfs) appended since the last save.
+        self._delta: Dict[str, Tuple[array, array]] = {}
+        self._dirty = False
+        # Persistence: saved docnos removed since the last save, and the tombstone file state.
+        self._saved = 0
+        self._pending_deletes: List[int] = []
+        self._generation = 0
+        self._deleted_size = 0
+        self._next_segment = 0
+        self._legacy = False
+
+    @property
+    def count(self) -> int:
+        return len(self._docnos)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docnos
+
+    def ids(self) -> List[str]:
+        return list(self._docnos)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self._docnos:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        docno = len(self._ids)
+        if docno == len(self._alive):
+            self._grow(max(1024, 2 * docno))
+        self._ids.append(doc_id)
+        self._docnos[doc_id] = docno
+        self._lengths[docno] = len(tokens)
+        self._alive[docno] = True
+        self._live_len_total += len(tokens)
+        tfs: Dict[str, int] = {}
+        for tok in tokens:
+            tfs[tok] = tfs.get(tok, 0) + 1
+        for tok, tf in tfs.items():
+            postings = self._delta.get(tok)
+            if postings is None:
+                postings = self._delta[tok] = (array("i"), array("H"))
+            postings[0].append(docno)
+            postings[1].append(min(tf, 65535))
+        self._dirty = True
+
+    def remove(self, doc_id: str) -> None:
+        # Tombstone; postings are dropped when the index is next saved.
+        docno = self._docnos.pop(doc_id, None)
+        if docno is None:
+            return
+        self._alive[docno] = False
+        self._live_len_total -= int(self._lengths[docno])
+        if docno < self._saved:
+            self._pending_deletes.append(docno)
+        self._dirty = True
+
+    def _grow(self, capacity: int) -> None:
+        n = len(self._ids)
+        lengths = np.zeros(capacity, dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        lengths[:n] = self._lengths[:n]
+        alive[:n] = self._alive[:n]
+        self._lengths, self._alive = lengths, alive
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        return self._gather(term, [s.postings for s in self._segments] + [self._delta_postings])
+
+    def _delta_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        delta = self._delta.get(term)
+        if delta is None:
+            return _NO_POSTINGS
+        return np.frombuffer(delta[0], dtype=np.int32), np.frombuffer(delta[1], dtype=np.uint16)
+
+    @staticmethod
+    def _gather(
+        term: str, sources: List[Callable[[str], Tuple[np.ndarray, np.ndarray]]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        parts = [p for p in (source(term) for source in sources) if len(p[0])]
+        if not parts:
+            return _NO_POSTINGS
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        n_live = self.count
+        if not n_live or limit <= 0:
+            return []
+        avgdl = max(self._live_len_total / n_live, 1.0)
+        # Work is proportional to the matched postings, not to the number of docs.
+        hit_docs: List[np.ndarray] = []
+        hit_scores: List[np.ndarray] = []
+        for term in set(tokenize(query)):
+            docs, tfs = self._postings(term)
+            if not len(docs):
+                continue
+            live = self._alive[docs]
+            docs, tf = docs[live], tfs[live].astype(np.float32)
+            df = len(docs)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n_live - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[docs] / avgdl)
+            hit_docs.append(docs)
+            hit_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if not hit_docs:
+            return []
+        hit, inverse = np.unique(np.concatenate(hit_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(hit_scores))
+        k = min(limit, len(hit))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[hit[i]], float(scores[i])) for i in top]
+
+    # ---- persistence ----
+    # Each save writes the delta as a new segment file set; the newest segment is merged into the
+    # one before it while it is at least as large, so there are O(log n) segments and each posting
+    # is rewritten O(log n) times. Deletes are appended to a tombstone file. lexicon.json is
+    # written last and lists the segments and the tombstone size: files it does not reference
+    # are ignored by load(), so a crash mid-save leaves the previous state intact.
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        previous_generation = self._generation
+        previous = {s.name for s in self._segments}
+        first_new = self._next_segment
+        n = len(self._ids)
+        if self._legacy or n - self.count > n * _DEAD_FRACTION:
+            self._rewrite()
+        else:
+            self._append()
+        meta = {
+            "generation": self._generation,
+            "segments": [[s.name, s.lo, s.hi] for s in self._segments],
+            "deleted": self._deleted_size,
+            "next_segment": self._next_segment,
+        }
+        tmp = self._file("lexicon.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("lexicon.json"))
+        stale = [
+            f"{name}{ext}"
+            # Replaced segments, including ones merged away within this save.
+            for name in previous.union(f"seg{i}" for i in range(first_new, self._next_segment))
+            - {s.name for s in self._segments}
+            for ext in (".json", ".docs.npy", ".tfs.npy", ".lengths.npy")
+        ]
+        if self._generation != previous_generation:
+            stale.append(f"deleted.i64.{previous_generation}")
+        if self._legacy:
+            stale += ["postings_docs.npy", "postings_tfs.npy", "doc_lengths.npy"]
+            self._legacy = False
+        for name in stale:
+            try:
+                os.remove(self._file(name))
+            except OSError:
+                pass
+        self._dirty = False
+        logger.info(
+            "Lexical index: saved docs=%d segments=%d generation=%d path=%s",
+            self.count, len(self._segments), self._generation, self.path,
+        )
+
+    def _append(self) -> None:
+        start, end = self._saved, len(self._ids)
+        if end > start:
+            vocab, docs, tfs = self._merged_postings(self._delta, [self._delta_postings])
+            self._segments.append(self._write_segment(start, end, vocab, docs, tfs))
+            while len(self._segments) >= 2 and len(self._segments[-1].docs) >= len(self._segments[-2].docs):
+                a, b = self._segments[-2:]
+                vocab, docs, tfs = self._merged_postings(set(a.vocab) | set(b.vocab), [a.postings, b.postings])
+                self._segments[-2:] = [self._write_segment(a.lo, b.hi, vocab, docs, tfs)]
+        deleted = self._pending_deletes + (np.nonzero(~self._alive[start:end])[0] + start).tolist()
+        self._write_deleted(np.asarray(deleted, dtype=np.int64).tobytes())
+        self._delta = {}
+        self._saved = end
+        self._pending_deletes = []
+
+    def _rewrite(self) -> None:
+        # One compacted segment: dead docs dropped, docnos renumbered, tombstones start over.
+        n = len(self._ids)
+        alive = self._alive[:n]
+        remap = np.full(n, -1, dtype=np.int64)
+        remap[alive] = np.arange(int(alive.sum()))
+        terms = set(self._delta).union(*(s.vocab for s in self._segments))
+        sources = [s.postings for s in self._segments] + [self._delta_postings]
+        vocab, docs, tfs = self._merged_postings(terms, sources, remap)
+        keep = np.nonzero(alive)[0]
+        self._ids = [self._ids[i] for i in keep]
+        self._docnos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._lengths = self._lengths[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._delta = {}
+        self._segments = [self._write_segment(0, len(self._ids), vocab, docs, tfs)]
+        self._saved = len(self._ids)
+        self._pending_deletes = []
+        self._generation += 1
+        self._deleted_size = 0
+        self._write_deleted(b"")
+
+    def _merged_postings(
+        self,
+        terms: Iterable[str],
+        sources: List[Callable[[str], Tuple[np.ndarray, np.ndarray]]],
+        remap: Optional[np.ndarray] = None,
+    ) -> Tuple[Dict[str, Tuple[int, int]], np.ndarray, np.ndarray]:
+        vocab: Dict[str, Tuple[int, int]] = {}
+        docs_parts: List[np.ndarray] = []
+        tfs_parts: List[np.ndarray] = []
+        offset = 0
+        for term in sorted(terms):
+            docs, tfs = self._gather(term, sources)
+            keep = self._alive[docs]
+            docs, tfs = docs[keep], tfs[keep]
+            if not len(docs):
+                continue
+            if remap is not None:
+                docs = remap[docs]
+            vocab[term] = (offset, len(docs))
+            docs_parts.append(docs.astype(np.int32))
+            tfs_parts.append(tfs)
+            offset += len(docs)
+        if not docs_parts:
+            return vocab, _NO_POSTINGS[0], _NO_POSTINGS[1]
+        return vocab, np.concatenate(docs_parts), np.concatenate(tfs_parts)
+
+    def _write_segment(
+        self, lo: int, hi: int, vocab: Dict[str, Tuple[int, int]], docs: np.ndarray, tfs: np.ndarray
+    ) -> _Segment:
+        # Segment files are never overwritten: a new name each time, referenced once lexicon.json is.
+        name = f"seg{self._next_segment}"
+        self._next_segment += 1
+        np.save(self._file(f"{name}.docs.npy"), docs)
+        np.save(self._file(f"{name}.tfs.npy"), tfs)
+        np.save(self._file(f"{name}.lengths.npy"), self._lengths[lo:hi].astype(np.uint32))
+        with open(self._file(f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids[lo:hi], "vocab": vocab}, f)
+        return self._open_segment(name, lo, hi, vocab)
+
+    def _open_segment(self, name: str, lo: int, hi: int, vocab: Dict[str, Tuple[int, int]]) -> _Segment:
+        docs = np.load(self._file(f"{name}.docs.npy"), mmap_mode="r")
+        tfs = np.load(self._file(f"{name}.tfs.npy"), mmap_mode="r")
+        if len(docs) != len(tfs) or len(docs) != sum(v[1] for v in vocab.values()):
+            raise ValueError(f"segment {name} is out of sync")
+        return _Segment(name, lo, hi, vocab, docs, tfs)
+
+    def _write_deleted(self, data: bytes) -> None:
+        path = self._file(f"deleted.i64.{self._generation}")
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            # Drop anything a crashed save appended after the last lexicon.json.
+            f.truncate(self._deleted_size)
+            f.seek(0, os.SEEK_END)
+            f.write(data)
+            self._deleted_size = f.tell()
+
+    def load(self) -> None:
+        lexicon = self._file("lexicon.json") if self.path else ""
+        if not lexicon or not os.path.exists(lexicon):
+            return
+        try:
+            with open(lexicon, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if "segments" not in meta:
+                segments, ids, lengths = self._load_unversioned(meta)
+                dead = np.zeros(0, dtype=np.int64)
+            else:
+                segments, ids, parts = [], [], []
+                for name, lo, hi in meta["segments"]:
+                    with open(self._file(f"{name}.json"), "r", encoding="utf-8") as f:
+                        seg = json.load(f)
+                    seg_lengths = np.load(self._file(f"{name}.lengths.npy"))
+                    if lo != len(ids) or not hi - lo == len(seg["ids"]) == len(seg_lengths):
+                        raise ValueError("index files are out of sync")
+                    vocab = {term: (int(v[0]), int(v[1])) for term, v in seg["vocab"].items()}
+                    segments.append(self._open_segment(name, lo, hi, vocab))
+                    ids.extend(seg["ids"])
+                    parts.append(seg_lengths)
+                lengths = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint32)
+                with open(self._file(f"deleted.i64.{meta['generation']}"), "rb") as f:
+                    dead = np.frombuffer(f.read(meta["deleted"]), dtype=np.int64)
+        except Exception as e:
+            logger.warning("Lexical index: load failed path=%s: %s", self.path, e)
+            return
+        alive = np.ones(len(ids), dtype=bool)
+        alive[dead] = False
+        self._ids = ids
+        self._docnos = {doc_id: i for i, doc_id in enumerate(ids) if alive[i]}
+        self._lengths = lengths.astype(np.float32)
+        self._alive = alive
+        self._live_len_total = int(lengths[alive].sum())
+        self._segments = segments
+        self._delta = {}
+        self._saved = len(ids)
+        self._pending_deletes = []
+        if "segments" in meta:
+            self._generation = meta["generation"]
+            self._deleted_size = meta["deleted"]
+            self._next_segment = meta["next_segment"]
+        logger.info("Lexical index: loaded docs=%d segments=%d path=%s", self.count, len(segments), self.path)
+
+    def _load_unversioned(self, meta: Dict) -> Tuple[List[_Segment], List[str], np.ndarray]:
+        # Layout before segmented saves (one merged segment); rewritten on the next save.
+        lengths = np.load(self._file("doc_lengths.npy"))
+        if len(lengths) != len(meta["ids"]):
+            raise ValueError("index files are out of sync")
+        vocab = {term: (int(v[0]), int(v[1])) for term, v in meta["vocab"].items()}
+        docs = np.load(self._file("postings_docs.npy"), mmap_mode="r")
+        tfs = np.load(self._file("postings_tfs.npy"), mmap_mode="r")
+        if len(docs) != meta["postings"]:
+            raise ValueError("index files are out of sync")
+        self._legacy = self._dirty = True
+        return [_Segment("", 0, len(lengths), vocab, docs, tfs)], list(meta["ids"]), lengths
+
+
+lexical_index = BM25Index(LEXICAL_INDEX_PATH, k1=BM25_K1, b=BM25_B)
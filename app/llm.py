@@ -1,14 +1,176 @@
-from typing import Any, Dict, Iterator, List
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import heapq
+import itertools
 import logging
 import json
-import requests
+import math
+import time
 from fastapi import HTTPException
-from .config import LLAMA_BASE, ROUTER_GRAMMAR_PATH
+from .backends import llm_backend
+from .config import ROUTER_GRAMMAR_PATH, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_SHORT_MAX_TOKENS, LLM_COALESCE
+from .metrics import observe_stage, stage
 from .schemas.schemas_llm import normalize_router_output, RouterOutput, FinalAnswer
 
 logger = logging.getLogger("uvicorn.error")
 
-def chat(messages: List[Dict[str, Any]], max_tokens: int = 300, temperature: float = 0.2) -> str:
+# ---- scheduling ----
+
+# Priority order: router calls gate every request, short answers finish quickly, long generations wait.
+LANES = ("router", "short", "long")
+
+# Absolute time.monotonic() deadline of the current request, if the client sent one.
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+def set_deadline(timeout_s: Optional[float]) -> None:
+    _deadline.set(time.monotonic() + timeout_s if timeout_s and timeout_s > 0 else None)
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded before the LLM answered")
+    return left
+
+
+def lane_for(max_tokens: int) -> str:
+    return "short" if max_tokens <= LLM_SHORT_MAX_TOKENS else "long"
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM backend: bounded concurrency, priority lanes,
+    queue-depth load shedding, client deadlines and coalescing of identical in-flight calls."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, coalesce: bool = True) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.coalesce = coalesce
+        self._active = 0
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._queued = {lane: 0 for lane in LANES}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Moving average of slot hold time, used to size Retry-After.
+        self._service_s = 1.0
+        self.counts = {"admitted": 0, "waited": 0, "shed": 0, "deadline_expired": 0, "coalesced": 0}
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def check(self) -> None:
+        # Fast 429 when the queue is full. Streams call this before their response starts.
+        if not self.max_queue or self._active < self.max_concurrency or self.queued < self.max_queue:
+            return
+        self.counts["shed"] += 1
+        retry_after = max(1, math.ceil((self.queued + 1) / self.max_concurrency * self._service_s))
+        raise HTTPException(
+            status_code=429,
+            detail="LLM backend is saturated, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    @asynccontextmanager
+    async def slot(self, lane: str) -> AsyncIterator[Optional[float]]:
+        # Yields the time left until the client deadline (None = no deadline) for the upstream call.
+        timeout = remaining_time()
+        self.check()
+        t0 = time.perf_counter()
+        if self._active < self.max_concurrency and not self._heap:
+            self._active += 1
+        else:
+            fut: asyncio.Future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._heap, (LANES.index(lane), next(self._seq), fut))
+            self._queued[lane] += 1
+            self.counts["waited"] += 1
+            try:
+                await asyncio.wait_for(fut, timeout)
+            except BaseException as e:
+                if fut.done() and not fut.cancelled():
+                    # The slot was handed over just as we gave up on it: pass it on.
+                    self._release()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counts["deadline_expired"] += 1
+                    raise HTTPException(status_code=504, detail="Request deadline exceeded while queued for the LLM")
+                raise
+            finally:
+                self._queued[lane] -= 1
+        observe_stage(f"llm_queue_{lane}", (time.perf_counter() - t0) * 1000)
+        self.counts["admitted"] += 1
+        start = time.perf_counter()
+        try:
+            yield remaining_time()
+        finally:
+            self._service_s = 0.8 * self._service_s + 0.2 * (time.perf_counter() - start)
+            self._release()
+
+    def _release(self) -> None:
+        # Hand the slot to the highest-priority live waiter (cancelled ones are skipped).
+        while self._heap:
+            _, _, fut = heapq.heappop(self._heap)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    async def shared(self, payload: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        # Identical payloads in flight at the same time are sent once; every caller gets the result.
+        # The call runs under its first caller's deadline, so only callers with the same deadline
+        # (none, or one request's batch) share it.
+        if not self.coalesce:
+            return await call()
+        body = json.dumps(payload, sort_keys=True) + f"|{_deadline.get()}"
+        key = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(call())
+            self._inflight[key] = task
+
+            def _done(t: asyncio.Task) -> None:
+                self._inflight.pop(key, None)
+                if not t.cancelled():
+                    t.exception()
+
+            task.add_done_callback(_done)
+        else:
+            self.counts["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": dict(self._queued),
+            "avg_service_s": round(self._service_s, 3),
+            **self.counts,
+        }
+
+
+scheduler = LLMScheduler(LLM_MAX_CONCURRENCY * len(llm_backend.nodes), LLM_MAX_QUEUE, coalesce=LLM_COALESCE)
+
+
+async def _complete(lane: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    # Non-streaming chat completion through the scheduler; returns the response JSON.
+    async def call() -> Dict[str, Any]:
+        async with scheduler.slot(lane) as timeout:
+            try:
+                r = await asyncio.wait_for(llm_backend.post("/v1/chat/completions", json=payload, timeout=timeout), timeout)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="Request deadline exceeded while the LLM was answering")
+        r.raise_for_status()
+        return r.json()
+
+    return await scheduler.shared(payload, call)
+
+async def chat(messages: List[Dict[str, Any]], max_tokens: int = 300, temperature: float = 0.2) -> str:
     payload = {
         "model": "llama3.2:3b",
         "messages": messages,
@@ -19,11 +181,11 @@ def chat(messages: List[Dict[str, Any]], max_tokens: int = 300, temperature: flo
     try:
         total_chars = sum(len(m.get("content", "")) for m in messages)
         logger.info("Ollama: model=%s max_tokens=%d temperature=%.2f messages=%d chars=%d", payload["model"], max_tokens, temperature, len(messages), total_chars)
-        logger.info("Ollama prompt payload: %s", payload)
-        r = requests.post(f"{LLAMA_BASE}/v1/chat/completions", json=payload, timeout=900)
-        r.raise_for_status()
-        j = r.json()
-        logger.info("Ollama response: %s", j)
+        # Full payloads only at DEBUG: formatting large prompts on every call costs throughput.
+        logger.debug("Ollama prompt payload: %s", payload)
+        with stage("llm_total"):
+            j = await _complete(lane_for(max_tokens), payload)
+        logger.debug("Ollama response: %s", j)
 
         try:
             return j["choices"][0]["message"]["content"]
@@ -39,7 +201,8 @@ def chat(messages: List[Dict[str, Any]], max_tokens: int = 300, temperature: flo
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Chat call failed: {e}")
 
-def route_action(user_message: str) -> RouterOutput:
+async def route_action(user_message: str) -> Optional[RouterOutput]:
+    # None when the router call failed or its output could not be repaired.
     system = (
         "You are a strict router. You must return ONLY a JSON object.\n"
         "You must output EXACTLY one of these shapes:\n"
@@ -68,10 +231,9 @@ def route_action(user_message: str) -> RouterOutput:
         except Exception as e:
             logger.warning("Router grammar load failed: %s", e)
     try:
-        logger.info("Router: payload=%s", payload)
-        r = requests.post(f"{LLAMA_BASE}/v1/chat/completions", json=payload, timeout=900)
-        r.raise_for_status()
-        j = r.json()
+        logger.debug("Router: payload=%s", payload)
+        with stage("router_llm"):
+            j = await _complete("router", payload)
         raw_output = j["choices"][0]["message"]["content"]
         logger.info("Router: raw_output=%s", raw_output)
         try:
@@ -97,27 +259,60 @@ def route_action(user_message: str) -> RouterOutput:
                 "max_tokens": 200,
                 "temperature": 0.0,
             }
-            logger.info("Router repair: payload=%s", repair_payload)
-            r2 = requests.post(f"{LLAMA_BASE}/v1/chat/completions", json=repair_payload, timeout=900)
-            r2.raise_for_status()
-            j2 = r2.json()
+            logger.debug("Router repair: payload=%s", repair_payload)
+            with stage("router_repair"):
+                j2 = await _complete("router", repair_payload)
             raw_output2 = j2["choices"][0]["message"]["content"]
             logger.info("Router repair: raw_output=%s", raw_output2)
             try:
                 return normalize_router_output(json.loads(raw_output2))
             except Exception as e2:
-                logger.warning("Router repair failed, defaulting to RAG: %s", e2)
-                return FinalAnswer(type="final", answer="use_rag")
+                logger.warning("Router repair failed: %s", e2)
+                return None
+    except HTTPException:
+        # Load shedding (429) and deadlines (504) apply to the whole request, not just routing.
+        raise
     except Exception as e:
-        logger.warning("Router failed, defaulting to RAG: %s", e)
-        return FinalAnswer(type="final", answer="use_rag")
+        logger.warning("Router failed: %s", e)
+        return None
+
+_DONE_MARKER = b"data: [DONE]"
+SSE_DONE = b"data: [DONE]\n\n"
+SSE_ROLE = b'data: {"choices":[{"index":0,"delta":{"role":"assistant"}}]}\n\n'
+
+
+def _partial_marker(buf: bytes) -> int:
+    # Length of the longest suffix of `buf` that is a proper prefix of the [DONE] marker.
+    for n in range(min(len(buf), len(_DONE_MARKER) - 1), 0, -1):
+        if _DONE_MARKER.startswith(buf[-n:]):
+            return n
+    return 0
+
+
+def sse_delta(content: str) -> bytes:
+    return b"data: " + json.dumps({"choices": [{"delta": {"content": content}}]}).encode("utf-8") + b"\n\n"
+
+
+# Prefix of an error event (ours or the upstream's); such a stream is never cached as an answer.
+SSE_ERROR = b'data: {"error"'
+
+
+def sse_error(e: HTTPException) -> bytes:
+    # Leading blank line: ends an event the upstream left half-sent.
+    error = {"error": {"message": str(e.detail), "code": e.status_code}}
+    return b"\n\ndata: " + json.dumps(error).encode("utf-8") + b"\n\n"
+
 
-def chat_stream(
+async def _relay_stream(
     messages: List[Dict[str, Any]],
     max_tokens: int = 300,
     temperature: float = 0.2,
     final_suffix: str = "",
-) -> Iterator[str]:
+    early_role: bool = False,
+) -> AsyncIterator[bytes]:
+    # Relays the upstream SSE body as raw bytes (no per-line decode/re-encode); the only thing
+    # inserted is the citation suffix event right before the upstream [DONE]. Closing this
+    # generator (client disconnect) closes the upstream response, which stops the generation.
     payload = {
         "model": "llama3.2:3b",
         "messages": messages,
@@ -125,6 +320,7 @@ def chat_stream(
         "temperature": temperature,
         "stream": True,
     }
+    tail = (sse_delta(final_suffix) if final_suffix else b"") + SSE_DONE
     try:
         total_chars = sum(len(m.get("content", "")) for m in messages)
         logger.info(
@@ -135,34 +331,78 @@ def chat_stream(
             len(messages),
             total_chars,
         )
-        logger.info("Ollama stream payload: %s", payload)
+        logger.debug("Ollama stream payload: %s", payload)
 
-        r = requests.post(
-            f"{LLAMA_BASE}/v1/chat/completions",
-            json=payload,
-            timeout=900,
-            stream=True,
-        )
-        r.raise_for_status()
-
-        for line in r.iter_lines(decode_unicode=True):
-            if not line:
-                continue
-            if line.startswith("data: "):
-                data = line[len("data: "):]
-                if data == "[DONE]":
-                    if final_suffix:
-                        yield f"data: {json.dumps({'choices': [{'delta': {'content': final_suffix}}]})}\n\n"
-                    yield "data: [DONE]\n\n"
-                    return
-                yield f"{line}\n\n"
-            else:
-                yield f"{line}\n\n"
-
-        if final_suffix:
-            yield f"data: {json.dumps({'choices': [{'delta': {'content': final_suffix}}]})}\n\n"
-        yield "data: [DONE]\n\n"
+        t0 = time.perf_counter()
+        first = True
+        completed = False
+        async with scheduler.slot(lane_for(max_tokens)) as timeout, llm_backend.stream(
+            "/v1/chat/completions", json=payload, timeout=timeout
+        ) as r:
+            r.raise_for_status()
+            if early_role:
+                # First byte before the model answers, so clients and proxies see the stream open.
+                # Only now: the slot is held and the upstream accepted the request.
+                yield SSE_ROLE
+            try:
+                buf = b""
+                async for block in r.aiter_bytes():
+                    if not block:
+                        continue
+                    if first:
+                        observe_stage("llm_ttft", (time.perf_counter() - t0) * 1000)
+                        first = False
+                    buf = buf + block if buf else block
+                    done_at = buf.find(_DONE_MARKER)
+                    if done_at >= 0:
+                        if done_at:
+                            yield buf[:done_at]
+                        completed = True
+                        break
+                    # Hold back only a trailing partial "data: [DONE]" (split across reads);
+                    # complete events go out as soon as they arrive.
+                    held = _partial_marker(buf)
+                    if len(buf) > held:
+                        yield buf[: len(buf) - held]
+                        buf = buf[len(buf) - held:]
+                if not completed and buf:
+                    yield buf if buf.endswith(b"\n") else buf + b"\n\n"
+            except (asyncio.CancelledError, GeneratorExit):
+                logger.info("Ollama stream: client went away, upstream closed after %.1f ms", (time.perf_counter() - t0) * 1000)
+                raise
+        observe_stage("llm_total", (time.perf_counter() - t0) * 1000)
+        yield tail
     except HTTPException:
         raise
+    except (asyncio.CancelledError, GeneratorExit):
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Chat stream failed: {e}")
+
+
+async def chat_stream(
+    messages: List[Dict[str, Any]],
+    max_tokens: int = 300,
+    temperature: float = 0.2,
+    final_suffix: str = "",
+    early_role: bool = False,
+) -> AsyncIterator[bytes]:
+    # Runs the relay up to its first byte before the caller starts the response, so queue
+    # shedding (429 + Retry-After), an expired deadline (504) and upstream failures (502) are
+    # raised here while a real status code can still be sent.
+    stream = _relay_stream(messages, max_tokens, temperature, final_suffix, early_role)
+    first = await stream.__anext__()
+    return _resume(first, stream)
+
+
+async def _resume(first: bytes, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Past the first byte the status is sent: a failure ends the stream with an error event.
+    try:
+        yield first
+        async for block in stream:
+            yield block
+    except HTTPException as e:
+        logger.warning("Ollama stream: failed mid-stream: %s", e.detail)
+        yield sse_error(e) + SSE_DONE
+    finally:
+        await stream.aclose()
@@ -0,0 +1,548 @@
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .config import EMBEDDINGS_MODEL, LOCAL_INDEX_PATH, LOCAL_INDEX_IVF_LISTS, LOCAL_INDEX_IVF_PROBES
+from .points import POSITION_KEYS, PointFilter, content_hash, point_id, position
+
+logger = logging.getLogger("uvicorn.error")
+
+# Re-train IVF centroids once the index has grown this much since the last training.
+_IVF_RETRAIN_GROWTH = 2.0
+# Minimum points per list before IVF is worth it; below this everything is scanned exactly.
+_IVF_MIN_POINTS_PER_LIST = 32
+_KMEANS_ITERS = 10
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+class LocalIndex:
+    """In-process cosine index: float32 row matrix, tombstoned deletes, optional IVF probing."""
+
+    def __init__(self, path: str = "", ivf_lists: int = 0, ivf_probes: int = 8) -> None:
+        self.path = path
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = max(1, ivf_probes)
+        self.dim: Optional[int] = None
+        self.embedding_model: Optional[str] = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._n = 0
+        self._ids: List[str] = []
+        self._payloads: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._by_source: Dict[str, Set[str]] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._trained_at = 0
+        self._lists: Optional[List[np.ndarray]] = None
+        self._dirty = False
+        # Persistence: rows [0, _saved) are on disk under the current numbering; deletes and
+        # payload changes to those rows since the last save; _rewrite forces a new generation.
+        self._generation = 0
+        self._sizes: Dict[str, int] = {}
+        self._saved = 0
+        self._pending_deletes: List[int] = []
+        self._pending_updates: Set[int] = set()
+        self._logged_updates = 0
+        self._rewrite = True
+
+    # ---- collection ----
+
+    def create(self, dim: int, embedding_model: Optional[str] = None) -> None:
+        self.dim = dim
+        self.embedding_model = embedding_model
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._dirty = True
+
+    @property
+    def count(self) -> int:
+        return len(self._rows)
+
+    # ---- writes ----
+
+    def _reserve(self, extra: int) -> None:
+        need = self._n + extra
+        cap = self._vectors.shape[0]
+        if need <= cap and self._vectors.flags.writeable:
+            return
+        new_cap = max(need, cap * 2, 1024)
+        grown = np.zeros((new_cap, self.dim), dtype=np.float32)
+        grown[: self._n] = self._vectors[: self._n]
+        self._vectors = grown
+        alive = np.zeros(new_cap, dtype=bool)
+        alive[: self._n] = self._alive[: self._n]
+        self._alive = alive
+        assign = np.full(new_cap, -1, dtype=np.int32)
+        assign[: self._n] = self._assign[: self._n]
+        self._assign = assign
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict]) -> None:
+        if not ids:
+            return
+        mat = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.delete([i for i in ids if i in self._rows])
+        self._reserve(len(ids))
+        start = self._n
+        end = start + len(ids)
+        self._vectors[start:end] = mat
+        self._alive[start:end] = True
+        if self._centroids is not None:
+            self._assign[start:end] = np.argmax(mat @ self._centroids.T, axis=1)
+        for offset, (pid, payload) in enumerate(zip(ids, payloads)):
+            self._ids.append(pid)
+            self._payloads.append(payload)
+            self._rows[pid] = start + offset
+            self._by_source.setdefault(str(payload.get("source")), set()).add(pid)
+        self._n = end
+        self._dirty = True
+        self._lists = None
+        self._maybe_train()
+
+    def delete(self, ids: List[str]) -> None:
+        for pid in ids:
+            row = self._rows.pop(pid, None)
+            if row is None:
+                continue
+            self._alive[row] = False
+            if row < self._saved:
+                self._pending_deletes.append(row)
+            source = str(self._payloads[row].get("source"))
+            members = self._by_source.get(source)
+            if members is not None:
+                members.discard(pid)
+                if not members:
+                    del self._by_source[source]
+            self._dirty = True
+        # Compact once a quarter of the rows are dead.
+        if self._n and self._n - len(self._rows) > self._n // 4:
+            self._compact()
+
+    def set_payload(self, pid: str, values: Dict) -> None:
+        row = self._rows.get(pid)
+        if row is not None:
+            self._payloads[row].update(values)
+            if row < self._saved:
+                self._pending_updates.add(row)
+            self._dirty = True
+
+    def _compact(self) -> None:
+        keep = np.nonzero(self._alive[: self._n])[0]
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._assign = self._assign[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[i] for i in keep]
+        self._payloads = [self._payloads[i] for i in keep]
+        self._rows = {pid: row for row, pid in enumerate(self._ids)}
+        self._n = len(keep)
+        self._lists = None
+        self._rewrite = True
+
+    # ---- IVF ----
+
+    def _maybe_train(self) -> None:
+        if self.ivf_lists <= 0 or self.count < self.ivf_lists * _IVF_MIN_POINTS_PER_LIST:
+            return
+        if self._centroids is not None and self.count < self._trained_at * _IVF_RETRAIN_GROWTH:
+            return
+        self._train()
+
+    def _train(self) -> None:
+        # Spherical k-means on (a sample of) the live rows.
+        live = np.nonzero(self._alive[: self._n])[0]
+        rng = np.random.default_rng(0)
+        sample = live if len(live) <= self.ivf_lists * 256 else rng.choice(live, self.ivf_lists * 256, replace=False)
+        data = self._vectors[sample]
+        centroids = data[rng.choice(len(data), self.ivf_lists, replace=False)].copy()
+        for _ in range(_KMEANS_ITERS):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for c in range(self.ivf_lists):
+                members = data[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        self._centroids = centroids.astype(np.float32)
+        self._assign[: self._n] = np.argmax(self._vectors[: self._n] @ self._centroids.T, axis=1)
+        self._trained_at = self.count
+        self._lists = None
+        self._rewrite = True
+        logger.info("Local index: trained IVF lists=%d points=%d", self.ivf_lists, self.count)
+
+    # ---- reads ----
+
+    def search_batch(self, queries: List[List[float]], limit: int, flt: Optional[PointFilter] = None) -> List[List[Dict]]:
+        if not self._rows or limit <= 0:
+            return [[] for _ in queries]
+        q = _normalize(np.asarray(queries, dtype=np.float32))
+        if flt is not None:
+            # Filtered: exact scan of the matching rows only (source sets act as the payload index).
+            rows = self._filter_rows(flt)
+            if not len(rows):
+                return [[] for _ in queries]
+            scores = q @ self._vectors[rows].T
+            return [self._top(row_scores, rows, limit) for row_scores in scores]
+        vectors = self._vectors[: self._n]
+        if self._centroids is not None:
+            return [self._search_ivf(row, limit) for row in q]
+        scores = q @ vectors.T
+        scores[:, ~self._alive[: self._n]] = -np.inf
+        return [self._top(row_scores, np.arange(self._n), limit) for row_scores in scores]
+
+    def _filter_rows(self, flt: PointFilter) -> np.ndarray:
+        if flt.sources:
+            rows = [self._rows[pid] for s in flt.sources for pid in self._by_source.get(s, ())]
+        else:
+            rows = np.nonzero(self._alive[: self._n])[0].tolist()
+        if flt.has_time_range:
+            rows = [r for r in rows if flt.matches(self._payloads[r])]
+        return np.asarray(sorted(rows), dtype=np.int64)
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        # Row ids per centroid, rebuilt lazily after writes (one argsort over the assignments).
+        if self._lists is None:
+            assign = self._assign[: self._n]
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+        return self._lists
+
+    def _search_ivf(self, q: np.ndarray, limit: int) -> List[Dict]:
+        lists = self._inverted_lists()
+        probes = np.argpartition(-(self._centroids @ q), min(self.ivf_probes, len(lists)) - 1)[: self.ivf_probes]
+        rows = np.concatenate([lists[c] for c in probes])
+        rows = rows[self._alive[rows]]
+        if len(rows) < limit:
+            rows = np.nonzero(self._alive[: self._n])[0]
+        return self._top(self._vectors[rows] @ q, rows, limit)
+
+    def _top(self, scores: np.ndarray, rows: np.ndarray, limit: int) -> List[Dict]:
+        k = min(limit, len(scores))
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        out: List[Dict] = []
+        for i in idx:
+            if not np.isfinite(scores[i]):
+                continue
+            row = int(rows[i])
+            out.append({"id": self._ids[row], "score": float(scores[i]), "payload": self._payloads[row]})
+        return out
+
+    def payloads(self, ids: List[str]) -> List[Tuple[str, Dict]]:
+        return [(pid, self._payloads[self._rows[pid]]) for pid in ids if pid in self._rows]
+
+    def source_points(self, source: str) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        for pid in self._by_source.get(source, ()):
+            payload = self._payloads[self._rows[pid]]
+            out[pid] = {k: payload[k] for k in POSITION_KEYS if k in payload}
+        return out
+
+    # ---- persistence ----
+    #
+    # One generation of files, appended to by each save and rewritten whole only when rows are
+    # renumbered (compaction) or reassigned (IVF training), or the update log outgrows the index:
+    #   vectors.f32.<gen>     float32 rows      payloads.jsonl.<gen>  {"id", "payload"} per row
+    #   assign.i32.<gen>      IVF list per row  updates.jsonl.<gen>   {"row", "payload"} changes
+    #   deleted.i64.<gen>     tombstoned rows   centroids.npy.<gen>
+    # meta.json is written last and records each file's size: load() reads no further, and the
+    # next append truncates back to it, so a crash mid-save leaves the previous state intact.
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"{name}.{self._generation if generation is None else generation}")
+
+    def save(self) -> None:
+        if not self.path or not self._dirty or self.dim is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        previous = self._generation
+        if self._rewrite or self._logged_updates > self.count:
+            self._write_all()
+        else:
+            self._append()
+        meta = {
+            "dim": self.dim,
+            "embedding_model": self.embedding_model,
+            "count": self._n,
+            "trained_at": self._trained_at,
+            "ivf": self._centroids is not None,
+            "generation": self._generation,
+            "sizes": self._sizes,
+        }
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+        if self._generation != previous:
+            self._remove_generation(previous)
+        self._dirty = False
+        logger.info(
+            "Local index: saved points=%d rows=%d generation=%d path=%s", self.count, self._n, self._generation, self.path
+        )
+
+    def _write_all(self) -> None:
+        self._compact()
+        self._generation += 1
+        self._sizes = {}
+        self._saved = 0
+        self._pending_deletes = []
+        self._pending_updates = set()
+        self._logged_updates = 0
+        for name in ("vectors.f32", "assign.i32", "payloads.jsonl", "updates.jsonl", "deleted.i64"):
+            with open(self._file(name), "wb"):
+                pass
+        if self._centroids is not None:
+            with open(self._file("centroids.npy"), "wb") as f:
+                np.save(f, self._centroids)
+        self._rewrite = False
+        self._append()
+
+    def _append(self) -> None:
+        start, end = self._saved, self._n
+        deleted = self._pending_deletes + (np.nonzero(~self._alive[start:end])[0] + start).tolist()
+        updates = [r for r in sorted(self._pending_updates) if self._alive[r]]
+        self._write("vectors.f32", np.ascontiguousarray(self._vectors[start:end], dtype=np.float32).tobytes())
+        self._write("assign.i32", np.ascontiguousarray(self._assign[start:end], dtype=np.int32).tobytes())
+        self._write("payloads.jsonl", "".join(
+            json.dumps({"id": self._ids[r], "payload": self._payloads[r]}) + "\n" for r in range(start, end)
+        ).encode("utf-8"))
+        self._write("updates.jsonl", "".join(
+            json.dumps({"row": r, "payload": self._payloads[r]}) + "\n" for r in updates
+        ).encode("utf-8"))
+        self._write("deleted.i64", np.asarray(deleted, dtype=np.int64).tobytes())
+        self._saved = end
+        self._pending_deletes = []
+        self._pending_updates = set()
+        self._logged_updates += len(updates)
+
+    def _write(self, name: str, data: bytes) -> None:
+        path = self._file(name)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            # Drop anything a crashed save appended after the last meta.json.
+            f.truncate(self._sizes.get(name, 0))
+            f.seek(0, os.SEEK_END)
+            f.write(data)
+            self._sizes[name] = f.tell()
+
+    def _remove_generation(self, generation: int) -> None:
+        names = ("vectors.f32", "assign.i32", "payloads.jsonl", "updates.jsonl", "deleted.i64", "centroids.npy")
+        # Files of the layout before generations existed, too.
+        paths = [self._file(n, generation) for n in names] + [
+            os.path.join(self.path, n) for n in ("vectors.npy", "assign.npy", "centroids.npy", "payloads.jsonl")
+        ]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _read(self, name: str) -> bytes:
+        with open(self._file(name), "rb") as f:
+            return f.read(self._sizes.get(name, 0))
+
+    def load(self) -> None:
+        meta_path = os.path.join(self.path, "meta.json") if self.path else ""
+        if not meta_path or not os.path.exists(meta_path):
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if "generation" not in meta:
+                self._load_unversioned(meta)
+                return
+            n, dim = meta["count"], meta["dim"]
+            self._generation = meta["generation"]
+            self._sizes = meta["sizes"]
+            if self._sizes.get("vectors.f32", 0) != n * dim * 4:
+                raise ValueError("vector file does not match meta.json")
+            # Memory-mapped: startup cost is independent of index size; the first write copies.
+            vectors = (
+                np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(n, dim))
+                if n else np.zeros((0, dim), dtype=np.float32)
+            )
+            assign = np.frombuffer(self._read("assign.i32"), dtype=np.int32).copy()
+            ids: List[str] = []
+            payloads: List[Dict] = []
+            for line in self._read("payloads.jsonl").decode("utf-8").splitlines():
+                row = json.loads(line)
+                ids.append(row["id"])
+                payloads.append(row["payload"])
+            if len(ids) != n or len(assign) != n:
+                raise ValueError("index files are out of sync")
+            updates = self._read("updates.jsonl").decode("utf-8").splitlines()
+            for line in updates:
+                row = json.loads(line)
+                payloads[row["row"]] = row["payload"]
+            alive = np.ones(n, dtype=bool)
+            alive[np.frombuffer(self._read("deleted.i64"), dtype=np.int64)] = False
+            centroids = np.load(self._file("centroids.npy")) if meta.get("ivf") else None
+        except Exception as e:
+            logger.warning("Local index: load failed path=%s: %s", self.path, e)
+            self._sizes = {}
+            return
+        self._restore(meta, vectors, assign, alive, ids, payloads, centroids)
+        self._saved = n
+        self._logged_updates = len(updates)
+        self._rewrite = False
+        logger.info(
+            "Local index: loaded points=%d rows=%d dim=%d path=%s", self.count, self._n, self.dim, self.path
+        )
+
+    def _load_unversioned(self, meta: Dict) -> None:
+        # Layout before append-only saves (whole .npy files); rewritten on the next save.
+        vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+        ids: List[str] = []
+        payloads: List[Dict] = []
+        with open(os.path.join(self.path, "payloads.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                ids.append(row["id"])
+                payloads.append(row["payload"])
+        if len(ids) != meta["count"] or vectors.shape[0] != meta["count"]:
+            raise ValueError("index files are out of sync")
+        centroids = assign = None
+        if meta.get("ivf"):
+            centroids = np.load(os.path.join(self.path, "centroids.npy"))
+            assign = np.load(os.path.join(self.path, "assign.npy"))
+        else:
+            assign = np.full(len(ids), -1, dtype=np.int32)
+        self._restore(meta, vectors, assign, np.ones(len(ids), dtype=bool), ids, payloads, centroids)
+        self._dirty = True
+        logger.info("Local index: loaded points=%d dim=%d path=%s (old layout)", self.count, self.dim, self.path)
+
+    def _restore(
+        self,
+        meta: Dict,
+        vectors: np.ndarray,
+        assign: np.ndarray,
+        alive: np.ndarray,
+        ids: List[str],
+        payloads: List[Dict],
+        centroids: Optional[np.ndarray],
+    ) -> None:
+        self.dim = meta["dim"]
+        self.embedding_model = meta.get("embedding_model")
+        self._vectors = vectors
+        self._assign = assign
+        self._alive = alive
+        self._centroids = centroids
+        self._n = len(ids)
+        self._ids = ids
+        self._payloads = payloads
+        self._rows = {pid: row for row, pid in enumerate(ids) if alive[row]}
+        for pid, row in self._rows.items():
+            self._by_source.setdefault(str(payloads[row].get("source")), set()).add(pid)
+        self._trained_at = meta.get("trained_at", 0)
+
+
+index = LocalIndex(LOCAL_INDEX_PATH, ivf_lists=LOCAL_INDEX_IVF_LISTS, ivf_probes=LOCAL_INDEX_IVF_PROBES)
+
+
+# ---- vector store interface (same functions as qdrant_store) ----
+
+async def collection_exists() -> bool:
+    return index.dim is not None
+
+async def get_collection_vector_size() -> Optional[int]:
+    return index.dim
+
+async def collection_meta(refresh: bool = False) -> Dict:
+    # In-process, so always current; `refresh` exists for parity with qdrant_store.
+    return {"exists": index.dim is not None, "vector_size": index.dim, "embedding_model": index.embedding_model}
+
+def invalidate_meta() -> None:
+    return None
+
+async def record_embedding_model(model: str) -> None:
+    index.embedding_model = model
+    index._dirty = True
+
+async def ensure_collection(vector_size: int) -> None:
+    if index.dim is None:
+        logger.info("Local index: creating size=%d", vector_size)
+        index.create(vector_size, EMBEDDINGS_MODEL)
+
+async def upsert_chunks(
+    source: str,
+    chunks: List[str],
+    vectors: List[List[float]],
+    start_index: int = 0,
+    chunk_indexes: Optional[List[int]] = None,
+    spans: Optional[List[Optional[Tuple[int, int]]]] = None,
+) -> int:
+    if chunk_indexes is None:
+        chunk_indexes = list(range(start_index, start_index + len(chunks)))
+    if spans is None:
+        spans = [None] * len(chunks)
+    ids: List[str] = []
+    payloads: List[Dict] = []
+    now = time.time()
+    for idx, span, chunk in zip(chunk_indexes, spans, chunks):
+        digest = content_hash(chunk)
+        ids.append(point_id(source, digest))
+        payloads.append(
+            {"source": source, **position(idx, span), "text": chunk, "content_hash": digest, "ingested_at": now}
+        )
+    logger.info("Local index: upsert points=%d source=%s", len(ids), source)
+    index.upsert(ids, vectors, payloads)
+    return len(ids)
+
+async def source_points(source: str) -> Dict[str, Dict[str, int]]:
+    return index.source_points(source)
+
+async def point_count() -> int:
+    return index.count
+
+async def scroll_texts(batch: int = 1024) -> AsyncIterator[List[Tuple[str, str]]]:
+    rows = [(pid, index._payloads[row].get("text", "")) for pid, row in index._rows.items()]
+    for start in range(0, len(rows), batch):
+        yield rows[start:start + batch]
+
+async def set_positions(positions: Dict[str, Dict[str, int]]) -> None:
+    for pid, pos in positions.items():
+        index.set_payload(pid, pos)
+
+async def delete_points(ids: List[str]) -> None:
+    index.delete(ids)
+
+def _hit(point_id: str, score: float, payload: Dict) -> Dict:
+    return {
+        "id": point_id,
+        "score": score,
+        "source": payload.get("source", "unknown"),
+        "chunk_index": payload.get("chunk_index", -1),
+        "text": payload.get("text", ""),
+        **{k: payload[k] for k in ("char_start", "char_end", "ingested_at") if k in payload},
+    }
+
+async def retrieve(ids: List[str]) -> List[Dict]:
+    return [_hit(pid, 0.0, payload) for pid, payload in index.payloads(ids)]
+
+async def search(query_vector: List[float], limit: int, flt: Optional[PointFilter] = None) -> List[Dict]:
+    logger.info("Local index: search limit=%d filter=%s", limit, flt)
+    return [_hit(h["id"], h["score"], h["payload"]) for h in index.search_batch([query_vector], limit, flt)[0]]
+
+async def search_batch(query_vectors: List[List[float]], limit: int, flt: Optional[PointFilter] = None) -> List[List[Dict]]:
+    if not query_vectors:
+        return []
+    logger.info("Local index: search_batch queries=%d limit=%d filter=%s", len(query_vectors), limit, flt)
+    return [
+        [_hit(h["id"], h["score"], h["payload"]) for h in rows]
+        for rows in index.search_batch(query_vectors, limit, flt)
+    ]
+
+async def load() -> None:
+    index.load()
+
+async def flush() -> None:
+    index.save()
+
+async def close() -> None:
+    index.save()
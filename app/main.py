@@ -1,87 +1,409 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 import logging
 import time
 import json
 import re
-from .config import TOP_K, CHUNK_SIZE, CHUNK_OVERLAP, QDRANT_COLLECTION
-from .schemas.schemas_openai import ChatCompletionsRequest, IngestTextRequest
-from .chunking import chunk_text
-from .embeddings import embed_texts
-from .llm import chat as llama_chat, chat_stream as llama_chat_stream, route_action
-from .qdrant_store import (
-    ensure_collection,
+from .config import (
+    TOP_K,
+    CHUNKER,
+    QDRANT_COLLECTION,
+    SPECULATIVE_RETRIEVAL,
+    CONTEXT_MAX_TOKENS,
+    BATCH_MAX_QUESTIONS,
+    BATCH_LLM_CONCURRENCY,
+    TIMING_HEADERS,
+    STREAM_EARLY_ROLE,
+)
+from .schemas.schemas_openai import ChatBatchRequest, ChatCompletionsRequest, IngestTextRequest, RetrievalFilters
+from .chunking import document_chunks, aiter_document_chunks
+from .ingest import ingest_chunks, aiter_list, decode_utf8, read_upload
+from .jobs import job_manager
+from .embeddings import embed_query, embed_texts, embedding_cache, probe_embedding_endpoints, query_batcher
+from .answer_cache import answer_cache
+from .llm import (
+    SSE_DONE,
+    SSE_ERROR,
+    chat as llama_chat,
+    chat_stream as llama_chat_stream,
+    scheduler as llm_scheduler,
+    set_deadline,
+    sse_delta,
+)
+from .router import route, looks_like_math, router_stats
+from .index_lock import acquire_index_lock, release_index_lock
+from .backends import close_backends, embeddings_backend, llm_backend, start_backends
+from .vector_store import (
+    collection_exists as store_collection_exists,
+    close as close_store,
+    load as load_store,
+    check_embedding_model,
     get_collection_vector_size,
-    upsert_chunks,
-    search,
-    client as qdrant_client,
+    invalidate_meta,
 )
+from .retrieval import hybrid_search, hybrid_search_batch, passes_threshold, retrieval_stats
+from .rerank import candidate_limit, rerank
+from .context import pack_context
 from .schemas.schemas_llm import ToolCall, FinalAnswer
+from .points import PointFilter
+from .metrics import render_prometheus, server_timing, stage, start_trace
 from .tools.calc import run as calc_tool
 
-app = FastAPI(title="RAG POC (OpenAI-compatible)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    index_lock = acquire_index_lock(exclusive=False)
+    embedding_cache.load()
+    answer_cache.load()
+    await start_backends()
+    await probe_embedding_endpoints()
+    await load_store()
+    await check_embedding_model()
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    embedding_cache.save()
+    answer_cache.save()
+    await close_backends()
+    await close_store()
+    release_index_lock(index_lock)
+
+app = FastAPI(title="RAG POC (OpenAI-compatible)", lifespan=lifespan)
 logger = logging.getLogger("uvicorn.error")
 
 # Tune later
 SCORE_THRESHOLD = 0.45  # ignore weak matches
 
+if TIMING_HEADERS:
+    @app.middleware("http")
+    async def timing_headers(request: Request, call_next):
+        # Stages finished before the response starts (for streams: everything up to the first byte).
+        trace = start_trace()
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        trace["total"] = (time.perf_counter() - t0) * 1000
+        response.headers["Server-Timing"] = server_timing(trace)
+        return response
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        render_prometheus(
+            [
+                ("rag_embed_query_batch_size", "Distinct queries per micro-batched embeddings call.", query_batcher.batch_sizes),
+                ("rag_embed_query_wait_ms", "Time a query waited for its embeddings micro-batch (ms).", query_batcher.wait_ms),
+            ]
+        ),
+        media_type="text/plain; version=0.0.4",
+    )
+
 @app.get("/v1/models")
-def list_models():
+async def list_models():
     return {
         "object": "list",
         "data": [{"id": "rag-proxy", "object": "model", "owned_by": "local"}],
     }
 
+@app.get("/admin/router_stats")
+async def get_router_stats():
+    return router_stats()
+
+@app.get("/admin/llm_scheduler_stats")
+async def get_llm_scheduler_stats():
+    return llm_scheduler.stats()
+
+@app.get("/admin/backend_stats")
+async def get_backend_stats():
+    return {"llm": llm_backend.stats(), "embeddings": embeddings_backend.stats()}
+
+@app.get("/admin/embedding_cache_stats")
+async def get_embedding_cache_stats():
+    return embedding_cache.stats()
+
+@app.get("/admin/embedding_batcher_stats")
+async def get_embedding_batcher_stats():
+    return query_batcher.stats()
+
+@app.get("/admin/answer_cache_stats")
+async def get_answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/admin/retrieval_stats")
+async def get_retrieval_stats():
+    return retrieval_stats()
+
 @app.post("/admin/ingest_text")
-def ingest_text(req: IngestTextRequest):
+async def ingest_text(req: IngestTextRequest):
     start = time.time()
     logger.info("Ingest: source=%s text_len=%d", req.source, len(req.text or ""))
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Text is empty")
 
-    chunks = chunk_text(req.text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+    # Off the event loop: chunking a large body is CPU-bound and would stall chats in flight.
+    chunks = await asyncio.to_thread(document_chunks, req.text)
     if not chunks:
         raise HTTPException(status_code=400, detail="No chunks created from text")
-    logger.info("Ingest: chunks=%d chunk_size=%d overlap=%d", len(chunks), CHUNK_SIZE, CHUNK_OVERLAP)
+    logger.info("Ingest: chunks=%d chunker=%s", len(chunks), CHUNKER)
 
-    # Embed first chunk to know vector dim
-    first_vec = embed_texts([chunks[0]])[0]
-    ensure_collection(len(first_vec))
+    stats = await ingest_chunks(req.source, aiter_list(chunks))
+    answer_cache.invalidate_source(req.source)
+    embedding_cache.save()
+    logger.info("Ingest: indexed=%d elapsed_ms=%.1f", stats["chunks"], (time.time() - start) * 1000)
+    return {"ok": True, "collection": QDRANT_COLLECTION, "chunks_indexed": stats["chunks"], "diff": stats}
 
-    # Embed all chunks (batching)
-    vectors = []
-    batch_size = 4
-    for i in range(0, len(chunks), batch_size):
-        vectors.extend(embed_texts(chunks[i:i + batch_size]))
+async def _upload_blocks(request: Request, source: str) -> Tuple[str, AsyncIterator[bytes]]:
+    # Raw body (any content type) or multipart with a "file" part (and optional "source" field).
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart upload needs a 'file' part")
+        return str(form.get("source") or source), read_upload(upload)
+    return source, request.stream()
 
-    n = upsert_chunks(req.source, chunks, vectors)
-    logger.info("Ingest: indexed=%d elapsed_ms=%.1f", n, (time.time() - start) * 1000)
-    return {"ok": True, "collection": QDRANT_COLLECTION, "chunks_indexed": n}
+@app.post("/admin/ingest_stream")
+async def ingest_stream(request: Request, source: str = "poc_doc"):
+    # Chunked and indexed as the body arrives.
+    start = time.time()
+    source, blocks = await _upload_blocks(request, source)
+    logger.info("Ingest stream: source=%s", source)
+
+    chunks = aiter_document_chunks(decode_utf8(blocks))
+    stats = await ingest_chunks(source, chunks)
+    n = stats["chunks"]
+    if not n:
+        raise HTTPException(status_code=400, detail="No chunks created from text")
+    answer_cache.invalidate_source(source)
+    embedding_cache.save()
+    elapsed = time.time() - start
+    logger.info("Ingest stream: indexed=%d elapsed_ms=%.1f", n, elapsed * 1000)
+    return {
+        "ok": True,
+        "collection": QDRANT_COLLECTION,
+        "source": source,
+        "chunks_indexed": n,
+        "diff": stats,
+        "elapsed_s": round(elapsed, 3),
+    }
+
+@app.post("/admin/ingest_jobs", status_code=202)
+async def create_ingest_job(request: Request, source: str = "poc_doc"):
+    # JSON body ({"source", "text"}) like /admin/ingest_text, or a raw/multipart upload like /admin/ingest_stream.
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            req = IngestTextRequest.model_validate(await request.json())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Body is not valid JSON")
+        if not req.text.strip():
+            raise HTTPException(status_code=400, detail="Text is empty")
+        source, blocks = req.source, aiter_list([req.text.encode("utf-8")])
+    else:
+        source, blocks = await _upload_blocks(request, source)
+    job = await job_manager.submit(source, blocks)
+    return job.to_dict()
+
+@app.get("/admin/ingest_jobs")
+async def list_ingest_jobs():
+    return {"jobs": [j.to_dict() for j in job_manager.list_jobs()]}
+
+@app.get("/admin/ingest_jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.to_dict()
+
+def point_filter(filters: Optional[RetrievalFilters]) -> Optional[PointFilter]:
+    if filters is None:
+        return None
+    flt = PointFilter(
+        sources=tuple(filters.sources or ()),
+        ingested_after=filters.ingested_after,
+        ingested_before=filters.ingested_before,
+    )
+    return flt if flt.sources or flt.has_time_range else None
+
+async def _collection_ready() -> bool:
+    # Safely check collection existence
+    try:
+        return await store_collection_exists()
+    except Exception:
+        # Fallback: if this fails, assume it exists and let search fail gracefully
+        return True
+
+async def _check_dimension(dim: int) -> None:
+    # Ensure vector dimensionality matches the collection (cached; re-read once before failing,
+    # in case the collection was rebuilt since the cache was filled)
+    collection_size = await get_collection_vector_size()
+    if collection_size and collection_size != dim:
+        invalidate_meta()
+        collection_size = await get_collection_vector_size()
+    if collection_size and collection_size != dim:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                "Vector dimension mismatch: "
+                f"collection expects {collection_size}, got {dim}. "
+                "Recreate the collection or switch QDRANT_COLLECTION."
+            ),
+        )
+
+async def retrieve_hits(question: str, flt: Optional[PointFilter] = None) -> Optional[Tuple[List[float], List[Dict]]]:
+    # Returns (query vector, hits), or None when there is no collection to search yet.
+    with stage("collection_check"):
+        ready = await _collection_ready()
+    if not ready:
+        return None
+
+    # Embed query
+    with stage("embed_query"):
+        q_vec = await embed_query(question)
+    await _check_dimension(len(q_vec))
+
+    # Retrieve (dense, fused with BM25 when hybrid search is on), over-fetching for the reranker
+    with stage("search"):
+        candidates = await hybrid_search(question, q_vec, limit=candidate_limit(TOP_K), flt=flt)
+
+    # Weak matches never reach the reranker (or the prompt)
+    with stage("threshold"):
+        candidates = [h for h in candidates if passes_threshold(h, SCORE_THRESHOLD)]
+    return q_vec, await rerank(question, candidates, TOP_K)
+
+async def retrieve_hits_batch(
+    questions: List[str], flt: Optional[PointFilter] = None
+) -> Optional[List[Tuple[List[float], List[Dict]]]]:
+    # retrieve_hits for many questions: one embeddings call, one vector store round trip.
+    if not questions or not await _collection_ready():
+        return None
+    q_vecs = await embed_texts(questions, query=True)
+    await _check_dimension(len(q_vecs[0]))
+    batches = await hybrid_search_batch(questions, q_vecs, limit=candidate_limit(TOP_K), flt=flt)
+    out = []
+    for question, q_vec, candidates in zip(questions, q_vecs, batches):
+        candidates = [h for h in candidates if passes_threshold(h, SCORE_THRESHOLD)]
+        out.append((q_vec, await rerank(question, candidates, TOP_K)))
+    return out
+
+NO_CONTEXT_ANSWER = "I could not find this information in the provided document."
+
+SYSTEM_PROMPT = (
+    "You are a helpful internal assistant. "
+    "If the user's question requires a tool to be called, call the tool and report its results. "
+    "Answer ONLY using the provided context. Make sure to give the most useful answer, the most relevant and key piece of information you can find about the user's query and prioritize returning that."
+    "If the context does not contain the answer, say: "
+    "\"I could not find this information in the provided document.\""
+)
+
+def _prompt_messages(question: str, context_block: str) -> List[Dict[str, str]]:
+    augmented_user = (
+        f"Context:\n{context_block}\n\nQuestion: {question}"
+        if context_block
+        else f"Question: {question}"
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": augmented_user},
+    ]
+
+def _citations(hits: List[Dict]) -> List[str]:
+    return [
+        f'{h.get("source", "unknown")}#chunk{h.get("chunk_index", -1)} (score {h.get("score", 0.0):.3f})'
+        for h in hits
+    ]
+
+async def _replay_stream(answer: str, final_suffix: str) -> AsyncIterator[bytes]:
+    # Cached answers are replayed word by word so clients see normal deltas.
+    for piece in re.findall(r"\S+\s*|\s+", answer):
+        yield sse_delta(piece)
+    if final_suffix:
+        yield sse_delta(final_suffix)
+    yield SSE_DONE
+
+async def _single_stream(content: str) -> AsyncIterator[bytes]:
+    yield sse_delta(content)
+    yield SSE_DONE
+
+def _stream_text(body: bytes) -> str:
+    # Concatenated delta contents of a complete SSE body.
+    parts: List[str] = []
+    for line in body.split(b"\n"):
+        if not line.startswith(b"data: ") or line.startswith(b"data: [DONE]"):
+            continue
+        try:
+            delta = json.loads(line[len(b"data: "):])["choices"][0].get("delta", {})
+            parts.append(delta.get("content") or "")
+        except Exception:
+            pass
+    return "".join(parts)
+
+async def _cache_stream(
+    stream: AsyncIterator[bytes],
+    final_suffix: str,
+    q_vec: List[float],
+    hits: List[Dict],
+    max_tokens: int,
+) -> AsyncIterator[bytes]:
+    # Relay the upstream stream unchanged; the body is parsed once, and the answer stored,
+    # only if the stream completes.
+    blocks: List[bytes] = []
+    async for block in stream:
+        blocks.append(block)
+        yield block
+    body = b"".join(blocks)
+    if not body.endswith(SSE_DONE) or SSE_ERROR in body:
+        return
+    answer = _stream_text(body)
+    if final_suffix and answer.endswith(final_suffix):
+        answer = answer[: -len(final_suffix)]
+    answer_cache.store(q_vec, hits, max_tokens, answer)
+
+def request_timeout(request: Request) -> Optional[float]:
+    # Client deadline in seconds (X-Request-Timeout); LLM calls for this request never wait past it.
+    try:
+        return float(request.headers.get("x-request-timeout", "")) or None
+    except ValueError:
+        return None
+
+def _discard(task: Optional[asyncio.Task]) -> None:
+    # Drop a speculative task; swallow its outcome so nothing is logged as unretrieved.
+    if task is None:
+        return
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
 
 @app.post("/v1/chat/completions")
-def chat_completions(req: ChatCompletionsRequest):
+async def chat_completions(req: ChatCompletionsRequest, request: Request):
     start = time.time()
+    set_deadline(request_timeout(request))
     logger.info("Chat: model=%s max_tokens=%s temperature=%s", req.model, req.max_tokens, req.temperature)
     user_msgs = [m.content for m in req.messages if m.role == "user"]
     if not user_msgs:
         raise HTTPException(status_code=400, detail="No user message found")
     question = user_msgs[-1].strip()
     logger.info("Chat: question_len=%d", len(question))
-    is_math = bool(re.search(r"[0-9]\s*[\+\-\*/\(\)%\.]\s*[0-9]", question))
+    is_math = looks_like_math(question)
+
+    # ---- Speculative retrieval (overlaps the router's LLM round trip) ----
+    flt = point_filter(req.filters)
+    retrieval = asyncio.create_task(retrieve_hits(question, flt)) if SPECULATIVE_RETRIEVAL else None
 
     # ---- Pre-router (tool vs RAG) ----
     try:
-        action = route_action(question)
+        action = await route(question)
     except HTTPException:
+        _discard(retrieval)
         raise
     except Exception:
         action = FinalAnswer(type="final", answer="use_rag")
 
-    # If router failed but it's clearly math, run calc anyway.
-    if isinstance(action, FinalAnswer) and is_math:
-        action = ToolCall(type="tool_call", tool="calc", args={"expression": question})
-
     if isinstance(action, ToolCall) and is_math:
+        _discard(retrieval)
         tool_result = calc_tool(action.args)
         content = (
             f"The result is {tool_result.get('result')}"
@@ -89,12 +411,7 @@ def chat_completions(req: ChatCompletionsRequest):
             else f"Error: {tool_result.get('error', 'Tool error')}"
         )
         if req.stream:
-            def tool_stream():
-                payload = {"choices": [{"delta": {"content": content}}]}
-                yield f"data: {json.dumps(payload)}\n\n"
-                yield "data: [DONE]\n\n"
-
-            return StreamingResponse(tool_stream(), media_type="text/event-stream")
+            return StreamingResponse(_single_stream(content), media_type="text/event-stream")
         return {
             "id": "chatcmpl-poc",
             "object": "chat.completion",
@@ -111,49 +428,24 @@ def chat_completions(req: ChatCompletionsRequest):
     # ---- Retrieve context (only if collection exists) ----
     context_block = ""
     citations = []
+    q_vec: List[float] = []
+    good_hits: List[Dict] = []
 
-    # Safely check collection existence
-    collection_exists = False
-    try:
-        # Works on most qdrant-client versions
-        collection_exists = qdrant_client.collection_exists(QDRANT_COLLECTION)
-    except Exception:
-        # Fallback: if this fails, assume it exists and let search fail gracefully
-        collection_exists = True
-
-    if collection_exists:
-        # Embed query
-        q_vec = embed_texts([question])[0]
-
-        # Ensure vector dimensionality matches the collection
-        collection_size = get_collection_vector_size()
-        if collection_size and collection_size != len(q_vec):
-            raise HTTPException(
-                status_code=409,
-                detail=(
-                    "Vector dimension mismatch: "
-                    f"collection expects {collection_size}, got {len(q_vec)}. "
-                    "Recreate the collection or switch QDRANT_COLLECTION."
-                ),
-            )
-
-        # Retrieve
-        hits = search(q_vec, limit=TOP_K)
+    # Retrieval may already be running speculatively alongside the router.
+    retrieved = await retrieval if retrieval is not None else await retrieve_hits(question, flt)
+
+    if retrieved is not None:
+        q_vec, hits = retrieved
         logger.info("Chat: hits=%d threshold=%.2f", len(hits), SCORE_THRESHOLD)
 
-        # Filter by score threshold
-        good_hits = [h for h in hits if h.get("score", 0.0) >= SCORE_THRESHOLD]
+        # Already filtered by score threshold and reranked in retrieve_hits
+        good_hits = hits
 
         # If no good hits: strict RAG behaviour (no hallucination, no llama call)
         if not good_hits:
             logger.info("Chat: no_hits elapsed_ms=%.1f", (time.time() - start) * 1000)
             if req.stream:
-                def no_context_stream():
-                    msg = "I couldn’t find this information in the provided document."
-                    yield f"data: {{\"choices\":[{{\"delta\":{{\"content\":\"{msg}\"}}}}]}}\n\n"
-                    yield "data: [DONE]\n\n"
-
-                return StreamingResponse(no_context_stream(), media_type="text/event-stream")
+                return StreamingResponse(_single_stream(NO_CONTEXT_ANSWER), media_type="text/event-stream")
             return {
                 "id": "chatcmpl-poc",
                 "object": "chat.completion",
@@ -162,7 +454,7 @@ def chat_completions(req: ChatCompletionsRequest):
                         "index": 0,
                         "message": {
                             "role": "assistant",
-                            "content": "I could not find this information in the provided document."
+                            "content": NO_CONTEXT_ANSWER,
                         },
                         "finish_reason": "stop",
                     }
@@ -170,59 +462,49 @@ def chat_completions(req: ChatCompletionsRequest):
                 "model": req.model or "rag-proxy",
             }
 
-        # Build context + citations
-        contexts = []
-        for h in good_hits:
-            contexts.append(h.get("text", ""))
-            citations.append(
-                f'{h.get("source", "unknown")}#chunk{h.get("chunk_index", -1)} (score {h.get("score", 0.0):.3f})'
-            )
-
-        context_block = "\n\n---\n\n".join([c for c in contexts if c.strip()])
-
-    # ---- Prompt ----
-    system = (
-        "You are a helpful internal assistant. "
-        "If the user's question requires a tool to be called, call the tool and report its results. "
-        "Answer ONLY using the provided context. Make sure to give the most useful answer, the most relevant and key piece of information you can find about the user's query and prioritize returning that."
-        "If the context does not contain the answer, say: "
-        "\"I could not find this information in the provided document.\""
-    )
-
-    augmented_user = (
-        f"Context:\n{context_block}\n\nQuestion: {question}"
-        if context_block
-        else f"Question: {question}"
-    )
+        # Build context (adjacent chunks merged, fit to the token budget) + citations
+        with stage("prompt_build"):
+            citations = _citations(good_hits)
+            context_block, _ = pack_context(good_hits, CONTEXT_MAX_TOKENS)
 
     # ---- LLM call ----
-    messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": augmented_user},
-    ]
+    messages = _prompt_messages(question, context_block)
     max_tokens = req.max_tokens or 300
     temperature = req.temperature or 0.2
 
+    # ---- Semantic answer cache (only for context-grounded answers) ----
+    cached = answer_cache.lookup(q_vec, good_hits, max_tokens) if citations else None
+
     if req.stream:
         final_suffix = ""
         if citations:
             final_suffix = "\n\nSources:\n- " + "\n- ".join(citations)
-        return StreamingResponse(
-            llama_chat_stream(
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                final_suffix=final_suffix,
-            ),
-            media_type="text/event-stream",
+        if cached is not None:
+            logger.info("Chat: answer_cache_hit elapsed_ms=%.1f", (time.time() - start) * 1000)
+            return StreamingResponse(_replay_stream(cached, final_suffix), media_type="text/event-stream")
+        stream = await llama_chat_stream(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            final_suffix=final_suffix,
+            early_role=STREAM_EARLY_ROLE,
         )
+        if citations:
+            stream = _cache_stream(stream, final_suffix, q_vec, good_hits, max_tokens)
+        return StreamingResponse(stream, media_type="text/event-stream")
 
-    answer = llama_chat(
-        messages=messages,
-        max_tokens=max_tokens,
-        temperature=temperature,
-    )
-    logger.info("Chat: answered elapsed_ms=%.1f", (time.time() - start) * 1000)
+    if cached is not None:
+        answer = cached
+        logger.info("Chat: answer_cache_hit elapsed_ms=%.1f", (time.time() - start) * 1000)
+    else:
+        answer = await llama_chat(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        logger.info("Chat: answered elapsed_ms=%.1f", (time.time() - start) * 1000)
+        if citations:
+            answer_cache.store(q_vec, good_hits, max_tokens, answer)
 
     # Append citations only if we actually used context
     if citations:
@@ -240,3 +522,110 @@ def chat_completions(req: ChatCompletionsRequest):
         ],
         "model": req.model or "rag-proxy",
     }
+
+@app.post("/v1/chat/batch")
+async def chat_batch(req: ChatBatchRequest, request: Request):
+    # N questions per call for evaluation/bulk clients: embeddings and vector search run once for
+    # the whole batch, generations run with bounded concurrency. Results come back in order, or as
+    # NDJSON lines in completion order when `stream` is set.
+    start = time.time()
+    set_deadline(request_timeout(request))
+    questions = [q.strip() for q in req.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="Questions must be a non-empty list of non-empty strings")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    logger.info("Chat batch: questions=%d model=%s", len(questions), req.model)
+    max_tokens = req.max_tokens or 300
+    temperature = req.temperature or 0.2
+    llm_slots = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+
+    async def tool_content(question: str) -> Optional[str]:
+        # Only math-looking questions can end up at the calc tool (see chat_completions),
+        # so the rest skip the router entirely.
+        if not looks_like_math(question):
+            return None
+        try:
+            async with llm_slots:
+                action = await route(question)
+        except HTTPException:
+            raise
+        except Exception:
+            action = FinalAnswer(type="final", answer="use_rag")
+        if not isinstance(action, ToolCall):
+            return None
+        tool_result = calc_tool(action.args)
+        if "result" in tool_result:
+            return f"The result is {tool_result.get('result')}"
+        return f"Error: {tool_result.get('error', 'Tool error')}"
+
+    tools = await asyncio.gather(*(tool_content(q) for q in questions), return_exceptions=True)
+    rag = [i for i, tool in enumerate(tools) if tool is None]
+    retrieved = await retrieve_hits_batch([questions[i] for i in rag], point_filter(req.filters))
+    by_index = dict(zip(rag, retrieved)) if retrieved is not None else {}
+
+    async def answer(i: int) -> Dict:
+        question = questions[i]
+        item = {"index": i, "question": question, "answer": None, "sources": [], "cached": False, "error": None}
+        try:
+            tool = tools[i]
+            if isinstance(tool, BaseException):
+                raise tool
+            if tool is not None:
+                item["answer"] = tool
+                return item
+            context_block = ""
+            q_vec, hits = by_index.get(i, ([], []))
+            if i in by_index:
+                if not hits:
+                    item["answer"] = NO_CONTEXT_ANSWER
+                    return item
+                item["sources"] = _citations(hits)
+                context_block, _ = pack_context(hits, CONTEXT_MAX_TOKENS)
+            cached = answer_cache.lookup(q_vec, hits, max_tokens) if hits else None
+            if cached is not None:
+                item.update(answer=cached, cached=True)
+                return item
+            async with llm_slots:
+                text = await llama_chat(
+                    messages=_prompt_messages(question, context_block),
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+            if hits:
+                answer_cache.store(q_vec, hits, max_tokens, text)
+            item["answer"] = text
+        except HTTPException as e:
+            item["error"] = str(e.detail)
+        except Exception as e:
+            logger.warning("Chat batch: question %d failed: %s", i, e)
+            item["error"] = str(e) or type(e).__name__
+        return item
+
+    tasks = [asyncio.create_task(answer(i)) for i in range(len(questions))]
+
+    if req.stream:
+        async def ndjson() -> AsyncIterator[str]:
+            try:
+                for done in asyncio.as_completed(tasks):
+                    yield json.dumps(await done) + "\n"
+                logger.info("Chat batch: streamed=%d elapsed_ms=%.1f", len(tasks), (time.time() - start) * 1000)
+            finally:
+                # Client went away: stop the generations still queued.
+                for t in tasks:
+                    t.cancel()
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = await asyncio.gather(*tasks)
+    elapsed = time.time() - start
+    logger.info(
+        "Chat batch: answered=%d errors=%d elapsed_ms=%.1f",
+        len(results), sum(1 for r in results if r["error"]), elapsed * 1000,
+    )
+    return {
+        "object": "chat.batch",
+        "model": req.model or "rag-proxy",
+        "results": results,
+        "elapsed_s": round(elapsed, 3),
+    }
@@ -0,0 +1,96 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import time
+
+
+class Histogram:
+    """Fixed-bucket histogram (upper bounds inclusive, plus an overflow bucket)."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets: List[float] = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict:
+        labels = [f"<={b:g}" for b in self.buckets] + [f">{self.buckets[-1]:g}" if self.buckets else "all"]
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+    def prometheus(self, name: str, labels: str = "", scale: float = 1.0) -> List[str]:
+        # Cumulative `le` buckets as Prometheus expects; `scale` converts units (ms -> s).
+        sep = "," if labels else ""
+        lines = []
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound * scale:g}"}} {running}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum * scale:.6g}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+# ---- per-stage latency ----
+
+STAGE_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_stages: Dict[str, Histogram] = {}
+# Per-request stage -> ms, set by the timing middleware; tasks spawned by the request share it.
+_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("trace", default=None)
+
+
+def observe_stage(stage: str, ms: float) -> None:
+    hist = _stages.get(stage)
+    if hist is None:
+        hist = _stages[stage] = Histogram(STAGE_BUCKETS_MS)
+    hist.observe(ms)
+    trace = _trace.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + ms
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, (time.perf_counter() - t0) * 1000)
+
+
+def start_trace() -> Dict[str, float]:
+    trace: Dict[str, float] = {}
+    _trace.set(trace)
+    return trace
+
+
+def server_timing(trace: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in trace.items())
+
+
+def render_prometheus(histograms: Sequence[Tuple[str, str, Histogram]] = ()) -> str:
+    # Text exposition format 0.0.4. Stage latencies share one metric with a `stage` label;
+    # `histograms` adds (name, help, histogram) triples as they are.
+    lines = [
+        "# HELP rag_stage_duration_seconds Latency of each request stage.",
+        "# TYPE rag_stage_duration_seconds histogram",
+    ]
+    for name in sorted(_stages):
+        lines.extend(_stages[name].prometheus("rag_stage_duration_seconds", f'stage="{name}"', scale=0.001))
+    for name, help_text, hist in histograms:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(hist.prometheus(name))
+    return "\n".join(lines) + "\n"
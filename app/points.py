@@ -0,0 +1,43 @@
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+import hashlib
+import uuid
+
+# Payload fields that locate a chunk in its document; updated in place when a chunk moves.
+POSITION_KEYS = ("chunk_index", "char_start", "char_end")
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def point_id(source: str, digest: str) -> str:
+    # Deterministic: the same chunk content in the same source always maps to the same point.
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}\x00{digest}"))
+
+class PointFilter(NamedTuple):
+    # Retrieval scope; pushed down to the store as a payload filter.
+    sources: Tuple[str, ...] = ()
+    ingested_after: Optional[float] = None  # unix seconds, inclusive
+    ingested_before: Optional[float] = None
+
+    @property
+    def has_time_range(self) -> bool:
+        return self.ingested_after is not None or self.ingested_before is not None
+
+    def matches(self, payload: Dict[str, Any]) -> bool:
+        # Works on payloads and on hits (both carry "source" and "ingested_at").
+        if self.sources and payload.get("source") not in self.sources:
+            return False
+        if self.has_time_range:
+            t = payload.get("ingested_at")
+            if t is None:
+                return False
+            if self.ingested_after is not None and t < self.ingested_after:
+                return False
+            if self.ingested_before is not None and t > self.ingested_before:
+                return False
+        return True
+
+def position(chunk_index: int, span: Optional[Tuple[int, int]] = None) -> Dict[str, int]:
+    pos = {"chunk_index": chunk_index}
+    if span is not None:
+        pos["char_start"], pos["char_end"] = span
+    return pos
@@ -1,68 +1,368 @@
-import uuid
-from typing import Dict, List, Optional, Tuple
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import logging
+import time
 
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    VectorParams,
+    PointStruct,
+    Filter,
+    FieldCondition,
+    MatchValue,
+    MatchAny,
+    Range,
+    PayloadSchemaType,
+    PointIdsList,
+    SetPayload,
+    SetPayloadOperation,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    HnswConfigDiff,
+    SearchParams,
+    QuantizationSearchParams,
+    QueryRequest,
+)
 
-from .config import QDRANT_URL, QDRANT_COLLECTION
+from .points import POSITION_KEYS, PointFilter, content_hash, point_id, position
+from .config import (
+    QDRANT_URL,
+    QDRANT_COLLECTION,
+    QDRANT_TIMEOUT,
+    QDRANT_MAX_CONCURRENCY,
+    QDRANT_QUANTIZATION,
+    QDRANT_QUANTIZATION_ALWAYS_RAM,
+    QDRANT_SCALAR_QUANTILE,
+    QDRANT_RESCORE,
+    QDRANT_OVERSAMPLING,
+    QDRANT_ON_DISK_VECTORS,
+    QDRANT_ON_DISK_PAYLOAD,
+    QDRANT_HNSW_M,
+    QDRANT_HNSW_EF_CONSTRUCT,
+    QDRANT_HNSW_ON_DISK,
+    QDRANT_HNSW_EF,
+    QDRANT_META_TTL,
+    EMBEDDINGS_MODEL,
+)
 
-client = QdrantClient(url=QDRANT_URL)
+client = AsyncQdrantClient(url=QDRANT_URL, timeout=QDRANT_TIMEOUT)
 logger = logging.getLogger("uvicorn.error")
 
-def get_collection_vector_size() -> Optional[int]:
+if QDRANT_QUANTIZATION not in ("none", "scalar", "binary"):
+    raise RuntimeError(f"Unknown QDRANT_QUANTIZATION={QDRANT_QUANTIZATION!r} (expected 'none', 'scalar' or 'binary')")
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# Indexed payload fields: filtered searches and source diffs use these instead of scanning.
+PAYLOAD_INDEXES = {
+    "source": PayloadSchemaType.KEYWORD,
+    "content_hash": PayloadSchemaType.KEYWORD,
+    "ingested_at": PayloadSchemaType.FLOAT,
+}
+
+def _limit() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, QDRANT_MAX_CONCURRENCY))
+    return _semaphore
+
+# Cached view of the served collection (exists, vector_size, embedding_model, fetched_at), so the
+# chat path does not call Qdrant for metadata on every request. Refreshed after QDRANT_META_TTL
+# seconds, and set directly when this process creates the collection.
+_meta: Dict[str, Any] = {}
+
+def _vector_size(info) -> Optional[int]:
+    vectors = info.config.params.vectors
+    if hasattr(vectors, "size"):
+        return vectors.size
+    if isinstance(vectors, dict):
+        for v in vectors.values():
+            if hasattr(v, "size"):
+                return v.size
+    return None
+
+async def _fetch_meta() -> Dict[str, Any]:
+    meta: Dict[str, Any] = {"exists": False, "vector_size": None, "embedding_model": None}
+    async with _limit():
+        meta["exists"] = await client.collection_exists(QDRANT_COLLECTION)
+    if meta["exists"]:
+        async with _limit():
+            info = await client.get_collection(QDRANT_COLLECTION)
+        meta["vector_size"] = _vector_size(info)
+        meta["embedding_model"] = (info.config.metadata or {}).get("embedding_model")
+    return meta
+
+async def collection_meta(refresh: bool = False) -> Dict[str, Any]:
+    if refresh or not _meta or time.monotonic() - _meta["fetched_at"] > QDRANT_META_TTL:
+        meta = await _fetch_meta()
+        meta["fetched_at"] = time.monotonic()
+        _meta.clear()
+        _meta.update(meta)
+    return _meta
+
+def invalidate_meta() -> None:
+    _meta.clear()
+
+async def collection_exists() -> bool:
+    return (await collection_meta())["exists"]
+
+async def get_collection_vector_size() -> Optional[int]:
     try:
-        info = client.get_collection(QDRANT_COLLECTION)
-        vectors = info.config.params.vectors
-        if hasattr(vectors, "size"):
-            return vectors.size
-        if isinstance(vectors, dict):
-            for v in vectors.values():
-                if hasattr(v, "size"):
-                    return v.size
+        return (await collection_meta())["vector_size"]
     except Exception:
         return None
-    return None
 
-def ensure_collection(vector_size: int) -> None:
-    if not client.collection_exists(QDRANT_COLLECTION):
-        logger.info("Qdrant: creating collection=%s size=%d", QDRANT_COLLECTION, vector_size)
-        client.create_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+async def record_embedding_model(model: str) -> None:
+    # For collections created before the model was recorded in their metadata.
+    async with _limit():
+        await client.update_collection(collection_name=QDRANT_COLLECTION, metadata={"embedding_model": model})
+    invalidate_meta()
+
+def collection_layout(vector_size: int) -> Dict[str, Any]:
+    # create_collection kwargs for the configured layout (quantization, on-disk storage, HNSW).
+    quantization = None
+    if QDRANT_QUANTIZATION == "scalar":
+        quantization = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=QDRANT_SCALAR_QUANTILE,
+                always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+            )
         )
+    elif QDRANT_QUANTIZATION == "binary":
+        quantization = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM))
+    hnsw = None
+    if QDRANT_HNSW_M or QDRANT_HNSW_EF_CONSTRUCT or QDRANT_HNSW_ON_DISK:
+        hnsw = HnswConfigDiff(
+            m=QDRANT_HNSW_M or None,
+            ef_construct=QDRANT_HNSW_EF_CONSTRUCT or None,
+            on_disk=QDRANT_HNSW_ON_DISK or None,
+        )
+    return {
+        "vectors_config": VectorParams(
+            size=vector_size,
+            distance=Distance.COSINE,
+            on_disk=QDRANT_ON_DISK_VECTORS or None,
+        ),
+        "on_disk_payload": QDRANT_ON_DISK_PAYLOAD or None,
+        "hnsw_config": hnsw,
+        "quantization_config": quantization,
+    }
+
+def search_params() -> Optional[SearchParams]:
+    if QDRANT_QUANTIZATION == "none" and not QDRANT_HNSW_EF:
+        return None
+    quantization = None
+    if QDRANT_QUANTIZATION != "none":
+        # Candidates are found on quantized vectors, then rescored with the originals.
+        quantization = QuantizationSearchParams(rescore=QDRANT_RESCORE, oversampling=QDRANT_OVERSAMPLING)
+    return SearchParams(hnsw_ef=QDRANT_HNSW_EF or None, quantization=quantization)
+
+async def create_collection(name: str, vector_size: int, embedding_model: str = EMBEDDINGS_MODEL) -> None:
+    logger.info(
+        "Qdrant: creating collection=%s size=%d quantization=%s on_disk_vectors=%s on_disk_payload=%s",
+        name, vector_size, QDRANT_QUANTIZATION, QDRANT_ON_DISK_VECTORS, QDRANT_ON_DISK_PAYLOAD,
+    )
+    async with _limit():
+        await client.create_collection(
+            collection_name=name,
+            metadata={"embedding_model": embedding_model, "embedding_dim": vector_size},
+            **collection_layout(vector_size),
+        )
+    await ensure_payload_indexes(name)
+    if name == QDRANT_COLLECTION:
+        _meta.clear()
+        _meta.update(
+            {"exists": True, "vector_size": vector_size, "embedding_model": embedding_model, "fetched_at": time.monotonic()}
+        )
+
+async def ensure_payload_indexes(name: str = QDRANT_COLLECTION) -> None:
+    async with _limit():
+        info = await client.get_collection(name)
+    existing = set((info.payload_schema or {}).keys())
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            logger.info("Qdrant: creating payload index collection=%s field=%s", name, field)
+            async with _limit():
+                await client.create_payload_index(collection_name=name, field_name=field, field_schema=schema)
 
-def upsert_chunks(source: str, chunks: List[str], vectors: List[List[float]]) -> int:
+async def ensure_collection(vector_size: int) -> None:
+    if not await collection_exists():
+        await create_collection(QDRANT_COLLECTION, vector_size)
+
+async def upsert_chunks(
+    source: str,
+    chunks: List[str],
+    vectors: List[List[float]],
+    start_index: int = 0,
+    chunk_indexes: Optional[List[int]] = None,
+    spans: Optional[List[Optional[Tuple[int, int]]]] = None,
+) -> int:
     points: List[PointStruct] = []
     logger.info("Qdrant: upsert collection=%s points=%d source=%s", QDRANT_COLLECTION, len(chunks), source)
-    for idx, (chunk, vec) in enumerate(zip(chunks, vectors)):
+    if chunk_indexes is None:
+        chunk_indexes = list(range(start_index, start_index + len(chunks)))
+    if spans is None:
+        spans = [None] * len(chunks)
+    now = time.time()
+    for idx, span, chunk, vec in zip(chunk_indexes, spans, chunks, vectors):
+        digest = content_hash(chunk)
         points.append(
             PointStruct(
-                id=str(uuid.uuid4()),
+                id=point_id(source, digest),
                 vector=vec,
-                payload={"source": source, "chunk_index": idx, "text": chunk},
+                payload={
+                    "source": source,
+                    **position(idx, span),
+                    "text": chunk,
+                    "content_hash": digest,
+                    "ingested_at": now,
+                },
             )
         )
-    client.upsert(collection_name=QDRANT_COLLECTION, points=points)
+    async with _limit():
+        await client.upsert(collection_name=QDRANT_COLLECTION, points=points)
     return len(points)
 
-def search(query_vector: List[float], limit: int) -> List[Dict]:
-    logger.info("Qdrant: search collection=%s limit=%d", QDRANT_COLLECTION, limit)
-    res = client.query_points(
-        collection_name=QDRANT_COLLECTION,
-        query=query_vector,
-        limit=limit,
-        with_payload=True,
-    )
-    out: List[Dict] = []
-    for p in res.points:
-        payload = p.payload or {}
-        out.append(
-            {
-                "score": p.score,
-                "source": payload.get("source", "unknown"),
-                "chunk_index": payload.get("chunk_index", -1),
-                "text": payload.get("text", ""),
-            }
+async def source_points(source: str) -> Dict[str, Dict[str, int]]:
+    # point id -> position (chunk_index, char offsets) for every point currently stored for `source`.
+    if not await collection_exists():
+        return {}
+    out: Dict[str, Dict[str, int]] = {}
+    flt = Filter(must=[FieldCondition(key="source", match=MatchValue(value=source))])
+    offset = None
+    while True:
+        async with _limit():
+            points, offset = await client.scroll(
+                collection_name=QDRANT_COLLECTION,
+                scroll_filter=flt,
+                limit=1024,
+                offset=offset,
+                with_payload=list(POSITION_KEYS),
+                with_vectors=False,
+            )
+        for p in points:
+            payload = p.payload or {}
+            out[str(p.id)] = {k: payload[k] for k in POSITION_KEYS if k in payload}
+        if offset is None:
+            return out
+
+async def point_count() -> int:
+    if not await collection_exists():
+        return 0
+    async with _limit():
+        return (await client.count(collection_name=QDRANT_COLLECTION, exact=True)).count
+
+async def scroll_texts(batch: int = 1024) -> AsyncIterator[List[Tuple[str, str]]]:
+    # (point id, chunk text) for every stored point, a page at a time.
+    if not await collection_exists():
+        return
+    offset = None
+    while True:
+        async with _limit():
+            points, offset = await client.scroll(
+                collection_name=QDRANT_COLLECTION,
+                limit=batch,
+                offset=offset,
+                with_payload=["text"],
+                with_vectors=False,
+            )
+        yield [(str(p.id), (p.payload or {}).get("text", "")) for p in points]
+        if offset is None:
+            return
+
+async def set_positions(positions: Dict[str, Dict[str, int]]) -> None:
+    # Unchanged chunks that moved position: payload-only update, batched into one request.
+    if not positions:
+        return
+    ops = [
+        SetPayloadOperation(set_payload=SetPayload(payload=pos, points=[pid]))
+        for pid, pos in positions.items()
+    ]
+    async with _limit():
+        await client.batch_update_points(collection_name=QDRANT_COLLECTION, update_operations=ops)
+
+async def delete_points(ids: List[str]) -> None:
+    if not ids:
+        return
+    logger.info("Qdrant: delete collection=%s points=%d", QDRANT_COLLECTION, len(ids))
+    async with _limit():
+        await client.delete(collection_name=QDRANT_COLLECTION, points_selector=PointIdsList(points=ids))
+
+def _hit(point_id: str, score: float, payload: Dict) -> Dict:
+    return {
+        "id": point_id,
+        "score": score,
+        "source": payload.get("source", "unknown"),
+        "chunk_index": payload.get("chunk_index", -1),
+        "text": payload.get("text", ""),
+        **{k: payload[k] for k in ("char_start", "char_end", "ingested_at") if k in payload},
+    }
+
+async def retrieve(ids: List[str]) -> List[Dict]:
+    # Hits (score 0.0) for the given point ids, in the given order; unknown ids are skipped.
+    if not ids:
+        return []
+    async with _limit():
+        points = await client.retrieve(collection_name=QDRANT_COLLECTION, ids=ids, with_payload=True)
+    by_id = {str(p.id): _hit(str(p.id), 0.0, p.payload or {}) for p in points}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _filter(flt: Optional[PointFilter]) -> Optional[Filter]:
+    if flt is None:
+        return None
+    must = []
+    if flt.sources:
+        must.append(FieldCondition(key="source", match=MatchAny(any=list(flt.sources))))
+    if flt.has_time_range:
+        must.append(FieldCondition(key="ingested_at", range=Range(gte=flt.ingested_after, lte=flt.ingested_before)))
+    return Filter(must=must) if must else None
+
+async def search(query_vector: List[float], limit: int, flt: Optional[PointFilter] = None) -> List[Dict]:
+    logger.info("Qdrant: search collection=%s limit=%d filter=%s", QDRANT_COLLECTION, limit, flt)
+    async with _limit():
+        res = await client.query_points(
+            collection_name=QDRANT_COLLECTION,
+            query=query_vector,
+            query_filter=_filter(flt),
+            limit=limit,
+            search_params=search_params(),
+            with_payload=True,
+        )
+    return [_hit(str(p.id), p.score, p.payload or {}) for p in res.points]
+
+async def search_batch(query_vectors: List[List[float]], limit: int, flt: Optional[PointFilter] = None) -> List[List[Dict]]:
+    # One round trip for many queries (batch chat).
+    if not query_vectors:
+        return []
+    logger.info("Qdrant: search_batch collection=%s queries=%d limit=%d filter=%s", QDRANT_COLLECTION, len(query_vectors), limit, flt)
+    query_filter = _filter(flt)
+    params = search_params()
+    async with _limit():
+        res = await client.query_batch_points(
+            collection_name=QDRANT_COLLECTION,
+            requests=[
+                QueryRequest(query=v, filter=query_filter, limit=limit, params=params, with_payload=True)
+                for v in query_vectors
+            ],
         )
-    return out
+    return [[_hit(str(p.id), p.score, p.payload or {}) for p in r.points] for r in res]
+
+async def close() -> None:
+    await client.close()
+
+async def load() -> None:
+    # Collections created before payload indexes existed get them on startup.
+    try:
+        if (await collection_meta(refresh=True))["exists"]:
+            await ensure_payload_indexes()
+    except Exception as e:
+        logger.warning("Qdrant: payload index check failed: %s", e)
+
+async def flush() -> None:
+    # Qdrant persists on write.
+    return None
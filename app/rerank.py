@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from .backends import embeddings_backend
+from .config import (
+    RERANK_MODE,
+    RERANK_CANDIDATES,
+    RERANK_BATCH_SIZE,
+    RERANK_LEXICAL_WEIGHT,
+    RERANK_MMR_LAMBDA,
+    RERANK_MAX_TOKENS,
+    RERANK_MODEL,
+    RERANK_ENDPOINT,
+)
+from .lexical import tokenize
+from .retrieval import record_stage
+from .tokens import estimate_tokens
+
+logger = logging.getLogger("uvicorn.error")
+
+if RERANK_MODE not in ("none", "lexical", "mmr", "cross_encoder"):
+    raise RuntimeError(f"Unknown RERANK_MODE={RERANK_MODE!r} (expected 'none', 'lexical', 'mmr' or 'cross_encoder')")
+
+
+def candidate_limit(k: int) -> int:
+    # Over-fetch so the reranker has something to choose from.
+    return k if RERANK_MODE == "none" else max(k, RERANK_CANDIDATES)
+
+
+def _lexical_scores(question: str, hits: List[Dict], term_sets: List[Set[str]]) -> np.ndarray:
+    # Retrieval relevance blended with the fraction of query terms each candidate contains.
+    # Hybrid hits use their fused RRF score (scaled to the best candidate) so lexical-only
+    # matches, which have no cosine score, are not ranked out.
+    if all("rrf_score" in h for h in hits):
+        base = np.array([h["rrf_score"] for h in hits], dtype=np.float32)
+        base /= max(float(base.max()), 1e-9)
+    else:
+        base = np.array([h.get("score", 0.0) for h in hits], dtype=np.float32)
+    q_terms = set(tokenize(question))
+    if not q_terms:
+        return base
+    coverage = np.array([len(q_terms & terms) / len(q_terms) for terms in term_sets], dtype=np.float32)
+    return (1.0 - RERANK_LEXICAL_WEIGHT) * base + RERANK_LEXICAL_WEIGHT * coverage
+
+
+def _mmr_order(relevance: np.ndarray, term_sets: List[Set[str]], lam: float) -> List[int]:
+    # Maximal marginal relevance; candidate similarity is Jaccard over term sets,
+    # computed for all pairs at once from a binary term matrix.
+    n = len(term_sets)
+    vocab: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    for i, terms in enumerate(term_sets):
+        for t in terms:
+            rows.append(i)
+            cols.append(vocab.setdefault(t, len(vocab)))
+    m = np.zeros((n, max(len(vocab), 1)), dtype=np.float32)
+    m[rows, cols] = 1.0
+    inter = m @ m.T
+    sizes = m.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - inter
+    sim = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    order: List[int] = []
+    max_sim = np.zeros(n, dtype=np.float32)
+    remaining = np.ones(n, dtype=bool)
+    for _ in range(n):
+        mmr = lam * relevance - (1.0 - lam) * max_sim
+        mmr[~remaining] = -np.inf
+        i = int(np.argmax(mmr))
+        order.append(i)
+        remaining[i] = False
+        max_sim = np.maximum(max_sim, sim[i])
+    return order
+
+
+async def _cross_encoder_scores(question: str, hits: List[Dict]) -> Optional[np.ndarray]:
+    # Batches are scored concurrently; the embeddings backend semaphore bounds in-flight calls.
+    async def score(batch: List[Dict]) -> np.ndarray:
+        payload = {"query": question, "documents": [h.get("text", "") for h in batch]}
+        if RERANK_MODEL:
+            payload["model"] = RERANK_MODEL
+        r = await embeddings_backend.post(RERANK_ENDPOINT, json=payload)
+        r.raise_for_status()
+        out = np.zeros(len(batch), dtype=np.float32)
+        for item in r.json()["results"]:
+            out[item["index"]] = item.get("relevance_score", item.get("score", 0.0))
+        return out
+
+    size = max(1, RERANK_BATCH_SIZE)
+    try:
+        parts = await asyncio.gather(*(score(hits[i:i + size]) for i in range(0, len(hits), size)))
+    except Exception as e:
+        logger.warning("Rerank: cross-encoder failed, falling back to lexical scores: %s", e)
+        return None
+    return np.concatenate(parts)
+
+
+async def rerank(question: str, hits: List[Dict], k: int) -> List[Dict]:
+    # Keep the best k candidates whose texts fit the token budget (the top one always fits).
+    if RERANK_MODE == "none" or not hits:
+        return hits[:k]
+    t0 = time.perf_counter()
+    term_sets = [set(tokenize(h.get("text", ""))) for h in hits]
+    scores = await _cross_encoder_scores(question, hits) if RERANK_MODE == "cross_encoder" else None
+    if scores is None:
+        scores = _lexical_scores(question, hits, term_sets)
+    if RERANK_MODE == "mmr":
+        order = _mmr_order(scores, term_sets, RERANK_MMR_LAMBDA)
+    else:
+        order = [int(i) for i in np.argsort(-scores, kind="stable")]
+
+    kept: List[Dict] = []
+    used = 0
+    for i in order:
+        tokens = estimate_tokens(hits[i].get("text", ""))
+        if kept and RERANK_MAX_TOKENS and used + tokens > RERANK_MAX_TOKENS:
+            continue
+        kept.append({**hits[i], "rerank_score": float(scores[i])})
+        used += tokens
+        if len(kept) >= k:
+            break
+    ms = record_stage("rerank", t0)
+    logger.info(
+        "Rerank: mode=%s candidates=%d kept=%d tokens=%d elapsed_ms=%.1f",
+        RERANK_MODE, len(hits), len(kept), used, ms,
+    )
+    return kept
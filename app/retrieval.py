@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional
+import logging
+import time
+
+from .config import (
+    HYBRID_SEARCH,
+    HYBRID_CANDIDATES,
+    HYBRID_RRF_K,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_LEXICAL_WEIGHT,
+    HYBRID_MIN_BM25,
+    RERANK_MODE,
+    RERANK_CANDIDATES,
+    RERANK_MAX_TOKENS,
+)
+from .context import context_stats
+from .lexical import lexical_index
+from .metrics import observe_stage
+from .points import PointFilter
+from .vector_store import lexical_status, retrieve, search, search_batch
+
+logger = logging.getLogger("uvicorn.error")
+
+# stage -> [calls, total_ms, last_ms]
+_timings: Dict[str, List[float]] = {}
+
+
+def record_stage(stage: str, t0: float) -> float:
+    ms = (time.perf_counter() - t0) * 1000
+    entry = _timings.setdefault(stage, [0, 0.0, 0.0])
+    entry[0] += 1
+    entry[1] += ms
+    entry[2] = ms
+    observe_stage(stage, ms)
+    return ms
+
+
+async def hybrid_search(
+    question: str,
+    query_vector: List[float],
+    limit: int,
+    flt: Optional[PointFilter] = None,
+) -> List[Dict]:
+    # Dense + BM25 candidates fused by weighted reciprocal rank: sum(w / (k + rank)).
+    if not HYBRID_SEARCH or not lexical_index.count:
+        t0 = time.perf_counter()
+        hits = await search(query_vector, limit=limit, flt=flt)
+        record_stage("vector", t0)
+        return hits
+
+    n = max(limit, HYBRID_CANDIDATES)
+    t0 = time.perf_counter()
+    vector_hits = await search(query_vector, limit=n, flt=flt)
+    vector_ms = record_stage("vector", t0)
+    return await _fuse(question, vector_hits, limit, flt, vector_ms)
+
+
+async def hybrid_search_batch(
+    questions: List[str],
+    query_vectors: List[List[float]],
+    limit: int,
+    flt: Optional[PointFilter] = None,
+) -> List[List[Dict]]:
+    # Same as hybrid_search per question, with the dense stage done in one store call.
+    hybrid = HYBRID_SEARCH and lexical_index.count
+    n = max(limit, HYBRID_CANDIDATES) if hybrid else limit
+    t0 = time.perf_counter()
+    batches = await search_batch(query_vectors, limit=n, flt=flt)
+    vector_ms = record_stage("vector_batch", t0)
+    if not hybrid:
+        return batches
+    return [await _fuse(q, hits, limit, flt, vector_ms) for q, hits in zip(questions, batches)]
+
+
+async def _fuse(
+    question: str,
+    vector_hits: List[Dict],
+    limit: int,
+    flt: Optional[PointFilter],
+    vector_ms: float,
+) -> List[Dict]:
+    n = max(limit, HYBRID_CANDIDATES)
+    by_id = {h["id"]: h for h in vector_hits}
+
+    t0 = time.perf_counter()
+    lexical_hits = lexical_index.search(question, n)
+    lexical_ms = record_stage("lexical", t0)
+
+    fetch_ms = 0.0
+    if flt is not None and lexical_hits:
+        # The BM25 index has no payloads: check lexical-only candidates against the filter.
+        t0 = time.perf_counter()
+        for h in await retrieve([pid for pid, _ in lexical_hits if pid not in by_id]):
+            if flt.matches(h):
+                by_id[h["id"]] = h
+        lexical_hits = [(pid, score) for pid, score in lexical_hits if pid in by_id]
+        fetch_ms = record_stage("fetch", t0)
+
+    t0 = time.perf_counter()
+    fused: Dict[str, float] = {}
+    for rank, h in enumerate(vector_hits, start=1):
+        fused[h["id"]] = fused.get(h["id"], 0.0) + HYBRID_VECTOR_WEIGHT / (HYBRID_RRF_K + rank)
+    lexical_scores: Dict[str, float] = {}
+    for rank, (pid, score) in enumerate(lexical_hits, start=1):
+        fused[pid] = fused.get(pid, 0.0) + HYBRID_LEXICAL_WEIGHT / (HYBRID_RRF_K + rank)
+        lexical_scores[pid] = score
+    top = sorted(fused, key=fused.__getitem__, reverse=True)[:limit]
+    fusion_ms = record_stage("fusion", t0)
+
+    # Lexical-only winners still need their payloads (already fetched when filtering).
+    missing = [pid for pid in top if pid not in by_id]
+    if missing:
+        t0 = time.perf_counter()
+        for h in await retrieve(missing):
+            by_id[h["id"]] = h
+        fetch_ms = record_stage("fetch", t0)
+
+    out = [
+        {**by_id[pid], "rrf_score": fused[pid], "lexical_score": lexical_scores.get(pid, 0.0)}
+        for pid in top
+        if pid in by_id
+    ]
+    logger.info(
+        "Retrieval: hybrid vector=%d lexical=%d fused=%d vector_ms=%.1f lexical_ms=%.1f fusion_ms=%.1f fetch_ms=%.1f",
+        len(vector_hits), len(lexical_hits), len(out), vector_ms, lexical_ms, fusion_ms, fetch_ms,
+    )
+    return out
+
+
+def passes_threshold(hit: Dict, threshold: float) -> bool:
+    # Dense similarity, or a strong exact-term match from BM25 (IDs, error codes).
+    return hit.get("score", 0.0) >= threshold or hit.get("lexical_score", 0.0) >= HYBRID_MIN_BM25
+
+
+def retrieval_stats() -> Dict:
+    return {
+        "hybrid": HYBRID_SEARCH,
+        "lexical_docs": lexical_index.count,
+        # "empty"/"partial": the BM25 index is missing chunks the vector store has (see sync_lexical).
+        "lexical_index": lexical_status(),
+        "candidates": HYBRID_CANDIDATES,
+        "rrf_k": HYBRID_RRF_K,
+        "weights": {"vector": HYBRID_VECTOR_WEIGHT, "lexical": HYBRID_LEXICAL_WEIGHT},
+        "min_bm25": HYBRID_MIN_BM25,
+        "context": context_stats,
+        "rerank": {"mode": RERANK_MODE, "candidates": RERANK_CANDIDATES, "max_tokens": RERANK_MAX_TOKENS},
+        "stages": {
+            stage: {"calls": int(c), "avg_ms": round(total / c, 3) if c else 0.0, "last_ms": round(last, 3)}
+            for stage, (c, total, last) in _timings.items()
+        },
+    }
@@ -0,0 +1,73 @@
+from typing import Dict, Optional
+import logging
+import re
+
+from .llm import route_action
+from .metrics import stage
+from .schemas.schemas_llm import RouterOutput, ToolCall, FinalAnswer
+from .tools.calc import extract_expression
+
+logger = logging.getLogger("uvicorn.error")
+
+# Digit, operator, digit. Without this the calc tool never runs, so the LLM router has nothing to decide.
+MATH_RE = re.compile(r"[0-9]\s*[\+\-\*/\(\)%\.]\s*[0-9]")
+
+# Words that may surround an expression without making the question about anything else.
+_MATH_WORDS = {
+    "what", "whats", "s", "is", "the", "of", "result", "answer", "value",
+    "calc", "calculate", "compute", "evaluate", "solve", "how", "much",
+    "please", "equals", "equal", "to", "me", "tell", "give", "can", "you",
+}
+_WORD_RE = re.compile(r"[a-z]+")
+
+_stats: Dict[str, int] = {
+    "fast_path_rag": 0,
+    "fast_path_calc": 0,
+    "llm": 0,
+    "llm_failed": 0,
+}
+
+
+def looks_like_math(question: str) -> bool:
+    return bool(MATH_RE.search(question))
+
+
+def classify(question: str) -> Optional[RouterOutput]:
+    # Confident local decision, or None when the LLM router should decide.
+    if not looks_like_math(question):
+        return FinalAnswer(type="final", answer="use_rag")
+
+    expr = extract_expression(question)
+    if expr is None:
+        # Digits and dots/dashes (versions, dates, section numbers) but nothing calc could evaluate.
+        return FinalAnswer(type="final", answer="use_rag")
+
+    rest = question.replace(expr, " ", 1).lower()
+    if all(w in _MATH_WORDS for w in _WORD_RE.findall(rest)):
+        return ToolCall(type="tool_call", tool="calc", args={"expression": expr})
+    return None
+
+
+async def route(question: str) -> RouterOutput:
+    with stage("route"):
+        action = classify(question)
+        if action is None:
+            _stats["llm"] += 1
+            action = await route_action(question)
+            if action is not None:
+                return action
+            # No verdict from the LLM: calc whatever it can evaluate, RAG otherwise.
+            _stats["llm_failed"] += 1
+            expr = extract_expression(question)
+            if expr:
+                return ToolCall(type="tool_call", tool="calc", args={"expression": expr})
+            return FinalAnswer(type="final", answer="use_rag")
+    key = "fast_path_calc" if isinstance(action, ToolCall) else "fast_path_rag"
+    _stats[key] += 1
+    logger.info("Router: fast_path=%s", action.type)
+    return action
+
+
+def router_stats() -> Dict[str, int]:
+    total = _stats["fast_path_rag"] + _stats["fast_path_calc"] + _stats["llm"]
+    return {**_stats, "total": total, "llm_calls_skipped": total - _stats["llm"]}
@@ -5,12 +5,28 @@ class OAChatMessage(BaseModel):
     role: str
     content: str
 
+class RetrievalFilters(BaseModel):
+    sources: Optional[List[str]] = None
+    # Unix timestamps (seconds), inclusive
+    ingested_after: Optional[float] = None
+    ingested_before: Optional[float] = None
+
 class ChatCompletionsRequest(BaseModel):
     model: Optional[str] = None
     messages: List[OAChatMessage]
     max_tokens: Optional[int] = 300
     temperature: Optional[float] = 0.2
     stream: Optional[bool] = False
+    filters: Optional[RetrievalFilters] = None
+
+class ChatBatchRequest(BaseModel):
+    model: Optional[str] = None
+    questions: List[str]
+    max_tokens: Optional[int] = 300
+    temperature: Optional[float] = 0.2
+    # NDJSON: one result line per question, in completion order
+    stream: Optional[bool] = False
+    filters: Optional[RetrievalFilters] = None
 
 class IngestTextRequest(BaseModel):
     source: str = "poc_doc"
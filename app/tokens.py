@@ -0,0 +1,21 @@
+from typing import Optional
+import re
+
+_WORD_RE = re.compile(r"\w+")
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+
+
+def token_cost(text: str, start: int = 0, end: Optional[int] = None) -> float:
+    # Fast BPE-ish estimate: ~1.3 tokens per word plus one per run of punctuation.
+    # Unrounded, so costs of adjacent spans add up; start/end count a span without slicing.
+    end = len(text) if end is None else end
+    if start >= end:
+        return 0.0
+    return len(_WORD_RE.findall(text, start, end)) * 1.3 + len(_PUNCT_RE.findall(text, start, end))
+
+
+def estimate_tokens(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    end = len(text) if end is None else end
+    if start >= end:
+        return 0
+    return max(1, int(token_cost(text, start, end)))
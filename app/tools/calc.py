@@ -1,5 +1,7 @@
 import ast
 import operator as op
+import re
+from typing import Optional
 
 _ALLOWED_OPS = {
     ast.Add: op.add,
@@ -27,6 +29,38 @@ def safe_eval(expr: str) -> float:
     return _eval(node)
 
 
+# Runs of digits, operators, parens and spaces; candidates for extract_expression().
+_EXPR_RE = re.compile(r"[\d\.\(\)\+\-\*/%\s]+")
+
+
+def _is_arithmetic(n) -> bool:
+    if isinstance(n, ast.Constant):
+        return isinstance(n.value, (int, float)) and not isinstance(n.value, bool)
+    if isinstance(n, ast.UnaryOp) and type(n.op) in _ALLOWED_OPS:
+        return _is_arithmetic(n.operand)
+    if isinstance(n, ast.BinOp) and type(n.op) in _ALLOWED_OPS:
+        return _is_arithmetic(n.left) and _is_arithmetic(n.right)
+    return False
+
+
+def is_expression(expr: str) -> bool:
+    # Parse-only check (no evaluation): at least one binary op over numbers.
+    try:
+        node = ast.parse(expr.strip(), mode="eval").body
+    except SyntaxError:
+        return False
+    return isinstance(node, ast.BinOp) and _is_arithmetic(node)
+
+
+def extract_expression(text: str) -> Optional[str]:
+    best: Optional[str] = None
+    for m in _EXPR_RE.finditer(text):
+        candidate = m.group(0).strip().rstrip(".")
+        if (best is None or len(candidate) > len(best)) and is_expression(candidate):
+            best = candidate
+    return best
+
+
 def run(args: dict) -> dict:
     expr = str(args.get("expression", "")).strip()
     if not expr:
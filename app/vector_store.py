@@ -0,0 +1,146 @@
+# Backend-neutral vector store API. Both backends are modules exposing the same async functions:
+# collection_exists, get_collection_vector_size, collection_meta, invalidate_meta,
+# record_embedding_model, ensure_collection, upsert_chunks, source_points,
+# set_positions, delete_points, retrieve, search, search_batch, point_count, scroll_texts,
+# load, flush, close.
+# Writes are mirrored into the BM25 lexical index so hybrid retrieval sees the same chunks.
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .config import EMBEDDINGS_MODEL, HYBRID_SEARCH, VECTOR_BACKEND
+from .embeddings import embedding_dimension
+from .lexical import lexical_index
+from .points import content_hash, point_id
+
+if VECTOR_BACKEND == "local":
+    from . import local_store as backend
+elif VECTOR_BACKEND == "qdrant":
+    from . import qdrant_store as backend
+else:
+    raise RuntimeError(f"Unknown VECTOR_BACKEND={VECTOR_BACKEND!r} (expected 'qdrant' or 'local')")
+
+logger = logging.getLogger("uvicorn.error")
+
+collection_exists = backend.collection_exists
+get_collection_vector_size = backend.get_collection_vector_size
+collection_meta = backend.collection_meta
+invalidate_meta = backend.invalidate_meta
+ensure_collection = backend.ensure_collection
+source_points = backend.source_points
+set_positions = backend.set_positions
+retrieve = backend.retrieve
+search = backend.search
+search_batch = backend.search_batch
+
+async def upsert_chunks(
+    source: str,
+    chunks: List[str],
+    vectors: List[List[float]],
+    start_index: int = 0,
+    chunk_indexes: Optional[List[int]] = None,
+    spans: Optional[List[Optional[Tuple[int, int]]]] = None,
+) -> int:
+    n = await backend.upsert_chunks(
+        source, chunks, vectors, start_index=start_index, chunk_indexes=chunk_indexes, spans=spans
+    )
+    for chunk in chunks:
+        lexical_index.add(point_id(source, content_hash(chunk)), chunk)
+    return n
+
+def index_lexical(pid: str, chunk: str) -> None:
+    # Backfill for chunks already in the vector store (e.g. unchanged on re-ingest).
+    if pid not in lexical_index:
+        lexical_index.add(pid, chunk)
+
+async def delete_points(ids: List[str]) -> None:
+    await backend.delete_points(ids)
+    for pid in ids:
+        lexical_index.remove(pid)
+
+async def flush() -> None:
+    await backend.flush()
+    lexical_index.save()
+
+async def close() -> None:
+    await backend.close()
+    lexical_index.save()
+
+async def load() -> None:
+    await backend.load()
+    lexical_index.load()
+    if HYBRID_SEARCH:
+        await sync_lexical()
+
+# Outcome of the last startup comparison of the BM25 index with the vector store.
+_lexical_sync: Dict = {"status": "unchecked", "vector_points": None, "rebuilt_docs": 0}
+
+async def sync_lexical() -> None:
+    # A memory-only (or stale) BM25 index starts out missing chunks the vector store has, which
+    # silently turns hybrid search dense-only and skews IDF. Re-index them from stored payloads.
+    try:
+        points = await backend.point_count()
+    except Exception as e:
+        logger.warning("Lexical index: sync skipped, vector store unavailable: %s", e)
+        _lexical_sync.update(status="unknown", vector_points=None)
+        return
+    _lexical_sync["vector_points"] = points
+    if lexical_index.count == points:
+        _lexical_sync["status"] = "ok"
+        return
+    logger.info("Lexical index: docs=%d vector points=%d, rebuilding from the vector store", lexical_index.count, points)
+    seen = set()
+    added = 0
+    try:
+        async for rows in backend.scroll_texts():
+            for pid, text in rows:
+                seen.add(pid)
+                if pid not in lexical_index:
+                    lexical_index.add(pid, text)
+                    added += 1
+    except Exception as e:
+        logger.warning("Lexical index: rebuild interrupted after %d docs: %s", added, e)
+        _lexical_sync.update(status="empty" if not lexical_index.count else "partial", rebuilt_docs=added)
+        return
+    stale = [pid for pid in lexical_index.ids() if pid not in seen]
+    for pid in stale:
+        lexical_index.remove(pid)
+    lexical_index.save()
+    _lexical_sync.update(status="ok", rebuilt_docs=added)
+    logger.info("Lexical index: rebuilt docs=%d added=%d removed=%d", lexical_index.count, added, len(stale))
+
+def lexical_status() -> Dict:
+    return {**_lexical_sync, "docs": lexical_index.count}
+
+async def check_embedding_model() -> None:
+    # Startup check: a collection built with another embedding model (or dimension) would
+    # otherwise only surface as a 409 / garbage retrieval on the first chat request.
+    try:
+        meta = await collection_meta(refresh=True)
+    except Exception as e:
+        # Store unreachable: start anyway and let requests report it, as before the check existed.
+        logger.warning("Vector store: embedding model check skipped, store unavailable: %s", e)
+        return
+    if not meta["exists"]:
+        return
+    recorded = meta.get("embedding_model")
+    if recorded and recorded != EMBEDDINGS_MODEL:
+        raise RuntimeError(
+            f"Collection was built with embedding model {recorded!r} but EMBEDDINGS_MODEL={EMBEDDINGS_MODEL!r}. "
+            "Re-ingest into a new collection or switch EMBEDDINGS_MODEL back."
+        )
+    try:
+        dim = await embedding_dimension()
+    except Exception as e:
+        logger.warning("Vector store: embedding model check skipped, embeddings backend unavailable: %s", e)
+        return
+    if meta["vector_size"] and meta["vector_size"] != dim:
+        raise RuntimeError(
+            f"Collection expects {meta['vector_size']}-dim vectors but {EMBEDDINGS_MODEL!r} produces {dim}. "
+            "Re-ingest into a new collection or switch EMBEDDINGS_MODEL back."
+        )
+    if not recorded:
+        logger.info("Vector store: recording embedding model=%s for existing collection", EMBEDDINGS_MODEL)
+        try:
+            await backend.record_embedding_model(EMBEDDINGS_MODEL)
+        except Exception as e:
+            logger.warning("Vector store: could not record embedding model: %s", e)
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import subprocess
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+# End-to-end benchmark without Ollama or Qdrant: starts scripts/fake_servers.py as the LLM and
+# embeddings backend and the API on the in-process local vector index, ingests TEXT_PATH, then
+# replays a requests.jsonl-style workload (one JSON object per line with "question", "messages",
+# or "title"/"body") at each BENCH_CONCURRENCY level. Prints and writes a JSON report; with
+# BENCH_BASELINE set, exits 1 when QPS or p95 latency regress by more than BENCH_MAX_REGRESSION.
+# Exported env vars reach both servers (e.g. FAKE_LLM_TTFT_MS, EMBED_QUERY_BATCH_WAIT_MS).
+ROOT = Path(__file__).resolve().parent.parent
+WORKLOAD = Path(os.getenv("BENCH_WORKLOAD", "data/bench_workload.jsonl"))
+TEXT_PATH = Path(os.getenv("TEXT_PATH", "data/pasted_text.txt"))
+CONCURRENCY = [int(x) for x in os.getenv("BENCH_CONCURRENCY", "1,4,16").split(",") if x.strip()]
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "64"))
+STREAM = os.getenv("BENCH_STREAM", "1").lower() in ("1", "true", "yes")
+MAX_TOKENS = int(os.getenv("BENCH_MAX_TOKENS", "60"))
+INGEST_DOCS = int(os.getenv("BENCH_INGEST_DOCS", "4"))
+CACHES = os.getenv("BENCH_CACHES", "0").lower() in ("1", "true", "yes")
+OUTPUT = os.getenv("BENCH_OUTPUT", "bench_results.json")
+BASELINE = os.getenv("BENCH_BASELINE", "").strip()
+MAX_REGRESSION = float(os.getenv("BENCH_MAX_REGRESSION", "0.2"))
+STARTUP_TIMEOUT = float(os.getenv("BENCH_STARTUP_TIMEOUT", "60"))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def load_workload(path: Path) -> list:
+    questions = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            question = row.get("question")
+            if not question and row.get("messages"):
+                question = [m["content"] for m in row["messages"] if m.get("role") == "user"][-1]
+            question = question or row.get("title") or row.get("body")
+            if question:
+                questions.append(question)
+    return questions
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    arr = np.asarray(values)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p95": round(float(np.percentile(arr, 95)), 2),
+        "p99": round(float(np.percentile(arr, 99)), 2),
+        "mean": round(float(arr.mean()), 2),
+    }
+
+def start_servers(tmp: str):
+    fake_port, api_port = free_port(), free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    env = {
+        "LLAMA_BASE": fake_base,
+        "EMBEDDINGS_BASE": "",
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_PATH": "",
+        "LEXICAL_INDEX_PATH": "",
+        "EMBED_CACHE_PATH": "",
+        "ANSWER_CACHE_PATH": "",
+        "INGEST_JOBS_DIR": os.path.join(tmp, "jobs"),
+        "QDRANT_COLLECTION": "bench",
+    }
+    if not CACHES:
+        env.update({"EMBED_CACHE_MAX_MB": "0", "ANSWER_CACHE_MAX_ENTRIES": "0"})
+    # Explicitly exported settings win over the offline defaults.
+    env = {**os.environ, **{k: v for k, v in env.items() if k not in os.environ}}
+    log = open(os.path.join(tmp, "servers.log"), "w")
+    uvicorn = [sys.executable, "-m", "uvicorn", "--log-level", "warning", "--host", "127.0.0.1"]
+    fake = subprocess.Popen(
+        uvicorn + ["--app-dir", str(ROOT / "scripts"), "fake_servers:app", "--port", str(fake_port)],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    api = subprocess.Popen(
+        uvicorn + ["app.main:app", "--port", str(api_port)],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return [fake, api], fake_base, f"http://127.0.0.1:{api_port}", log.name
+
+async def wait_ready(client: httpx.AsyncClient, urls: list, procs: list, log_path: str) -> None:
+    deadline = time.time() + STARTUP_TIMEOUT
+    for url in urls:
+        while True:
+            if any(p.poll() is not None for p in procs):
+                raise SystemExit(f"Server exited during startup, see {log_path}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.time() > deadline:
+                raise SystemExit(f"Servers not ready after {STARTUP_TIMEOUT:.0f}s, see {log_path}")
+            await asyncio.sleep(0.2)
+
+async def ingest(client: httpx.AsyncClient, api: str) -> dict:
+    base = TEXT_PATH.read_text(encoding="utf-8")
+    chunks = 0
+    start = time.perf_counter()
+    for i in range(INGEST_DOCS):
+        r = await client.post(
+            f"{api}/admin/ingest_text",
+            json={"source": f"bench_{i}", "text": f"{base}\n\nBenchmark document {i}."},
+        )
+        r.raise_for_status()
+        chunks += r.json()["chunks_indexed"]
+    elapsed = time.perf_counter() - start
+    return {
+        "docs": INGEST_DOCS,
+        "chunks": chunks,
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 1) if elapsed else 0.0,
+    }
+
+async def one_request(client: httpx.AsyncClient, api: str, question: str) -> dict:
+    body = {"messages": [{"role": "user", "content": question}], "max_tokens": MAX_TOKENS, "stream": STREAM}
+    start = time.perf_counter()
+    ttft = None
+    try:
+        if not STREAM:
+            r = await client.post(f"{api}/v1/chat/completions", json=body)
+            return {"ok": r.status_code == 200, "latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": None}
+        async with client.stream("POST", f"{api}/v1/chat/completions", json=body) as r:
+            if r.status_code != 200:
+                await r.aread()
+                return {"ok": False, "latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": None}
+            async for line in r.aiter_lines():
+                if ttft is None and line.startswith("data: ") and '"content"' in line:
+                    ttft = (time.perf_counter() - start) * 1000
+        return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": ttft}
+    except httpx.HTTPError:
+        return {"ok": False, "latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": None}
+
+async def run_level(client: httpx.AsyncClient, api: str, fake: str, questions: list, concurrency: int) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(REQUESTS):
+        queue.put_nowait(questions[i % len(questions)])
+    results = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            results.append(await one_request(client, api, queue.get_nowait()))
+
+    before = (await client.get(f"{fake}/calls")).json()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    after = (await client.get(f"{fake}/calls")).json()
+
+    ok = [r for r in results if r["ok"]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall, 3),
+        "qps": round(len(ok) / wall, 2) if wall else 0.0,
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+        "ttft_ms": percentiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]),
+        "backend_calls": {k: after[k] - before[k] for k in after if k != "time"},
+    }
+
+def regressions(report: dict, baseline: dict) -> list:
+    out = []
+    base_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("chat", [])}
+    for lvl in report["chat"]:
+        base = base_levels.get(lvl["concurrency"])
+        if not base:
+            continue
+        if base["qps"] and lvl["qps"] < base["qps"] * (1 - MAX_REGRESSION):
+            out.append(f"c={lvl['concurrency']} qps {base['qps']} -> {lvl['qps']}")
+        b95, n95 = base["latency_ms"]["p95"], lvl["latency_ms"]["p95"]
+        if b95 and n95 and n95 > b95 * (1 + MAX_REGRESSION):
+            out.append(f"c={lvl['concurrency']} p95 {b95} ms -> {n95} ms")
+    b_ingest, n_ingest = baseline.get("ingest", {}).get("chunks_per_s"), report["ingest"]["chunks_per_s"]
+    if b_ingest and n_ingest < b_ingest * (1 - MAX_REGRESSION):
+        out.append(f"ingest chunks/s {b_ingest} -> {n_ingest}")
+    return out
+
+async def bench(tmp: str) -> dict:
+    questions = load_workload(WORKLOAD)
+    if not questions:
+        raise SystemExit(f"No questions in {WORKLOAD}")
+    procs, fake, api, log_path = start_servers(tmp)
+    try:
+        limits = httpx.Limits(max_connections=max(CONCURRENCY) + 4, max_keepalive_connections=max(CONCURRENCY) + 4)
+        async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+            await wait_ready(client, [f"{fake}/calls", f"{api}/v1/models"], procs, log_path)
+            report = {
+                "timestamp": time.time(),
+                "config": {
+                    "workload": str(WORKLOAD),
+                    "questions": len(questions),
+                    "requests_per_level": REQUESTS,
+                    "stream": STREAM,
+                    "max_tokens": MAX_TOKENS,
+                    "caches": CACHES,
+                    "fake": {k: v for k, v in os.environ.items() if k.startswith("FAKE_")},
+                },
+                "ingest": await ingest(client, api),
+                "chat": [],
+            }
+            print(f"ingest: {report['ingest']['chunks_per_s']} chunks/s", file=sys.stderr)
+            for c in CONCURRENCY:
+                level = await run_level(client, api, fake, questions, c)
+                report["chat"].append(level)
+                print(
+                    f"c={c:<4} qps={level['qps']:<8} p50={level['latency_ms']['p50']} ms "
+                    f"p95={level['latency_ms']['p95']} ms ttft_p50={level['ttft_ms']['p50']} ms errors={level['errors']}",
+                    file=sys.stderr,
+                )
+            report["api_metrics"] = {
+                "retrieval": (await client.get(f"{api}/admin/retrieval_stats")).json().get("stages"),
+                "embedding_batcher": (await client.get(f"{api}/admin/embedding_batcher_stats")).json(),
+            }
+            return report
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as tmp:
+        report = asyncio.run(bench(tmp))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if OUTPUT:
+        Path(OUTPUT).write_text(text + "\n", encoding="utf-8")
+    if BASELINE:
+        failed = regressions(report, json.loads(Path(BASELINE).read_text(encoding="utf-8")))
+        if failed:
+            print("Regressions vs baseline:\n  " + "\n  ".join(failed), file=sys.stderr)
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.chunking import chunk_text, structured_chunks
+from app.tokens import estimate_tokens
+
+TEXT_PATH = Path(os.getenv("TEXT_PATH", "data/pasted_text.txt"))
+SIZES_MB = [float(x) for x in os.getenv("BENCH_MB", "1,2,4,8").split(",")]
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "128"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+
+SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*$")
+
+def build_text(base: str, mb: float) -> str:
+    target = int(mb * 1024 * 1024)
+    return (base * (target // max(len(base), 1) + 1))[:target]
+
+def describe(name: str, texts, elapsed: float, mb: float) -> None:
+    n = len(texts)
+    tokens = [estimate_tokens(t) for t in texts]
+    sentence_ends = sum(1 for t in texts if SENTENCE_END.search(t))
+    mid_word = sum(1 for t in texts if t and t[-1].isalnum())
+    print(
+        f"{name:<10} {mb:>5.1f} MB  {elapsed * 1000:>8.1f} ms  {mb / elapsed:>6.1f} MB/s  "
+        f"chunks={n:<6} avg_tokens={sum(tokens) / max(n, 1):>6.1f} max_tokens={max(tokens, default=0):<4} "
+        f"sentence_end={sentence_ends / max(n, 1):.0%} mid_word={mid_word / max(n, 1):.0%}"
+    )
+
+def main():
+    if not TEXT_PATH.exists():
+        raise SystemExit(f"File not found: {TEXT_PATH.resolve()}")
+    base = TEXT_PATH.read_text(encoding="utf-8")
+    for mb in SIZES_MB:
+        text = build_text(base, mb)
+
+        start = time.perf_counter()
+        legacy = chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+        describe("chars", legacy, time.perf_counter() - start, mb)
+
+        start = time.perf_counter()
+        structured = structured_chunks(text, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+        describe("structured", [c.text for c in structured], time.perf_counter() - start, mb)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+
+from app.config import QDRANT_COLLECTION
+from app.qdrant_store import client, search_params
+
+# recall@k and latency of the configured search (HNSW + quantization/rescoring) against exact
+# search, per collection: e.g. COLLECTIONS=it_poc,it_poc_scalar before/after a migration.
+# Queries are stored vectors (sampled from the first collection) with Gaussian noise added,
+# so every collection is measured on the same query set.
+COLLECTIONS = [c.strip() for c in os.getenv("COLLECTIONS", QDRANT_COLLECTION).split(",") if c.strip()]
+QUERIES = int(os.getenv("BENCH_QUERIES", "200"))
+K = int(os.getenv("BENCH_K", "10"))
+NOISE = float(os.getenv("BENCH_NOISE", "0.05"))
+SAMPLE_POOL = int(os.getenv("BENCH_SAMPLE_POOL", "5000"))
+SEED = int(os.getenv("BENCH_SEED", "0"))
+
+EXACT = SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+
+async def sample_queries(name: str) -> list:
+    points, _ = await client.scroll(collection_name=name, limit=SAMPLE_POOL, with_payload=False, with_vectors=True)
+    if not points:
+        raise SystemExit(f"Collection is empty: {name}")
+    rng = np.random.default_rng(SEED)
+    random.seed(SEED)
+    out = []
+    for p in random.choices(points, k=QUERIES):
+        v = np.asarray(p.vector, dtype=np.float32)
+        v = v + rng.normal(0.0, NOISE, size=v.shape).astype(np.float32) * float(np.linalg.norm(v) or 1.0) / np.sqrt(len(v))
+        out.append(v.tolist())
+    return out
+
+async def ids(name: str, query: list, params) -> list:
+    res = await client.query_points(collection_name=name, query=query, limit=K, search_params=params, with_payload=False)
+    return [str(p.id) for p in res.points]
+
+async def bench(name: str, queries: list) -> dict:
+    info = await client.get_collection(name)
+    recalls = []
+    latencies = []
+    for q in queries:
+        truth = set(await ids(name, q, EXACT))
+        t0 = time.perf_counter()
+        got = await ids(name, q, search_params())
+        latencies.append((time.perf_counter() - t0) * 1000)
+        recalls.append(len(truth & set(got)) / max(len(truth), 1))
+    lat = np.asarray(latencies)
+    params = info.config.params
+    return {
+        "collection": name,
+        "points": info.points_count,
+        "quantization": type(info.config.quantization_config).__name__ if info.config.quantization_config else None,
+        "on_disk_vectors": bool(getattr(params.vectors, "on_disk", False)),
+        "on_disk_payload": bool(params.on_disk_payload),
+        "hnsw_m": info.config.hnsw_config.m,
+        f"recall@{K}": round(float(np.mean(recalls)), 4),
+        "latency_ms_p50": round(float(np.percentile(lat, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(lat, 95)), 3),
+        "latency_ms_mean": round(float(lat.mean()), 3),
+    }
+
+async def main():
+    try:
+        queries = await sample_queries(COLLECTIONS[0])
+        results = [await bench(name, queries) for name in COLLECTIONS]
+    finally:
+        await client.close()
+    print(json.dumps({"queries": QUERIES, "k": K, "noise": NOISE, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
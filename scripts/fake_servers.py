@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import time
+import zlib
+import asyncio
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Stand-in for the LLM + embeddings backends (OpenAI- and Ollama-style routes) used by
+# scripts/bench_api.py. Latencies and token rate are set through env vars; embeddings are
+# deterministic bag-of-words hashes, so similar texts land near each other and retrieval
+# behaves like it would on real vectors. Run: uvicorn --app-dir scripts fake_servers:app
+LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "150"))
+LLM_TOKENS_PER_S = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "50"))
+LLM_MAX_TOKENS = int(os.getenv("FAKE_LLM_MAX_TOKENS", "60"))
+EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "15"))
+EMBED_PER_ITEM_MS = float(os.getenv("FAKE_EMBED_PER_ITEM_MS", "0.5"))
+EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "384"))
+RERANK_LATENCY_MS = float(os.getenv("FAKE_RERANK_LATENCY_MS", "20"))
+
+WORD_RE = re.compile(r"\w+")
+
+app = FastAPI(title="fake LLM/embeddings backend")
+calls = {"chat": 0, "chat_stream": 0, "router": 0, "embed": 0, "embed_items": 0, "rerank": 0}
+
+def embed(text: str) -> list:
+    v = np.zeros(EMBED_DIM, dtype=np.float32)
+    for word in WORD_RE.findall(text.lower()):
+        v[zlib.crc32(word.encode()) % EMBED_DIM] += 1.0
+    norm = float(np.linalg.norm(v))
+    return (v / norm if norm else v).tolist()
+
+def answer_tokens(messages: list, max_tokens: int) -> list:
+    words = WORD_RE.findall(messages[-1].get("content", "") if messages else "") or ["ok"]
+    n = max(1, min(max_tokens or LLM_MAX_TOKENS, LLM_MAX_TOKENS))
+    return [words[i % len(words)] + " " for i in range(n)]
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    calls["embed"] += 1
+    calls["embed_items"] += len(texts)
+    await asyncio.sleep((EMBED_LATENCY_MS + EMBED_PER_ITEM_MS * len(texts)) / 1000)
+    return {"data": [{"index": i, "embedding": embed(t)} for i, t in enumerate(texts)]}
+
+@app.post("/api/embeddings")
+async def ollama_embeddings(request: Request):
+    body = await request.json()
+    calls["embed"] += 1
+    calls["embed_items"] += 1
+    await asyncio.sleep((EMBED_LATENCY_MS + EMBED_PER_ITEM_MS) / 1000)
+    return {"embedding": embed(body["prompt"])}
+
+@app.post("/v1/rerank")
+async def rerank(request: Request):
+    body = await request.json()
+    calls["rerank"] += 1
+    await asyncio.sleep(RERANK_LATENCY_MS / 1000)
+    q = embed(body["query"])
+    return {
+        "results": [
+            {"index": i, "relevance_score": float(np.dot(q, embed(doc)))}
+            for i, doc in enumerate(body["documents"])
+        ]
+    }
+
+@app.post("/v1/chat/completions")
+async def chat(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    system = messages[0].get("content", "") if messages else ""
+    if "router" in system:
+        calls["router"] += 1
+        await asyncio.sleep(LLM_TTFT_MS / 1000)
+        return {"choices": [{"message": {"role": "assistant", "content": '{"type":"final","answer":"use_rag"}'}}]}
+
+    tokens = answer_tokens(messages, body.get("max_tokens") or LLM_MAX_TOKENS)
+    per_token = 1.0 / LLM_TOKENS_PER_S if LLM_TOKENS_PER_S > 0 else 0.0
+    if body.get("stream"):
+        calls["chat_stream"] += 1
+
+        async def gen():
+            await asyncio.sleep(LLM_TTFT_MS / 1000)
+            for tok in tokens:
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': tok}}]})}\n\n"
+                await asyncio.sleep(per_token)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    calls["chat"] += 1
+    await asyncio.sleep(LLM_TTFT_MS / 1000 + per_token * len(tokens))
+    return {
+        "choices": [{"message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+        "usage": {"completion_tokens": len(tokens)},
+    }
+
+@app.get("/calls")
+async def get_calls():
+    return {**calls, "time": time.time()}
@@ -1,20 +1,77 @@
 import os
+import sys
 import json
+import time
+import asyncio
 import requests
 from pathlib import Path
 
 API_BASE = os.getenv("API_BASE", "http://localhost:8000")
 SOURCE = os.getenv("SOURCE", "my_pdf_poc")
 TEXT_PATH = Path(os.getenv("TEXT_PATH", "data/pasted_text.txt"))
+READ_BYTES = int(os.getenv("READ_BYTES", "65536"))
+
+def stream_file(path: Path):
+    # Yield the file in fixed-size blocks (sent with chunked transfer encoding) and show upload progress.
+    total = path.stat().st_size
+    sent = 0
+    start = time.time()
+    with path.open("rb") as f:
+        while True:
+            block = f.read(READ_BYTES)
+            if not block:
+                break
+            sent += len(block)
+            elapsed = max(time.time() - start, 1e-6)
+            print(f"\rsent {sent}/{total} bytes ({sent / elapsed / 1024:.0f} KiB/s)", end="", file=sys.stderr)
+            yield block
+    print(file=sys.stderr)
+
+def bulk(args):
+    # Directories / globs / files: chunked in a process pool and written straight to the
+    # vector store configured in .env. Stop the API first: it keeps its own BM25 index, answer
+    # cache (and local index) and would not see these writes; the run refuses to start while
+    # the API holds INDEX_LOCK_PATH.
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from app.bulk_ingest import bulk_ingest, expand_paths
+    from app.index_lock import IndexLockError
+
+    files = expand_paths(args)
+    if not files:
+        raise SystemExit(f"No files matched: {' '.join(args)}")
+    print(f"ingesting {len(files)} files", file=sys.stderr)
+
+    def progress(p):
+        print(
+            f"\rdocs {p['docs']}/{len(files)}  chunks {p['chunks']}  "
+            f"{p['docs_per_s']:.1f} docs/s  {p['chunks_per_s']:.0f} chunks/s  "
+            f"embed utilization {p['embed_utilization']:.0%}",
+            end="",
+            file=sys.stderr,
+        )
+
+    try:
+        result = asyncio.run(bulk_ingest(files, on_progress=progress))
+    except IndexLockError as e:
+        raise SystemExit(str(e))
+    print(file=sys.stderr)
+    print(json.dumps(result, indent=2))
+    if result["failed"]:
+        raise SystemExit(1)
 
 def main():
+    if len(sys.argv) > 1:
+        return bulk(sys.argv[1:])
     if not TEXT_PATH.exists():
         raise SystemExit(f"File not found: {TEXT_PATH.resolve()}")
 
-    text = TEXT_PATH.read_text(encoding="utf-8", errors="ignore")
-
-    payload = {"source": SOURCE, "text": text}
-    r = requests.post(f"{API_BASE}/admin/ingest_text", json=payload, timeout=600)
+    r = requests.post(
+        f"{API_BASE}/admin/ingest_stream",
+        params={"source": SOURCE},
+        data=stream_file(TEXT_PATH),
+        headers={"Content-Type": "text/plain; charset=utf-8"},
+        timeout=600,
+    )
     if not r.ok:
         print("STATUS:", r.status_code)
         print("BODY:", r.text[:2000])
@@ -22,4 +79,4 @@ def main():
     print(json.dumps(r.json(), indent=2))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from qdrant_client.http.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PointStruct,
+)
+
+from app.config import (
+    EMBEDDINGS_MODEL,
+    QDRANT_COLLECTION,
+    QDRANT_QUANTIZATION,
+    QDRANT_ON_DISK_VECTORS,
+    QDRANT_ON_DISK_PAYLOAD,
+)
+from app.qdrant_store import client, create_collection
+
+# Rebuilds a collection under the layout configured in .env (QDRANT_QUANTIZATION, QDRANT_ON_DISK_*,
+# QDRANT_HNSW_*). With MIGRATE_TARGET the points are copied into that new collection and the
+# source is left alone (switch QDRANT_COLLECTION when satisfied).
+#
+# Without it the rebuild happens behind a Qdrant alias: QDRANT_COLLECTION becomes an alias for a
+# versioned collection ({SOURCE}__v1, __v2, ...). Each run copies into the next version and
+# switches the alias in one atomic request, so the API never sees a missing collection. Writes
+# made during the copy are not carried over: pause ingestion while it runs. The first run on a
+# plain collection must delete it before the alias can take its name, a gap of one request. A
+# rerun after a crash (including one of the older delete-and-copy-back runs, which left
+# {SOURCE}__rebuild behind) finishes from the surviving complete copy instead of failing.
+SOURCE = os.getenv("MIGRATE_SOURCE", QDRANT_COLLECTION)
+TARGET = os.getenv("MIGRATE_TARGET", "").strip()
+BATCH = int(os.getenv("MIGRATE_BATCH", "256"))
+
+async def count(name: str) -> int:
+    return (await client.count(collection_name=name, exact=True)).count
+
+async def copy_points(src: str, dst: str) -> int:
+    total = await count(src)
+    copied = 0
+    offset = None
+    start = time.time()
+    while True:
+        points, offset = await client.scroll(
+            collection_name=src,
+            limit=BATCH,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            await client.upsert(
+                collection_name=dst,
+                points=[PointStruct(id=p.id, vector=p.vector, payload=p.payload or {}) for p in points],
+                wait=True,
+            )
+            copied += len(points)
+            elapsed = max(time.time() - start, 1e-6)
+            print(f"\r{src} -> {dst}: {copied}/{total} points ({copied / elapsed:.0f}/s)", end="", file=sys.stderr)
+        if offset is None:
+            break
+    print(file=sys.stderr)
+    copied_count = await count(dst)
+    if copied_count != total:
+        raise SystemExit(f"Copy incomplete: {dst} has {copied_count} points, {src} has {total}")
+    return copied
+
+async def rebuild(src: str, dst: str, size: int, model: str) -> int:
+    if await client.collection_exists(dst):
+        raise SystemExit(f"Target collection already exists: {dst}")
+    # The copied vectors keep the source's embedding model, so its metadata travels with them.
+    await create_collection(dst, size, embedding_model=model)
+    return await copy_points(src, dst)
+
+def version(name: str) -> Optional[int]:
+    # {SOURCE}__v<n> -> n; the older script's {SOURCE}__rebuild counts as version 0.
+    if name == f"{SOURCE}__rebuild":
+        return 0
+    prefix = f"{SOURCE}__v"
+    tail = name[len(prefix):]
+    return int(tail) if name.startswith(prefix) and tail.isdigit() else None
+
+async def collection_names() -> List[str]:
+    return [c.name for c in (await client.get_collections()).collections]
+
+async def aliases() -> Dict[str, str]:
+    return {a.alias_name: a.collection_name for a in (await client.get_aliases()).aliases}
+
+async def point_alias(name: str, current: Optional[str]) -> None:
+    ops = []
+    if current is not None:
+        ops.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=SOURCE)))
+    ops.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=name, alias_name=SOURCE)))
+    # One request: Qdrant applies the alias changes atomically.
+    await client.update_collection_aliases(change_aliases_operations=ops)
+    print(f"{SOURCE} -> {name}", file=sys.stderr)
+
+async def recover() -> Tuple[Optional[str], bool]:
+    # Finishes an interrupted in-place run: (collection SOURCE resolves to, whether it resumed one).
+    names = await collection_names()
+    current = (await aliases()).get(SOURCE)
+    resumed = False
+    leftovers = sorted((n for n in names if version(n) is not None and n != current), key=version)
+    if current is None and leftovers:
+        # Copies are complete before the plain collection is deleted, so a missing (or smaller,
+        # half copied-back) plain collection means the newest leftover holds the data.
+        newest = leftovers.pop()
+        if SOURCE not in names or await count(SOURCE) < await count(newest):
+            print(f"Resuming interrupted rebuild from {newest}", file=sys.stderr)
+            if SOURCE in names:
+                await client.delete_collection(SOURCE)
+                names.remove(SOURCE)
+            await point_alias(newest, None)
+            resumed = True
+            current = newest
+        else:
+            leftovers.append(newest)
+    for name in leftovers:
+        # An interrupted copy, or the version a finished swap replaced.
+        print(f"Dropping stale collection {name}", file=sys.stderr)
+        await client.delete_collection(name)
+    if current is None and SOURCE in names:
+        current = SOURCE
+    return current, resumed
+
+async def rebuild_in_place(current: str, size: int, model: str) -> Dict:
+    versions = [v for v in map(version, await collection_names()) if v is not None]
+    target = f"{SOURCE}__v{max(versions, default=0) + 1}"
+    copied = await rebuild(current, target, size, model)
+    if current == SOURCE:
+        # A plain collection: its name has to be free before the alias can take it.
+        await client.delete_collection(SOURCE)
+        await point_alias(target, None)
+    else:
+        await point_alias(target, current)
+        await client.delete_collection(current)
+    return {"source": SOURCE, "target": target, "points": copied}
+
+async def main():
+    start = time.time()
+    try:
+        resumed = False
+        if TARGET:
+            current = (await aliases()).get(SOURCE, SOURCE)
+        else:
+            current, resumed = await recover()
+        if current is None or not await client.collection_exists(current):
+            raise SystemExit(f"Collection not found: {SOURCE}")
+        info = await client.get_collection(current)
+        size = info.config.params.vectors.size
+        model = (info.config.metadata or {}).get("embedding_model") or EMBEDDINGS_MODEL
+        if TARGET:
+            copied = await rebuild(current, TARGET, size, model)
+            result = {"source": SOURCE, "target": TARGET, "points": copied}
+        elif resumed:
+            # The resumed copy was already built under the configured layout.
+            result = {"source": SOURCE, "target": current, "points": await count(current), "resumed": True}
+        else:
+            result = await rebuild_in_place(current, size, model)
+    finally:
+        await client.close()
+    result.update(
+        {
+            "quantization": QDRANT_QUANTIZATION,
+            "on_disk_vectors": QDRANT_ON_DISK_VECTORS,
+            "on_disk_payload": QDRANT_ON_DISK_PAYLOAD,
+            "elapsed_s": round(time.time() - start, 3),
+        }
+    )
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+import os
+import sys
+from pathlib import Path
+
+# Offline defaults, set before app.config reads the environment: in-process vector index,
+# nothing persisted, no lock file.
+for key, value in {
+    "VECTOR_BACKEND": "local",
+    "LOCAL_INDEX_PATH": "",
+    "LEXICAL_INDEX_PATH": "",
+    "EMBED_CACHE_PATH": "",
+    "ANSWER_CACHE_PATH": "",
+    "INDEX_LOCK_PATH": "",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def store(monkeypatch):
+    # Empty in-process vector index + BM25 index, and a deterministic stand-in for the embeddings backend.
+    from app import ingest, lexical, local_store, retrieval, vector_store
+
+    monkeypatch.setattr(local_store, "index", local_store.LocalIndex())
+    bm25 = lexical.BM25Index()
+    for module in (lexical, vector_store, retrieval):
+        monkeypatch.setattr(module, "lexical_index", bm25)
+    embedded = []
+
+    async def embed_all(texts, *args, **kwargs):
+        embedded.extend(texts)
+        return [fake_vector(t) for t in texts]
+
+    async def embedding_dimension():
+        return 8
+
+    monkeypatch.setattr(ingest, "embed_all", embed_all)
+    monkeypatch.setattr(ingest, "embedding_dimension", embedding_dimension)
+    return embedded
+
+
+def fake_vector(text):
+    # Bag of letters: texts sharing words land close together.
+    vec = [0.0] * 8
+    for ch in text.lower():
+        if ch.isalpha():
+            vec[ord(ch) % 8] += 1.0
+    return vec
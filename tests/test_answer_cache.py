@@ -0,0 +1,42 @@
+import app.answer_cache as answer_cache_module
+from app.answer_cache import AnswerCache
+
+HITS = [{"id": "p1", "source": "handbook"}, {"id": "p2", "source": "faq"}]
+
+
+def test_hit_needs_same_chunks_budget_and_a_close_query():
+    cache = AnswerCache(max_entries=10, threshold=0.95, ttl=0)
+    cache.store([1.0, 0.0], HITS, 300, "twenty days")
+    assert cache.lookup([0.99, 0.05], HITS, 300) == "twenty days"
+    assert cache.lookup([0.0, 1.0], HITS, 300) is None
+    assert cache.lookup([1.0, 0.0], HITS[:1], 300) is None
+    assert cache.lookup([1.0, 0.0], list(reversed(HITS)), 300) is None
+    assert cache.lookup([1.0, 0.0], HITS, 100) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_lru_and_source_invalidation(monkeypatch):
+    cache = AnswerCache(max_entries=2, threshold=0.9, ttl=60)
+    cache.store([1.0, 0.0], HITS, 300, "a")
+    cache.store([1.0, 0.0], [{"id": "p3", "source": "faq"}], 300, "b")
+    cache.store([1.0, 0.0], [{"id": "p4", "source": "other"}], 300, "c")
+    assert cache.lookup([1.0, 0.0], HITS, 300) is None  # evicted, oldest first
+
+    assert cache.invalidate_source("faq") == 1
+    assert cache.lookup([1.0, 0.0], [{"id": "p4", "source": "other"}], 300) == "c"
+
+    now = answer_cache_module.time.time()
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now + 61)
+    assert cache.lookup([1.0, 0.0], [{"id": "p4", "source": "other"}], 300) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_persistence_round_trip(tmp_path):
+    path = str(tmp_path / "answers.json")
+    cache = AnswerCache(max_entries=10, threshold=0.95, ttl=0, path=path)
+    cache.store([0.6, 0.8], HITS, 300, "saved answer")
+    cache.save()
+    reloaded = AnswerCache(max_entries=10, threshold=0.95, ttl=0, path=path)
+    reloaded.load()
+    assert reloaded.lookup([0.6, 0.8], HITS, 300) == "saved answer"
+    assert reloaded.invalidate_source("handbook") == 1
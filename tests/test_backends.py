@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import backends
+from app.backends import BackendPool
+
+
+def _pool(monkeypatch, *handlers, threshold=2):
+    # One node per handler, each answering through an in-process transport.
+    monkeypatch.setattr(backends, "BACKEND_FAILURE_THRESHOLD", threshold)
+    pool = BackendPool("test", [f"http://node{i}" for i in range(len(handlers))], 5, 1, 4)
+    for node, handler in zip(pool.nodes, handlers):
+        node._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=node.base_url)
+    return pool
+
+
+def ok(request):
+    return httpx.Response(200, json={"node": str(request.url.host)})
+
+
+def refused(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def test_least_outstanding_node_is_picked(monkeypatch):
+    pool = _pool(monkeypatch, ok, ok, ok)
+    pool.nodes[0].pending = 2
+    pool.nodes[1].pending = 1
+    r = asyncio.run(pool.post("/x", json={}))
+    assert r.json()["node"] == "node2"
+
+
+def test_connect_errors_fail_over_and_open_the_circuit(monkeypatch):
+    pool = _pool(monkeypatch, refused, ok)
+    pool.nodes[1].pending = 5  # node0 looks idler, so it is tried first
+    for _ in range(2):
+        r = asyncio.run(pool.post("/x", json={}))
+        assert r.json()["node"] == "node1"
+    dead = pool.nodes[0]
+    assert dead.circuit_open and dead.failures == 2
+    asyncio.run(pool.post("/x", json={}))
+    assert dead.requests == 2  # skipped while open
+
+    # Past the cooldown the node gets one trial call; failing it re-opens the circuit at once.
+    dead.open_until = 0.0
+    assert not dead.circuit_open
+    asyncio.run(pool.post("/x", json={}))
+    assert dead.requests == 3 and dead.circuit_open
+
+
+def test_overloaded_status_fails_over_but_500_does_not(monkeypatch):
+    pool = _pool(monkeypatch, lambda req: httpx.Response(503), ok)
+    pool.nodes[1].pending = 5
+    assert asyncio.run(pool.post("/x", json={})).status_code == 200
+    assert pool.nodes[0].failures == 1
+
+    pool = _pool(monkeypatch, lambda req: httpx.Response(500), ok)
+    pool.nodes[1].pending = 5
+    assert asyncio.run(pool.post("/x", json={})).status_code == 500
+    assert pool.nodes[0].failures == 0
+
+
+def test_read_timeout_is_not_retried(monkeypatch):
+    def timeout(request):
+        raise httpx.ReadTimeout("slow", request=request)
+
+    calls = []
+
+    def counting_ok(request):
+        calls.append(1)
+        return ok(request)
+
+    pool = _pool(monkeypatch, timeout, counting_ok)
+    pool.nodes[1].pending = 5
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(pool.post("/x", json={}))
+    assert calls == [] and pool.nodes[0].failures == 1
+
+
+def test_every_node_down_still_tries_them_all(monkeypatch):
+    pool = _pool(monkeypatch, refused, refused, threshold=1)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(pool.post("/x", json={}))
+    assert all(n.circuit_open for n in pool.nodes)
+
+
+def test_stream_fails_over_before_the_body(monkeypatch):
+    pool = _pool(monkeypatch, refused, lambda req: httpx.Response(200, content=b"data: hi\n\n"))
+    pool.nodes[1].pending = 5
+
+    async def main():
+        async with pool.stream("/x", json={}) as r:
+            return await r.aread()
+
+    assert asyncio.run(main()) == b"data: hi\n\n"
+    assert pool.nodes[0].failures == 1
+    assert [n.pending for n in pool.nodes] == [0, 5]
+
+
+def test_health_checks_mark_nodes_down_and_up(monkeypatch):
+    up = {"node0": True, "node1": False}
+
+    def health(request):
+        if not up[request.url.host]:
+            raise httpx.ConnectTimeout("no answer", request=request)
+        return httpx.Response(404)  # any answer but 502/503/504 means the server is alive
+
+    pool = _pool(monkeypatch, ok, ok, threshold=1)
+    pool._probe_client = httpx.AsyncClient(transport=httpx.MockTransport(health))
+    asyncio.run(pool.check_health())
+    assert [n.circuit_open for n in pool.nodes] == [False, True]
+    assert pool.nodes[0].probe_ms is not None
+
+    up["node1"] = True
+    asyncio.run(pool.check_health())
+    assert [n.circuit_open for n in pool.nodes] == [False, False]
+    assert pool.stats()["nodes"][1]["consecutive_failures"] == 0
+
+
+def test_embeddings_endpoint_is_probed_once_per_node(monkeypatch):
+    from app import embeddings
+
+    paths = []
+
+    def ollama_only(request):
+        paths.append(request.url.path)
+        if request.url.path == "/v1/embeddings":
+            return httpx.Response(404, text="404 page not found")
+        return httpx.Response(200, json={"embedding": [1.0, 0.0]})
+
+    pool = _pool(monkeypatch, ollama_only)
+    monkeypatch.setattr(embeddings, "embeddings_backend", pool)
+    monkeypatch.setattr(embeddings, "EMBEDDINGS_ENDPOINT", "")
+    assert asyncio.run(embeddings._embed_uncached(["a", "b"])) == [[1.0, 0.0], [1.0, 0.0]]
+    asyncio.run(embeddings._embed_uncached(["c"]))
+    assert paths.count("/v1/embeddings") == 1
+    assert pool.nodes[0].capabilities == {"embeddings": "/api/embeddings"}
+
+
+def test_node_caps_in_flight_requests_and_tracks_busy_time():
+    active = {"now": 0, "max": 0, "call_s": 0.0}
+
+    async def slow(request):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.02)
+        active["call_s"] += time.perf_counter() - t0
+        active["now"] -= 1
+        return httpx.Response(200)
+
+    node = backends.Backend("test", "http://node", 5, 1, max_concurrency=2)
+    node._client = httpx.AsyncClient(transport=httpx.MockTransport(slow), base_url=node.base_url)
+
+    async def main():
+        await asyncio.gather(*(node.post("/x", json={}) for _ in range(6)))
+
+    asyncio.run(main())
+    assert active["max"] == 2
+    assert node.requests == 6
+    # Calls overlap in pairs: busy time is wall time with something in flight, not the sum of calls.
+    assert 0.06 <= node.busy_s < active["call_s"]
@@ -0,0 +1,38 @@
+import json
+
+from scripts import bench_api
+
+
+def _report(qps, p95, chunks_per_s, concurrency=4):
+    return {
+        "chat": [{"concurrency": concurrency, "qps": qps, "latency_ms": {"p95": p95}}],
+        "ingest": {"chunks_per_s": chunks_per_s},
+    }
+
+
+def test_changes_within_the_threshold_pass(monkeypatch):
+    monkeypatch.setattr(bench_api, "MAX_REGRESSION", 0.2)
+    assert bench_api.regressions(_report(85, 115, 90), _report(100, 100, 100)) == []
+
+
+def test_qps_latency_and_ingest_regressions_are_reported(monkeypatch):
+    monkeypatch.setattr(bench_api, "MAX_REGRESSION", 0.2)
+    out = bench_api.regressions(_report(70, 130, 70), _report(100, 100, 100))
+    assert out == ["c=4 qps 100 -> 70", "c=4 p95 100 ms -> 130 ms", "ingest chunks/s 100 -> 70"]
+
+
+def test_levels_missing_from_the_baseline_are_skipped():
+    assert bench_api.regressions(_report(1, 1000, 100, concurrency=16), _report(100, 100, 100)) == []
+
+
+def test_workload_accepts_question_messages_and_title(tmp_path):
+    path = tmp_path / "workload.jsonl"
+    rows = [
+        {"question": "q1"},
+        {"messages": [{"role": "user", "content": "old"}, {"role": "assistant", "content": "a"}, {"role": "user", "content": "q2"}]},
+        {"title": "q3", "body": "ignored"},
+        {"body": "q4"},
+        {},
+    ]
+    path.write_text("\n".join(json.dumps(r) for r in rows) + "\n\n", encoding="utf-8")
+    assert bench_api.load_workload(path) == ["q1", "q2", "q3", "q4"]
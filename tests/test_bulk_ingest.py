@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app import bulk_ingest, index_lock
+
+
+@pytest.fixture
+def lock_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "index.lock")
+    monkeypatch.setattr(index_lock, "INDEX_LOCK_PATH", path)
+    return path
+
+
+@pytest.mark.skipif(index_lock.fcntl is None, reason="no advisory locks on this platform")
+def test_bulk_ingest_refuses_while_api_holds_lock(lock_path):
+    api = index_lock.acquire_index_lock(exclusive=False)
+    try:
+        with pytest.raises(index_lock.IndexLockError):
+            index_lock.acquire_index_lock(exclusive=True)
+        # Several API workers may share it.
+        index_lock.release_index_lock(index_lock.acquire_index_lock(exclusive=False))
+    finally:
+        index_lock.release_index_lock(api)
+    index_lock.release_index_lock(index_lock.acquire_index_lock(exclusive=True))
+
+
+def test_zero_concurrent_docs_does_not_hang(tmp_path, lock_path, monkeypatch):
+    doc = tmp_path / "a.txt"
+    doc.write_text("One sentence. Another sentence.", encoding="utf-8")
+    ingested = []
+
+    async def ingest_chunks(source, chunks, window):
+        ingested.append(source)
+        return {k: 0 for k in ("chunks", "upserted", "moved", "unchanged", "duplicates", "deleted")}
+
+    async def noop():
+        return None
+
+    monkeypatch.setattr(bulk_ingest, "BULK_CONCURRENT_DOCS", 0)
+    monkeypatch.setattr(bulk_ingest, "BULK_WORKERS", 1)
+    monkeypatch.setattr(bulk_ingest, "ingest_chunks", ingest_chunks)
+    monkeypatch.setattr(bulk_ingest, "load_store", noop)
+    monkeypatch.setattr(bulk_ingest, "close_store", noop)
+    monkeypatch.setattr(bulk_ingest.embedding_cache, "save", lambda: None)
+
+    result = asyncio.run(asyncio.wait_for(bulk_ingest.bulk_ingest([(str(doc), "a.txt")]), 30))
+    assert ingested == ["a.txt"]
+    assert result["docs"] == 1 and result["failed"] == 0
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import main
+from app.answer_cache import AnswerCache
+
+# No context manager: lifespan (stores, backends, job workers) is not started.
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    # Stand-ins for batched retrieval and the LLM; records what each one was asked.
+    calls = {"retrieve": [], "llm": []}
+
+    async def retrieve_hits_batch(questions, flt=None):
+        calls["retrieve"].append(list(questions))
+        return [
+            ([1.0, 0.0], [] if "unknown" in q else [{"id": q, "source": "doc", "chunk_index": 0, "text": f"About {q}.", "score": 0.9}])
+            for q in questions
+        ]
+
+    async def llama_chat(messages, max_tokens=300, temperature=0.2):
+        question = messages[-1]["content"]
+        calls["llm"].append(question)
+        if "fail" in question:
+            raise HTTPException(status_code=504, detail="LLM timed out")
+        return "answer"
+
+    monkeypatch.setattr(main, "retrieve_hits_batch", retrieve_hits_batch)
+    monkeypatch.setattr(main, "llama_chat", llama_chat)
+    monkeypatch.setattr(main, "answer_cache", AnswerCache(max_entries=10, threshold=0.99, ttl=0))
+    return calls
+
+
+def test_results_keep_order_and_retrieval_runs_once(backends):
+    questions = ["What is 2+3?", "vacation policy", "unknown thing", "please fail"]
+    r = client.post("/v1/chat/batch", json={"questions": questions})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [item["index"] for item in results] == [0, 1, 2, 3]
+    assert results[0]["answer"] == "The result is 5"
+    assert results[1]["answer"] == "answer" and results[1]["sources"]
+    assert results[2]["answer"] == main.NO_CONTEXT_ANSWER
+    assert results[3]["answer"] is None and results[3]["error"] == "LLM timed out"
+    # The calc question never reaches retrieval; the others share one batched call.
+    assert backends["retrieve"] == [questions[1:]]
+
+
+def test_repeated_question_is_served_from_the_answer_cache(backends):
+    r = client.post("/v1/chat/batch", json={"questions": ["vacation policy"]})
+    assert r.json()["results"][0]["cached"] is False
+    r = client.post("/v1/chat/batch", json={"questions": ["vacation policy"]})
+    assert r.json()["results"][0]["cached"] is True
+    assert len(backends["llm"]) == 1
+
+
+def test_stream_yields_one_line_per_question(backends):
+    r = client.post("/v1/chat/batch", json={"questions": ["a question", "another question"], "stream": True})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted(item["index"] for item in lines) == [0, 1]
+
+
+def test_invalid_batches_are_rejected(backends, monkeypatch):
+    assert client.post("/v1/chat/batch", json={"questions": []}).status_code == 400
+    assert client.post("/v1/chat/batch", json={"questions": ["ok", "  "]}).status_code == 400
+    monkeypatch.setattr(main, "BATCH_MAX_QUESTIONS", 1)
+    assert client.post("/v1/chat/batch", json={"questions": ["a", "b"]}).status_code == 413
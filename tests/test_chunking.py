@@ -0,0 +1,74 @@
+import random
+from pathlib import Path
+
+import pytest
+
+from app.chunking import chunk_text, iter_chunks, iter_structured_chunks, structured_chunks
+from app.tokens import token_cost
+
+SAMPLE = (Path(__file__).resolve().parent.parent / "data" / "pasted_text.txt").read_text(encoding="utf-8")
+
+
+def _pieces(text, seed):
+    rng = random.Random(seed)
+    out, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 300)
+        out.append(text[i:i + n])
+        i += n
+    return out
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_streamed_char_windows_match_one_shot(seed):
+    assert list(iter_chunks(_pieces(SAMPLE, seed), 500, 200)) == chunk_text(SAMPLE, 500, 200)
+
+
+@pytest.mark.parametrize("max_tokens,overlap", [(128, 24), (40, 10), (16, 0)])
+def test_structured_offsets_point_at_the_chunk_text(max_tokens, overlap):
+    chunks = structured_chunks(SAMPLE, max_tokens, overlap)
+    assert chunks
+    for c in chunks:
+        assert SAMPLE[c.start:c.end] == c.text
+        assert c.text == c.text.strip()
+    starts = [c.start for c in chunks]
+    assert starts == sorted(starts)
+
+
+def test_structured_chunks_respect_the_budget_and_cover_the_text():
+    chunks = structured_chunks(SAMPLE, 64, 12)
+    for c in chunks:
+        assert token_cost(c.text) <= 64
+    covered = bytearray(len(SAMPLE))
+    for c in chunks:
+        covered[c.start:c.end] = b"\x01" * (c.end - c.start)
+    uncovered = "".join(ch for ch, hit in zip(SAMPLE, covered) if not hit)
+    assert not uncovered.strip()
+
+
+def test_chunks_end_at_sentence_boundaries():
+    text = "First sentence here. Second one follows! Third asks why? " * 20
+    for c in structured_chunks(text, 20, 0):
+        assert c.text[-1] in ".!?"
+
+
+def test_overlap_repeats_whole_sentences():
+    text = " ".join(f"Sentence number {i} is here." for i in range(40))
+    chunks = structured_chunks(text, 30, 10)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.start < prev.end
+        assert text[nxt.start - 1] == " " and text[nxt.start:].startswith("Sentence")
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_streamed_structured_chunks_match_one_shot(seed):
+    assert list(iter_structured_chunks(_pieces(SAMPLE, seed), 128, 24)) == structured_chunks(SAMPLE, 128, 24)
+
+
+def test_long_text_without_boundaries_is_cut_at_whitespace():
+    text = " ".join(["word"] * 5000)
+    chunks = structured_chunks(text, 32, 0)
+    for c in chunks:
+        assert text[c.start:c.end] == c.text
+        assert c.text.startswith("word") and c.text.endswith("word")
+        assert token_cost(c.text) <= 32
@@ -0,0 +1,56 @@
+from app.context import SEPARATOR, pack_context
+from app.tokens import estimate_tokens
+
+OVERLAP = "shared overlap text that spans the chunk boundary. "
+
+
+def test_offset_chunks_are_joined_without_repeating_the_overlap():
+    first = "Alpha section begins here. " + OVERLAP
+    second = OVERLAP + "Beta section continues."
+    start = len(first) - len(OVERLAP)
+    hits = [
+        {"source": "doc", "chunk_index": 1, "text": second, "char_start": start, "char_end": start + len(second)},
+        {"source": "doc", "chunk_index": 0, "text": first, "char_start": 0, "char_end": len(first)},
+    ]
+    text, stats = pack_context(hits, 0)
+    assert text == first + "Beta section continues."
+    assert stats["merged"] == 1
+    assert stats["tokens_saved"] > 0
+
+
+def test_text_overlap_is_detected_without_offsets():
+    first = "Legacy chunk without offsets. " + OVERLAP
+    second = OVERLAP + "Rest of the legacy document."
+    hits = [{"source": "doc", "text": first}, {"source": "doc", "text": second}]
+    text, stats = pack_context(hits, 0)
+    assert text.count(OVERLAP.strip()) == 1
+    assert stats["merged"] == 1
+
+
+def test_unrelated_chunks_keep_relevance_order():
+    hits = [
+        {"source": "b", "chunk_index": 4, "text": "Most relevant."},
+        {"source": "a", "chunk_index": 0, "text": "Second."},
+        {"source": "b", "chunk_index": 9, "text": "Third."},
+    ]
+    text, stats = pack_context(hits, 0)
+    assert text.split(SEPARATOR) == ["Most relevant.", "Second.", "Third."]
+    assert stats["merged"] == 0
+
+
+def test_budget_truncates_the_last_block():
+    hits = [
+        {"source": "a", "chunk_index": 0, "text": "word " * 40},
+        {"source": "b", "chunk_index": 0, "text": "other " * 40},
+    ]
+    budget = estimate_tokens(hits[0]["text"]) + 10
+    text, stats = pack_context(hits, budget)
+    assert stats["tokens_out"] <= budget
+    assert stats["truncated"] == 1
+    assert estimate_tokens(text) <= budget
+
+
+def test_chunks_without_an_index_are_not_dropped_as_duplicates():
+    hits = [{"source": "doc", "text": "First legacy chunk."}, {"source": "doc", "text": "Second legacy chunk."}]
+    text, _ = pack_context(hits, 0)
+    assert "First legacy chunk." in text and "Second legacy chunk." in text
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app import embedding_pipeline, embeddings
+from app.embedding_pipeline import AdaptiveBatchSizer, embed_all
+from app.embeddings import EmbeddingCache
+
+
+def test_batches_cut_at_size_or_payload_limit():
+    sizer = AdaptiveBatchSizer(initial=4, min_size=1, max_size=64, target_ms=100, max_chars=10)
+    texts = ["aaaa", "bbbb", "cccc", "dddd", "e"]
+    assert sizer.next_end(texts, 0) == 2  # third text would pass 10 chars
+    assert sizer.next_end(["x" * 50], 0) == 1  # an oversized text still goes alone
+    assert sizer.next_end(["a"] * 10, 8) == 10
+
+
+def test_size_grows_when_fast_and_halves_when_slow():
+    sizer = AdaptiveBatchSizer(initial=8, min_size=2, max_size=16, target_ms=100, max_chars=10**6)
+    sizer.observe(8, 10)
+    assert sizer.size == 12
+    sizer.observe(12, 10)
+    sizer.observe(16, 10)
+    assert sizer.size == 16
+    sizer.observe(16, 400)
+    assert sizer.size == 8
+    for _ in range(5):
+        sizer.observe(8, 400)
+    assert sizer.size == 2
+
+
+@pytest.fixture
+def sizer(monkeypatch):
+    sizer = AdaptiveBatchSizer(initial=3, min_size=3, max_size=3, target_ms=10**6, max_chars=10**6)
+    monkeypatch.setattr(embedding_pipeline, "batch_sizer", sizer)
+    return sizer
+
+
+def test_embed_all_keeps_order_and_bounds_concurrency(sizer, monkeypatch):
+    in_flight = []
+    peak = []
+
+    async def embed_texts(batch, on_backend_call=None):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01 if batch[0] == "t0" else 0)
+        in_flight.pop()
+        return [[float(t[1:])] for t in batch]
+
+    monkeypatch.setattr(embedding_pipeline, "embed_texts", embed_texts)
+    texts = [f"t{i}" for i in range(10)]
+    vectors = asyncio.run(embed_all(texts, concurrency=2))
+    assert vectors == [[float(i)] for i in range(10)]
+    assert max(peak) == 2
+
+
+def test_embed_all_stops_on_the_first_failed_batch(sizer, monkeypatch):
+    calls = []
+
+    async def embed_texts(batch, on_backend_call=None):
+        calls.append(batch)
+        if batch[0] == "t0":
+            raise RuntimeError("backend down")
+        await asyncio.sleep(0.01)
+        return [[0.0] for _ in batch]
+
+    monkeypatch.setattr(embedding_pipeline, "embed_texts", embed_texts)
+    with pytest.raises(RuntimeError, match="backend down"):
+        asyncio.run(embed_all([f"t{i}" for i in range(30)], concurrency=1))
+    assert len(calls) < 10
+
+
+def test_cached_batches_do_not_grow_the_batch_size(monkeypatch):
+    sizer = AdaptiveBatchSizer(initial=4, min_size=1, max_size=64, target_ms=100, max_chars=10**6)
+    monkeypatch.setattr(embedding_pipeline, "batch_sizer", sizer)
+    monkeypatch.setattr(embeddings, "embedding_cache", EmbeddingCache(1 << 20, ttl=0))
+    calls = []
+
+    async def embed_uncached(texts):
+        calls.append(len(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+    monkeypatch.setattr(embeddings, "_embed_uncached", embed_uncached)
+    texts = [f"chunk {i}" for i in range(40)]
+    asyncio.run(embed_all(texts, concurrency=1))
+    size, backend_calls = sizer.size, len(calls)
+    assert 4 < size < 64  # grew on fast backend calls
+    for _ in range(5):
+        asyncio.run(embed_all(texts, concurrency=1))  # re-ingest: every batch is a cache hit
+    assert len(calls) == backend_calls and sizer.size == size
+
+
+def test_cancelled_batch_is_not_mistaken_for_a_failure(sizer, monkeypatch):
+    calls = []
+
+    async def embed_texts(batch, on_backend_call=None):
+        calls.append(batch)
+        if batch[0] == "t0":
+            asyncio.current_task().cancel()
+            await asyncio.sleep(0)
+        return [[0.0] for _ in batch]
+
+    monkeypatch.setattr(embedding_pipeline, "embed_texts", embed_texts)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(embed_all([f"t{i}" for i in range(9)], concurrency=1))
+    # The failure scan skips the cancelled task; the cancellation surfaces from gather().
+    assert len(calls) == 3
@@ -0,0 +1,98 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app import embeddings
+from app.embeddings import EmbeddingCache, cache_key
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    # Fresh cache + a stand-in embeddings call that records what reached the backend.
+    calls = []
+
+    async def embed_uncached(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+    monkeypatch.setattr(embeddings, "embedding_cache", EmbeddingCache(1 << 20, ttl=0))
+    monkeypatch.setattr(embeddings, "_embed_uncached", embed_uncached)
+    monkeypatch.setattr(embeddings, "_dimensions", {})
+    return calls
+
+
+def test_chunk_keys_keep_case_and_layout():
+    assert cache_key("NASA  Budget") != cache_key("nasa budget")
+    assert cache_key("NASA  Budget", query=True) == cache_key("nasa budget", query=True)
+    assert cache_key("nasa budget", query=True) != cache_key("nasa budget")
+    assert cache_key("x", model="a") != cache_key("x", model="b")
+
+
+def test_chunks_differing_in_case_are_embedded_separately(backend):
+    asyncio.run(embeddings.embed_texts(["def Foo():", "def foo():"]))
+    assert backend == [["def Foo():", "def foo():"]]
+
+
+def test_queries_hit_the_cache_across_case_and_spacing(backend):
+    asyncio.run(embeddings.embed_texts(["What is  the Policy?"], query=True))
+    asyncio.run(embeddings.embed_texts(["what is the policy?"], query=True))
+    assert len(backend) == 1
+
+
+def test_cache_ttl_and_persistence(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.npz")
+    cache = EmbeddingCache(1 << 20, ttl=60, path=path)
+    cache.put(("m", "fresh"), [1.0, 2.0])
+    cache.put(("m", "old"), [3.0], created=1.0)
+    assert cache.get(("m", "old")) is None
+    cache.save()
+
+    reloaded = EmbeddingCache(1 << 20, ttl=60, path=path)
+    reloaded.load()
+    assert np.allclose(reloaded.get(("m", "fresh")), [1.0, 2.0])
+    assert reloaded.get(("m", "old")) is None
+
+
+def test_dimension_comes_from_cached_vectors(backend):
+    asyncio.run(embeddings.embed_texts(["chunk one"]))
+    embeddings._dimensions.clear()
+    asyncio.run(embeddings.embed_texts(["chunk one"]))
+    assert asyncio.run(embeddings.embedding_dimension()) == 3
+    assert len(backend) == 1
+
+
+def test_dimension_from_persisted_cache_without_probe(backend):
+    embeddings.embedding_cache.put(cache_key("stored chunk"), [0.0] * 5)
+    assert asyncio.run(embeddings.embedding_dimension()) == 5
+    assert backend == []
+
+
+def _gather(batcher, texts):
+    async def go():
+        return await asyncio.gather(*(batcher.embed(t) for t in texts), return_exceptions=True)
+    return asyncio.run(go())
+
+
+def test_concurrent_queries_share_one_backend_call(backend):
+    batcher = embeddings.QueryBatcher(max_wait_ms=50, max_batch=32)
+    out = _gather(batcher, ["Refund policy?", "refund  policy?", "Vacation days?"])
+    assert len(backend) == 1 and sorted(backend[0]) == ["Refund policy?", "Vacation days?"]
+    assert out[0] == out[1] == [14.0, 1.0, 0.0]
+    assert batcher.batch_sizes.count == 1
+
+
+def test_full_batch_flushes_before_the_window(backend):
+    batcher = embeddings.QueryBatcher(max_wait_ms=10_000, max_batch=2)
+    _gather(batcher, ["one", "two", "three", "four"])
+    assert [len(call) for call in backend] == [2, 2]
+
+
+def test_backend_error_reaches_every_waiter(backend, monkeypatch):
+    async def fail(texts):
+        raise RuntimeError("embeddings down")
+
+    monkeypatch.setattr(embeddings, "_embed_uncached", fail)
+    batcher = embeddings.QueryBatcher(max_wait_ms=5, max_batch=32)
+    out = _gather(batcher, ["a", "b"])
+    assert all(isinstance(e, RuntimeError) for e in out)
@@ -0,0 +1,45 @@
+from app.local_store import LocalIndex
+from app.main import point_filter
+from app.points import PointFilter
+from app.schemas.schemas_openai import RetrievalFilters
+
+
+def test_time_range_is_inclusive_and_needs_a_timestamp():
+    flt = PointFilter(ingested_after=10.0, ingested_before=20.0)
+    assert flt.matches({"ingested_at": 10.0})
+    assert flt.matches({"ingested_at": 20.0})
+    assert not flt.matches({"ingested_at": 9.9})
+    assert not flt.matches({"ingested_at": 20.1})
+    assert not flt.matches({"source": "a"})
+
+
+def test_sources_and_time_range_combine():
+    flt = PointFilter(sources=("a",), ingested_after=10.0)
+    assert flt.matches({"source": "a", "ingested_at": 11.0})
+    assert not flt.matches({"source": "b", "ingested_at": 11.0})
+    assert not flt.matches({"source": "a", "ingested_at": 5.0})
+
+
+def test_empty_request_filters_mean_no_filter():
+    assert point_filter(None) is None
+    assert point_filter(RetrievalFilters()) is None
+    assert point_filter(RetrievalFilters(sources=["a"])) == PointFilter(sources=("a",))
+
+
+def test_local_index_filters_by_source_and_time():
+    index = LocalIndex()
+    index.create(2)
+    index.upsert(
+        ["old", "new", "other"],
+        [[1.0, 0.0], [0.9, 0.1], [1.0, 0.0]],
+        [
+            {"source": "a", "ingested_at": 1.0},
+            {"source": "a", "ingested_at": 5.0},
+            {"source": "b", "ingested_at": 5.0},
+        ],
+    )
+    ids = lambda flt: [h["id"] for h in index.search_batch([[1.0, 0.0]], 5, flt)[0]]
+    assert ids(PointFilter(sources=("a",))) == ["old", "new"]
+    assert ids(PointFilter(ingested_after=2.0)) == ["other", "new"]
+    assert ids(PointFilter(sources=("a",), ingested_after=2.0)) == ["new"]
+    assert ids(PointFilter(sources=("missing",))) == []
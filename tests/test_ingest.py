@@ -0,0 +1,51 @@
+import asyncio
+
+from app import local_store
+from app.ingest import aiter_list, decode_utf8, ingest_chunks
+
+
+def ingest(source, chunks):
+    return asyncio.run(ingest_chunks(source, aiter_list(chunks), window=2))
+
+
+def stored(source):
+    return {p["text"]: p["chunk_index"] for _, p in local_store.index.payloads(list(local_store.index.source_points(source)))}
+
+
+def test_reingest_diff(store):
+    first = ingest("doc", ["alpha", "bravo", "charlie"])
+    assert (first["upserted"], first["unchanged"], first["deleted"]) == (3, 0, 0)
+
+    same = ingest("doc", ["alpha", "bravo", "charlie"])
+    assert (same["upserted"], same["unchanged"], same["moved"], same["deleted"]) == (0, 3, 0, 0)
+    assert store == ["alpha", "bravo", "charlie"]  # nothing re-embedded
+
+    edited = ingest("doc", ["bravo", "alpha", "delta"])
+    assert (edited["upserted"], edited["moved"], edited["unchanged"], edited["deleted"]) == (1, 2, 0, 1)
+    assert store[-1] == "delta"
+    assert stored("doc") == {"bravo": 0, "alpha": 1, "delta": 2}
+
+
+def test_duplicates_and_other_sources(store):
+    ingest("other", ["alpha"])
+    stats = ingest("doc", ["alpha", "alpha", "bravo"])
+    assert stats["duplicates"] == 1 and stats["upserted"] == 2
+    ingest("doc", ["bravo"])
+    assert stored("other") == {"alpha": 0}
+
+
+def test_empty_input_keeps_the_stored_document(store):
+    ingest("doc", ["alpha", "bravo"])
+    stats = ingest("doc", [])
+    assert stats["deleted"] == 0
+    assert set(stored("doc")) == {"alpha", "bravo"}
+
+
+def test_decode_keeps_characters_split_across_blocks():
+    data = "naïve café — ok".encode("utf-8")
+    blocks = [data[i:i + 1] for i in range(len(data))]
+
+    async def main():
+        return "".join([t async for t in decode_utf8(aiter_list(blocks))])
+
+    assert asyncio.run(main()) == "naïve café — ok"
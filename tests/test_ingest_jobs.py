@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import chunking, jobs
+from app.ingest import aiter_list
+from app.jobs import JobManager
+from app.main import app
+
+# No context manager: lifespan (stores, backends, job workers) is not started.
+client = TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"not json", b'{"source": 5, "text": "x"}', b'{"source": "a"}'],
+)
+def test_invalid_json_body_is_422(body):
+    r = client.post("/admin/ingest_jobs", content=body, headers={"content-type": "application/json"})
+    assert r.status_code == 422
+
+
+def test_empty_text_is_400():
+    r = client.post("/admin/ingest_jobs", json={"source": "a", "text": "  "})
+    assert r.status_code == 400
+
+
+def test_job_decodes_and_chunks_off_the_event_loop(store, tmp_path, monkeypatch):
+    threads = {}
+    feed = chunking._StructuredChunker.feed
+
+    def tracked_feed(self, piece):
+        threads.setdefault("chunking", threading.current_thread())
+        return feed(self, piece)
+
+    monkeypatch.setattr(chunking._StructuredChunker, "feed", tracked_feed)
+    monkeypatch.setattr(chunking, "CHUNKER", "structured")
+    # "é" split across two read blocks still decodes.
+    text = "Café policy.\n\n" + "Twenty days of vacation a year. " * 50
+    monkeypatch.setattr(jobs, "INGEST_READ_BYTES", 4)
+
+    async def main():
+        threads["loop"] = threading.current_thread()
+        manager = JobManager(str(tmp_path), 1)
+        job = await manager.submit("handbook", aiter_list([text.encode("utf-8")]))
+        await manager._run(job)
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == "done" and job.chunks_indexed >= 1
+    assert job.bytes_read == len(text.encode("utf-8"))
+    assert threads["chunking"] is not threads["loop"]
+    assert any("Café" in t for t in store)
@@ -0,0 +1,27 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import main
+
+# No context manager: lifespan (stores, backends, job workers) is not started.
+client = TestClient(main.app)
+
+
+def test_chunking_runs_off_the_event_loop(store, monkeypatch):
+    threads = {}
+    chunk, ingest = main.document_chunks, main.ingest_chunks
+
+    def document_chunks(text):
+        threads["chunking"] = threading.current_thread()
+        return chunk(text)
+
+    async def ingest_chunks(*args, **kwargs):
+        threads["loop"] = threading.current_thread()
+        return await ingest(*args, **kwargs)
+
+    monkeypatch.setattr(main, "document_chunks", document_chunks)
+    monkeypatch.setattr(main, "ingest_chunks", ingest_chunks)
+    r = client.post("/admin/ingest_text", json={"source": "handbook", "text": "Vacation policy.\n\nTwenty days a year."})
+    assert r.status_code == 200 and r.json()["chunks_indexed"] >= 1
+    assert threads["chunking"] is not threads["loop"]
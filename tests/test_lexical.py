@@ -0,0 +1,166 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import lexical, vector_store
+from app.lexical import BM25Index, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    assert tokenize("See ERR-404 now") == ["see", "err-404", "err", "404", "now"]
+
+
+def test_search_ranks_exact_identifier_first(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add("a", "the printer shows ERR-404 when offline")
+    index.add("b", "the printer is online")
+    index.add("c", "an unrelated paragraph")
+    assert index.search("ERR-404", 3)[0][0] == "a"
+    index.save()
+
+    reloaded = BM25Index(str(tmp_path))
+    reloaded.load()
+    assert reloaded.count == 3
+    assert reloaded.search("ERR-404", 3)[0][0] == "a"
+
+
+def test_doc_state_is_updated_in_place(tmp_path):
+    index = BM25Index(str(tmp_path))
+    for i in range(1500):  # past the initial capacity
+        index.add(f"d{i}", f"common words doc{i}")
+    alive, lengths = index._alive, index._lengths
+    index.remove("d7")
+    assert index._alive is alive and not alive[7]
+    assert [doc for doc, _ in index.search("doc7 doc8", 5)] == ["d8"]
+    assert index._alive is alive and index._lengths is lengths
+    index.save()
+    reloaded = BM25Index(str(tmp_path))
+    reloaded.load()
+    reloaded.add("new", "doc8 again")
+    assert sorted(doc for doc, _ in reloaded.search("doc8", 5)) == ["d8", "new"]
+    assert reloaded.count == 1500
+
+
+def _store(points):
+    async def point_count():
+        return len(points)
+
+    async def scroll_texts(batch=1024):
+        yield list(points.items())
+
+    return SimpleNamespace(point_count=point_count, scroll_texts=scroll_texts)
+
+
+def test_sync_rebuilds_missing_and_drops_stale_docs(monkeypatch):
+    index = BM25Index()
+    index.add("gone", "deleted while the API was down")
+    monkeypatch.setattr(vector_store, "lexical_index", index)
+    monkeypatch.setattr(vector_store, "backend", _store({"p1": "vacation policy", "p2": "ERR-404 printer"}))
+
+    asyncio.run(vector_store.sync_lexical())
+
+    assert sorted(index.ids()) == ["p1", "p2"]
+    assert index.search("ERR-404", 1)[0][0] == "p2"
+    status = vector_store.lexical_status()
+    assert status["status"] == "ok" and status["rebuilt_docs"] == 2
+
+
+def test_sync_reports_unreachable_store(monkeypatch):
+    async def point_count():
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(vector_store, "lexical_index", BM25Index())
+    monkeypatch.setattr(vector_store, "backend", SimpleNamespace(point_count=point_count))
+    asyncio.run(vector_store.sync_lexical())
+    assert vector_store.lexical_status()["status"] == "unknown"
+
+
+def _reload(path):
+    index = BM25Index(str(path))
+    index.load()
+    return index
+
+
+def test_saves_add_segments_instead_of_rewriting(tmp_path):
+    index = BM25Index(str(tmp_path))
+    for i in range(8):
+        index.add(f"a{i}", f"alpha doc{i}")
+    index.save()
+    first = (tmp_path / "seg0.docs.npy").read_bytes()
+    index.add("b", "beta")
+    index.save()
+    # The small new segment is written on its own; the first one is untouched.
+    assert (tmp_path / "seg0.docs.npy").read_bytes() == first
+    assert (tmp_path / "seg1.docs.npy").exists()
+    loaded = _reload(tmp_path)
+    assert loaded.count == 9 and loaded.search("beta", 1)[0][0] == "b"
+
+
+def test_segment_count_stays_logarithmic(tmp_path):
+    index = BM25Index(str(tmp_path))
+    for i in range(64):
+        index.add(f"d{i}", f"shared doc{i}")
+        index.save()
+    assert len(index._segments) <= 7
+    assert len(json.loads((tmp_path / "lexicon.json").read_text())["segments"]) == len(index._segments)
+    assert len(list(tmp_path.glob("seg*.docs.npy"))) == len(index._segments)
+    assert len(_reload(tmp_path).search("shared", 100)) == 64
+
+
+def test_deletes_are_logged_and_compacted_past_a_threshold(tmp_path):
+    index = BM25Index(str(tmp_path))
+    for i in range(8):
+        index.add(f"d{i}", f"shared doc{i}")
+    index.save()
+    index.remove("d3")
+    index.save()
+    assert (tmp_path / "deleted.i64.0").stat().st_size == 8
+    loaded = _reload(tmp_path)
+    assert "d3" not in loaded and loaded.search("doc3", 1) == []
+    loaded.remove("d4")
+    loaded.remove("d5")
+    loaded.save()  # 3 of 8 docnos dead: renumbered into one segment
+    assert not (tmp_path / "deleted.i64.0").exists()
+    assert (tmp_path / "deleted.i64.1").stat().st_size == 0
+    again = _reload(tmp_path)
+    assert again.count == 5 and len(again._ids) == 5
+    assert sorted(doc for doc, _ in again.search("shared", 10)) == ["d0", "d1", "d2", "d6", "d7"]
+
+
+def test_load_ignores_files_written_after_the_lexicon(tmp_path, monkeypatch):
+    # A crash before lexicon.json was replaced: the new segment and tombstones are ignored.
+    index = BM25Index(str(tmp_path))
+    index.add("a", "alpha")
+    index.save()
+    index.add("b", "beta")
+    index.remove("a")
+
+    def crash(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(lexical.os, "replace", crash)
+        with pytest.raises(OSError):
+            index.save()
+    loaded = _reload(tmp_path)
+    assert loaded.ids() == ["a"]
+    loaded.add("c", "gamma")
+    loaded.save()
+    assert sorted(_reload(tmp_path).ids()) == ["a", "c"]
+
+
+def test_old_layout_is_loaded_and_migrated(tmp_path):
+    np.save(tmp_path / "postings_docs.npy", np.asarray([0, 1], dtype=np.int32))
+    np.save(tmp_path / "postings_tfs.npy", np.asarray([1, 1], dtype=np.uint16))
+    np.save(tmp_path / "doc_lengths.npy", np.asarray([1, 1], dtype=np.uint32))
+    (tmp_path / "lexicon.json").write_text(
+        json.dumps({"ids": ["a", "b"], "vocab": {"alpha": [0, 1], "beta": [1, 1]}, "postings": 2}), encoding="utf-8"
+    )
+    loaded = _reload(tmp_path)
+    assert loaded.search("beta", 1)[0][0] == "b"
+    loaded.save()
+    assert not (tmp_path / "postings_docs.npy").exists()
+    assert _reload(tmp_path).search("alpha", 1)[0][0] == "a"
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import llm
+from app.llm import LLMScheduler, set_deadline
+
+
+def test_waiters_are_admitted_by_lane_priority():
+    async def main():
+        sched = LLMScheduler(max_concurrency=1, max_queue=0)
+        order = []
+
+        async def run(lane):
+            async with sched.slot(lane):
+                order.append(lane)
+
+        async with sched.slot("long"):
+            tasks = [asyncio.create_task(run(lane)) for lane in ("long", "short", "router")]
+            await asyncio.sleep(0.01)
+            assert sched.queued == 3
+        await asyncio.gather(*tasks)
+        return order, sched
+
+    order, sched = asyncio.run(main())
+    assert order == ["router", "short", "long"]
+    assert sched.stats()["active"] == 0
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def main():
+        sched = LLMScheduler(max_concurrency=1, max_queue=1)
+        async with sched.slot("long"):
+            waiter = asyncio.create_task(sched.slot("long").__aenter__())
+            await asyncio.sleep(0.01)
+            with pytest.raises(HTTPException) as exc:
+                sched.check()
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        return exc.value, sched
+
+    exc, sched = asyncio.run(main())
+    assert exc.status_code == 429
+    assert int(exc.headers["Retry-After"]) >= 1
+    assert sched.counts["shed"] == 1
+
+
+def test_deadline_expires_while_queued():
+    async def main():
+        sched = LLMScheduler(max_concurrency=1, max_queue=0)
+        async with sched.slot("long"):
+
+            async def late():
+                set_deadline(0.05)
+                async with sched.slot("short"):
+                    pass
+
+            with pytest.raises(HTTPException) as exc:
+                await late()
+        return exc.value, sched
+
+    exc, sched = asyncio.run(main())
+    assert exc.status_code == 504
+    assert sched.counts["deadline_expired"] == 1
+    assert sched.stats()["active"] == 0
+
+
+def test_identical_calls_coalesce_only_with_the_same_deadline():
+    async def main():
+        sched = LLMScheduler(max_concurrency=4, max_queue=0)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        payload = {"messages": [{"role": "user", "content": "hi"}]}
+        same = await asyncio.gather(sched.shared(payload, call), sched.shared(payload, call))
+
+        async def with_deadline(seconds):
+            set_deadline(seconds)
+            return await sched.shared(payload, call)
+
+        await asyncio.gather(with_deadline(5), with_deadline(10))
+        return same, calls, sched
+
+    same, calls, sched = asyncio.run(main())
+    assert same == ["ok", "ok"]
+    assert len(calls) == 3
+    assert sched.counts["coalesced"] == 1
+
+
+@pytest.mark.parametrize("status", [429, 504])
+def test_router_does_not_swallow_shedding_or_deadlines(monkeypatch, status):
+    async def complete(lane, payload):
+        raise HTTPException(status_code=status, detail="x")
+
+    monkeypatch.setattr(llm, "_complete", complete)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(llm.route_action("what is 5-10 years"))
+    assert exc.value.status_code == status
+
+
+def test_router_failure_returns_none(monkeypatch):
+    async def complete(lane, payload):
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(llm, "_complete", complete)
+    assert asyncio.run(llm.route_action("what is 5-10 years")) is None
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import llm, main
+from app.answer_cache import AnswerCache
+from app.backends import BackendPool
+from app.llm import SSE_DONE, SSE_ERROR, SSE_ROLE, LLMScheduler, _partial_marker, sse_delta
+from app.schemas.schemas_llm import FinalAnswer
+
+
+def _upstream(monkeypatch, blocks):
+    # Upstream SSE body delivered in exactly these reads.
+    async def body():
+        for block in blocks:
+            yield block
+
+    pool = BackendPool("llm", ["http://llm"], 5, 1, 4)
+    pool.nodes[0]._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body())), base_url="http://llm"
+    )
+    monkeypatch.setattr(llm, "llm_backend", pool)
+    monkeypatch.setattr(llm, "scheduler", LLMScheduler(max_concurrency=1, max_queue=0))
+
+
+def collect(**kwargs):
+    async def main():
+        stream = await llm.chat_stream([{"role": "user", "content": "hi"}], **kwargs)
+        return [chunk async for chunk in stream]
+    return asyncio.run(main())
+
+
+def test_partial_marker_only_matches_a_done_prefix():
+    assert _partial_marker(b'data: {"x":1}\n\ndata: [DO') == len(b"data: [DO")
+    assert _partial_marker(b'data: {"x":1}\n\n') == 0
+    assert _partial_marker(b"data: [DONE") == len(b"data: [DONE")
+
+
+def test_suffix_goes_in_before_a_split_done_marker(monkeypatch):
+    event = sse_delta("Hello")
+    _upstream(monkeypatch, [event + b"data: [DO", b"NE]\n\n"])
+    chunks = collect(final_suffix="\n\nSources: a")
+    body = b"".join(chunks)
+    assert body == event + sse_delta("\n\nSources: a") + SSE_DONE
+    # The complete event is relayed without waiting for the rest of the marker.
+    assert chunks[0] == event
+
+
+def test_early_role_comes_first_and_missing_done_is_added(monkeypatch):
+    _upstream(monkeypatch, [b'data: {"choices":[{"delta":{"content":"x"}}]}'])
+    chunks = collect(early_role=True)
+    assert chunks[0] == SSE_ROLE
+    assert chunks[-1] == SSE_DONE
+    events = [e for e in b"".join(chunks[1:-1]).split(b"\n\n") if e]
+    assert json.loads(events[0][len(b"data: "):])["choices"][0]["delta"]["content"] == "x"
+
+
+@pytest.fixture
+def rag_off(monkeypatch):
+    # Plain (uncited) chat: the router says RAG, but there is no collection to search.
+    async def route(question):
+        return FinalAnswer(type="final", answer="use_rag")
+
+    async def retrieve_hits(question, flt=None):
+        return None
+
+    monkeypatch.setattr(main, "route", route)
+    monkeypatch.setattr(main, "retrieve_hits", retrieve_hits)
+    monkeypatch.setattr(main, "STREAM_EARLY_ROLE", True)
+
+
+def stream_chat(headers=None):
+    body = {"stream": True, "messages": [{"role": "user", "content": "hi"}]}
+    return TestClient(main.app).post("/v1/chat/completions", json=body, headers=headers or {})
+
+
+def test_shed_stream_gets_a_real_429(rag_off, monkeypatch):
+    sched = LLMScheduler(max_concurrency=1, max_queue=1)
+    sched._active = 1
+    sched._queued["long"] = 1
+    monkeypatch.setattr(llm, "scheduler", sched)
+    r = stream_chat()
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) >= 1
+
+
+def test_stream_deadline_expiring_in_the_queue_is_a_504(rag_off, monkeypatch):
+    sched = LLMScheduler(max_concurrency=1, max_queue=0)
+    sched._active = 1
+    monkeypatch.setattr(llm, "scheduler", sched)
+    r = stream_chat({"X-Request-Timeout": "0.05"})
+    assert r.status_code == 504
+
+
+def test_upstream_failure_before_the_first_byte_is_a_502(rag_off, monkeypatch):
+    _upstream(monkeypatch, [])
+    llm.llm_backend.nodes[0]._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(500)), base_url="http://llm"
+    )
+    r = stream_chat()
+    assert r.status_code == 502
+    assert llm.scheduler.stats()["active"] == 0
+
+
+def _failing_upstream(monkeypatch, first):
+    # Sends `first`, then the connection drops.
+    async def body():
+        yield first
+        raise httpx.ReadError("connection reset")
+
+    _upstream(monkeypatch, [])
+    llm.llm_backend.nodes[0]._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body())), base_url="http://llm"
+    )
+
+
+def test_mid_stream_failure_ends_with_an_error_event(monkeypatch):
+    _failing_upstream(monkeypatch, sse_delta("Hel"))
+    chunks = collect(early_role=True)
+    assert chunks[0] == SSE_ROLE and chunks[1] == sse_delta("Hel")
+    assert chunks[-1].endswith(SSE_DONE)
+    error = json.loads(chunks[-1].strip().split(b"\n\n")[0][len(b"data: "):])["error"]
+    assert error["code"] == 502 and "connection reset" in error["message"]
+
+
+def test_failed_stream_is_not_cached(rag_off, monkeypatch):
+    hit = {"id": "p1", "source": "doc", "chunk_index": 0, "text": "Twenty days.", "score": 0.9}
+
+    async def retrieve_hits(question, flt=None):
+        return [1.0, 0.0], [hit]
+
+    monkeypatch.setattr(main, "retrieve_hits", retrieve_hits)
+    monkeypatch.setattr(main, "answer_cache", AnswerCache(max_entries=10, threshold=0.99, ttl=0))
+    _failing_upstream(monkeypatch, sse_delta("Twenty"))
+    r = stream_chat()
+    assert r.status_code == 200
+    assert r.content.endswith(SSE_DONE) and SSE_ERROR in r.content
+    assert main.answer_cache.stats()["entries"] == 0
@@ -0,0 +1,147 @@
+import json
+
+import numpy as np
+
+from app.local_store import LocalIndex
+
+
+def _basis(i, dim=4):
+    vec = [0.0] * dim
+    vec[i] = 1.0
+    return vec
+
+
+def _filled(path=""):
+    index = LocalIndex(path=path)
+    index.create(4, "test-model")
+    index.upsert(
+        ["a", "b", "c"],
+        [_basis(0), _basis(1), [0.9, 0.1, 0.0, 0.0]],
+        [{"source": "x", "text": "a"}, {"source": "y", "text": "b"}, {"source": "x", "text": "c"}],
+    )
+    return index
+
+
+def test_search_ranks_by_cosine():
+    hits = _filled().search_batch([_basis(0)], limit=2)[0]
+    assert [h["id"] for h in hits] == ["a", "c"]
+    assert abs(hits[0]["score"] - 1.0) < 1e-6
+
+
+def test_deleted_points_are_not_returned():
+    index = _filled()
+    index.delete(["a"])
+    assert index.count == 2
+    hits = index.search_batch([_basis(0)], limit=3)[0]
+    assert "a" not in [h["id"] for h in hits]
+    assert index.source_points("x").keys() == {"c"}
+
+
+def test_upsert_replaces_existing_id():
+    index = _filled()
+    index.upsert(["a"], [_basis(2)], [{"source": "x", "text": "a2"}])
+    assert index.count == 3
+    top = index.search_batch([_basis(2)], limit=1)[0][0]
+    assert top["id"] == "a" and top["payload"]["text"] == "a2"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _filled(str(tmp_path))
+    index.delete(["b"])
+    index.save()
+    loaded = LocalIndex(path=str(tmp_path))
+    loaded.load()
+    assert loaded.count == 2
+    assert loaded.dim == 4 and loaded.embedding_model == "test-model"
+    assert [h["id"] for h in loaded.search_batch([_basis(0)], limit=2)[0]] == ["a", "c"]
+    # Writes after a memory-mapped load go to a private copy.
+    loaded.upsert(["d"], [_basis(3)], [{"source": "z"}])
+    assert loaded.count == 3
+
+
+def _reload(path):
+    loaded = LocalIndex(path=str(path))
+    loaded.load()
+    return loaded
+
+
+def test_saves_append_instead_of_rewriting(tmp_path):
+    index = _filled(str(tmp_path))
+    index.save()
+    vectors = tmp_path / "vectors.f32.1"
+    head = vectors.read_bytes()
+    index.upsert(["d"], [_basis(3)], [{"source": "z"}])
+    index.save()
+    assert vectors.read_bytes()[: len(head)] == head
+    assert vectors.stat().st_size == 4 * 4 * 4
+    assert sorted(p.name for p in tmp_path.glob("vectors.*")) == ["vectors.f32.1"]
+    assert _reload(tmp_path).count == 4
+
+
+def test_deletes_and_payload_updates_are_logged(tmp_path):
+    index = _filled(str(tmp_path))
+    index.upsert([f"p{i}" for i in range(8)], [_basis(2)] * 8, [{"source": "w"}] * 8)
+    index.save()
+    index.delete(["b"])
+    index.set_payload("a", {"chunk_index": 7})
+    index.save()
+    assert (tmp_path / "deleted.i64.1").stat().st_size == 8
+    loaded = _reload(tmp_path)
+    assert loaded.count == 10 and "b" not in loaded.source_points("y")
+    assert loaded.payloads(["a"])[0][1]["chunk_index"] == 7
+
+
+def test_compaction_starts_a_new_generation(tmp_path):
+    index = _filled(str(tmp_path))
+    index.save()
+    index.delete(["a", "b"])  # over a quarter of the rows: compacted in memory
+    index.save()
+    assert not (tmp_path / "vectors.f32.1").exists()
+    assert (tmp_path / "vectors.f32.2").stat().st_size == 4 * 4
+    assert [h["id"] for h in _reload(tmp_path).search_batch([_basis(0)], limit=3)[0]] == ["c"]
+
+
+def test_load_ignores_bytes_appended_after_meta(tmp_path):
+    # A crash between appending and writing meta.json: the tail is ignored, then overwritten.
+    index = _filled(str(tmp_path))
+    index.save()
+    with open(tmp_path / "payloads.jsonl.1", "a", encoding="utf-8") as f:
+        f.write('{"id": "torn", "payload": {}}\n')
+    with open(tmp_path / "vectors.f32.1", "ab") as f:
+        f.write(b"\x00" * 10)
+    loaded = _reload(tmp_path)
+    assert loaded.count == 3
+    loaded.upsert(["d"], [_basis(3)], [{"source": "z"}])
+    loaded.save()
+    assert _reload(tmp_path).count == 4
+
+
+def test_old_layout_is_loaded_and_migrated(tmp_path):
+    np.save(tmp_path / "vectors.npy", np.asarray([_basis(0), _basis(1)], dtype=np.float32))
+    (tmp_path / "payloads.jsonl").write_text(
+        '{"id": "a", "payload": {"source": "x"}}\n{"id": "b", "payload": {"source": "y"}}\n', encoding="utf-8"
+    )
+    (tmp_path / "meta.json").write_text(json.dumps({"dim": 4, "count": 2, "ivf": False}), encoding="utf-8")
+    loaded = _reload(tmp_path)
+    assert loaded.count == 2
+    loaded.save()
+    assert not (tmp_path / "vectors.npy").exists()
+    assert _reload(tmp_path).search_batch([_basis(1)], limit=1)[0][0]["id"] == "b"
+
+
+def test_ivf_search_matches_exact_top_hit():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(512, 16)).astype(np.float32)
+    ids = [str(i) for i in range(len(vectors))]
+    payloads = [{"source": "s"} for _ in ids]
+    exact = LocalIndex()
+    exact.create(16)
+    exact.upsert(ids, vectors.tolist(), payloads)
+    ivf = LocalIndex(ivf_lists=4, ivf_probes=4)
+    ivf.create(16)
+    ivf.upsert(ids, vectors.tolist(), payloads)
+    assert ivf._centroids is not None
+    queries = vectors[:5].tolist()
+    # Probing every list is exhaustive, so IVF must agree with the exact scan.
+    for a, b in zip(exact.search_batch(queries, 3), ivf.search_batch(queries, 3)):
+        assert [h["id"] for h in a] == [h["id"] for h in b]
@@ -0,0 +1,57 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+from app.metrics import Histogram
+
+
+def test_bucket_bounds_are_inclusive_with_overflow():
+    hist = Histogram([1, 10])
+    for value in (0.5, 1, 5, 10, 50):
+        hist.observe(value)
+    assert hist.counts == [2, 2, 1]
+    assert hist.to_dict()["buckets"] == {"<=1": 2, "<=10": 2, ">10": 1}
+
+
+def test_prometheus_buckets_are_cumulative_and_scaled():
+    hist = Histogram([100, 1000])
+    for value in (50, 500, 5000):
+        hist.observe(value)
+    lines = hist.prometheus("x_seconds", 'stage="a"', scale=0.001)
+    assert lines == [
+        'x_seconds_bucket{stage="a",le="0.1"} 1',
+        'x_seconds_bucket{stage="a",le="1"} 2',
+        'x_seconds_bucket{stage="a",le="+Inf"} 3',
+        'x_seconds_sum{stage="a"} 5.55',
+        'x_seconds_count{stage="a"} 3',
+    ]
+
+
+def test_stages_recorded_in_spawned_tasks_reach_the_request_trace(monkeypatch):
+    monkeypatch.setattr(metrics, "_stages", {})
+
+    async def embed():
+        metrics.observe_stage("embed", 3.0)
+
+    async def request():
+        trace = metrics.start_trace()
+        with metrics.stage("retrieve"):
+            pass
+        await asyncio.create_task(embed())
+        metrics.observe_stage("llm", 12.0)
+        return trace
+
+    trace = asyncio.run(request())
+    assert set(trace) == {"retrieve", "embed", "llm"}
+    assert metrics.server_timing({"llm": 12.0}) == "llm;dur=12.0"
+    assert 'stage="embed"' in metrics.render_prometheus()
+
+
+def test_metrics_endpoint_serves_text_exposition():
+    r = TestClient(app).get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "# TYPE rag_stage_duration_seconds histogram" in r.text
+    assert "rag_embed_query_batch_size_count" in r.text
@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import migrate_collection
+
+
+class FakeQdrant:
+    # Collections are name -> point count; aliases are alias -> collection.
+    def __init__(self, collections, aliases=None):
+        self.collections = dict(collections)
+        self.aliases = dict(aliases or {})
+
+    async def get_collections(self):
+        return SimpleNamespace(collections=[SimpleNamespace(name=n) for n in self.collections])
+
+    async def get_aliases(self):
+        return SimpleNamespace(
+            aliases=[SimpleNamespace(alias_name=a, collection_name=c) for a, c in self.aliases.items()]
+        )
+
+    async def update_collection_aliases(self, change_aliases_operations):
+        for op in change_aliases_operations:
+            if getattr(op, "delete_alias", None):
+                del self.aliases[op.delete_alias.alias_name]
+            else:
+                assert op.create_alias.alias_name not in self.collections
+                self.aliases[op.create_alias.alias_name] = op.create_alias.collection_name
+
+    async def delete_collection(self, name):
+        del self.collections[name]
+
+    async def count(self, collection_name, exact=True):
+        return SimpleNamespace(count=self.collections[collection_name])
+
+
+@pytest.fixture
+def qdrant(monkeypatch):
+    def make(collections, aliases=None):
+        fake = FakeQdrant(collections, aliases)
+        monkeypatch.setattr(migrate_collection, "client", fake)
+        monkeypatch.setattr(migrate_collection, "SOURCE", "docs")
+
+        async def rebuild(src, dst, size, model):
+            fake.collections[dst] = fake.collections[src]
+            return fake.collections[dst]
+
+        monkeypatch.setattr(migrate_collection, "rebuild", rebuild)
+        return fake
+    return make
+
+
+def test_plain_collection_is_moved_behind_an_alias(qdrant):
+    fake = qdrant({"docs": 10})
+    result = asyncio.run(migrate_collection.rebuild_in_place("docs", 4, "m"))
+    assert result["target"] == "docs__v1"
+    assert fake.collections == {"docs__v1": 10} and fake.aliases == {"docs": "docs__v1"}
+
+
+def test_aliased_collection_is_swapped_without_a_gap(qdrant):
+    fake = qdrant({"docs__v1": 10}, {"docs": "docs__v1"})
+    assert asyncio.run(migrate_collection.recover()) == ("docs__v1", False)
+    asyncio.run(migrate_collection.rebuild_in_place("docs__v1", 4, "m"))
+    assert fake.collections == {"docs__v2": 10} and fake.aliases == {"docs": "docs__v2"}
+
+
+def test_interrupted_copy_back_resumes_from_the_rebuild_copy(qdrant):
+    # The older script deleted "docs" and died while copying back from docs__rebuild.
+    fake = qdrant({"docs": 3, "docs__rebuild": 10})
+    assert asyncio.run(migrate_collection.recover()) == ("docs__rebuild", True)
+    assert fake.collections == {"docs__rebuild": 10} and fake.aliases == {"docs": "docs__rebuild"}
+
+
+def test_crash_between_delete_and_alias_is_resumed(qdrant):
+    fake = qdrant({"docs__v1": 10})
+    assert asyncio.run(migrate_collection.recover()) == ("docs__v1", True)
+    assert fake.aliases == {"docs": "docs__v1"}
+
+
+def test_interrupted_copies_are_dropped(qdrant):
+    fake = qdrant({"docs": 10, "docs__v1": 4})
+    assert asyncio.run(migrate_collection.recover()) == ("docs", False)
+    assert fake.collections == {"docs": 10} and fake.aliases == {}
+    fake = qdrant({"docs__v2": 10, "docs__v3": 4}, {"docs": "docs__v2"})
+    assert asyncio.run(migrate_collection.recover()) == ("docs__v2", False)
+    assert fake.collections == {"docs__v2": 10}
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import BinaryQuantization, ScalarQuantization
+
+from app import qdrant_store
+
+
+def test_default_layout_leaves_server_defaults():
+    layout = qdrant_store.collection_layout(384)
+    assert layout["vectors_config"].size == 384
+    assert layout["vectors_config"].on_disk is None
+    assert layout["hnsw_config"] is None and layout["quantization_config"] is None
+    assert qdrant_store.search_params() is None
+
+
+def test_scalar_quantization_with_on_disk_vectors(monkeypatch):
+    monkeypatch.setattr(qdrant_store, "QDRANT_QUANTIZATION", "scalar")
+    monkeypatch.setattr(qdrant_store, "QDRANT_ON_DISK_VECTORS", True)
+    monkeypatch.setattr(qdrant_store, "QDRANT_HNSW_M", 32)
+    layout = qdrant_store.collection_layout(384)
+    assert isinstance(layout["quantization_config"], ScalarQuantization)
+    assert layout["vectors_config"].on_disk is True
+    assert layout["hnsw_config"].m == 32 and layout["hnsw_config"].ef_construct is None
+    params = qdrant_store.search_params()
+    assert params.quantization.rescore == qdrant_store.QDRANT_RESCORE
+    assert params.quantization.oversampling == qdrant_store.QDRANT_OVERSAMPLING
+
+
+def test_binary_quantization_and_search_ef(monkeypatch):
+    monkeypatch.setattr(qdrant_store, "QDRANT_QUANTIZATION", "binary")
+    monkeypatch.setattr(qdrant_store, "QDRANT_HNSW_EF", 128)
+    assert isinstance(qdrant_store.collection_layout(8)["quantization_config"], BinaryQuantization)
+    assert qdrant_store.search_params().hnsw_ef == 128
+
+
+# In-memory Qdrant accepts payload indexes but ignores them.
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+def test_create_collection_records_model_and_layout(monkeypatch):
+    monkeypatch.setattr(qdrant_store, "client", AsyncQdrantClient(location=":memory:"))
+    monkeypatch.setattr(qdrant_store, "_meta", {})
+    monkeypatch.setattr(qdrant_store, "_semaphore", None)
+
+    async def main():
+        await qdrant_store.create_collection(qdrant_store.QDRANT_COLLECTION, 8, "test-model")
+        return await qdrant_store.collection_meta()
+
+    meta = asyncio.run(main())
+    assert meta["exists"] and meta["vector_size"] == 8 and meta["embedding_model"] == "test-model"
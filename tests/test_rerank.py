@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import httpx
+import numpy as np
+
+from app import rerank
+from app.backends import BackendPool
+from app.lexical import tokenize
+from app.tokens import estimate_tokens
+
+HITS = [
+    {"id": "a", "score": 0.9, "text": "cats sleep all day"},
+    {"id": "b", "score": 0.8, "text": "cats sleep all day long"},
+    {"id": "c", "score": 0.7, "text": "refund policy for damaged orders"},
+]
+
+
+def run(question, hits, k):
+    return asyncio.run(rerank.rerank(question, hits, k))
+
+
+def test_none_mode_truncates_without_reordering(monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_MODE", "none")
+    assert rerank.candidate_limit(3) == 3
+    assert run("refund", HITS, 2) == HITS[:2]
+
+
+def test_lexical_mode_promotes_query_term_coverage(monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_MODE", "lexical")
+    monkeypatch.setattr(rerank, "RERANK_LEXICAL_WEIGHT", 0.5)
+    monkeypatch.setattr(rerank, "RERANK_MAX_TOKENS", 0)
+    kept = run("refund policy", HITS, 2)
+    assert kept[0]["id"] == "c"
+    assert all("rerank_score" in h for h in kept)
+
+
+def test_mmr_skips_near_duplicates(monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_MODE", "mmr")
+    monkeypatch.setattr(rerank, "RERANK_MMR_LAMBDA", 0.5)
+    monkeypatch.setattr(rerank, "RERANK_MAX_TOKENS", 0)
+    kept = run("cats", HITS, 2)
+    assert [h["id"] for h in kept] == ["a", "c"]
+
+
+def test_token_budget_always_keeps_the_top_hit(monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_MODE", "lexical")
+    monkeypatch.setattr(rerank, "RERANK_MAX_TOKENS", estimate_tokens(HITS[0]["text"]) - 1)
+    kept = run("cats", HITS, 3)
+    assert [h["id"] for h in kept] == ["a"]
+
+
+def _pool(handler):
+    pool = BackendPool("rerank", ["http://rerank"], 5, 1, 4)
+    pool.nodes[0]._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://rerank")
+    return pool
+
+
+def test_cross_encoder_scores_in_batches(monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_MODE", "cross_encoder")
+    monkeypatch.setattr(rerank, "RERANK_BATCH_SIZE", 2)
+    monkeypatch.setattr(rerank, "RERANK_MAX_TOKENS", 0)
+    batches = []
+
+    def handler(request):
+        docs = json.loads(request.content)["documents"]
+        batches.append(docs)
+        # Later documents in a batch score higher, so the order differs from retrieval order.
+        return httpx.Response(200, json={"results": [{"index": i, "relevance_score": float(i)} for i in range(len(docs))]})
+
+    monkeypatch.setattr(rerank, "embeddings_backend", _pool(handler))
+    kept = run("cats", HITS, 3)
+    assert sorted(len(b) for b in batches) == [1, 2]
+    assert [h["id"] for h in kept] == ["b", "a", "c"]
+
+
+def test_cross_encoder_failure_falls_back_to_lexical(monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_MODE", "cross_encoder")
+    monkeypatch.setattr(rerank, "RERANK_MAX_TOKENS", 0)
+    monkeypatch.setattr(rerank, "embeddings_backend", _pool(lambda request: httpx.Response(500)))
+    term_sets = [set(tokenize(h["text"])) for h in HITS]
+    expected = sorted(rerank._lexical_scores("cats", HITS, term_sets), reverse=True)
+    assert np.allclose([h["rerank_score"] for h in run("cats", HITS, 3)], expected)
@@ -0,0 +1,65 @@
+import asyncio
+
+from app import retrieval
+from app.ingest import aiter_list, ingest_chunks
+from app.points import PointFilter
+from conftest import fake_vector
+
+
+def ingest(source, chunks):
+    asyncio.run(ingest_chunks(source, aiter_list(chunks)))
+
+
+def search(question, limit=3, flt=None):
+    return asyncio.run(retrieval.hybrid_search(question, fake_vector(question), limit, flt))
+
+
+DOCS = [
+    "The vacation policy grants twenty days per year.",
+    "Printers report error ERR-404 when the queue is offline.",
+    "Expense reports are approved by the line manager.",
+    "Vacation requests go through the HR portal.",
+]
+
+
+def test_exact_identifier_wins_through_bm25(store):
+    ingest("handbook", DOCS)
+    hits = search("ERR-404")
+    assert "ERR-404" in hits[0]["text"]
+    assert hits[0]["lexical_score"] > 0
+
+
+def test_strong_bm25_match_passes_the_threshold():
+    assert retrieval.passes_threshold({"score": 0.1, "lexical_score": retrieval.HYBRID_MIN_BM25}, 0.9)
+    assert not retrieval.passes_threshold({"score": 0.1, "lexical_score": 1.0}, 0.9)
+
+
+def test_rrf_sums_weighted_reciprocal_ranks(store):
+    ingest("handbook", DOCS)
+    question = "vacation policy days"
+    k, n = retrieval.HYBRID_RRF_K, retrieval.HYBRID_CANDIDATES
+    expected = {}
+    dense = asyncio.run(retrieval.search(fake_vector(question), limit=n))
+    for rank, h in enumerate(dense, start=1):
+        expected[h["id"]] = retrieval.HYBRID_VECTOR_WEIGHT / (k + rank)
+    for rank, (pid, _) in enumerate(retrieval.lexical_index.search(question, n), start=1):
+        expected[pid] = expected.get(pid, 0.0) + retrieval.HYBRID_LEXICAL_WEIGHT / (k + rank)
+
+    hits = search(question, limit=4)
+    assert [h["id"] for h in hits] == sorted(expected, key=expected.__getitem__, reverse=True)[:4]
+    for h in hits:
+        assert abs(h["rrf_score"] - expected[h["id"]]) < 1e-12
+
+
+def test_filter_applies_to_lexical_only_hits(store):
+    ingest("handbook", DOCS)
+    ingest("tickets", ["Ticket 7: ERR-404 again on floor 3."])
+    hits = search("ERR-404", limit=5, flt=PointFilter(sources=("tickets",)))
+    assert [h["source"] for h in hits] == ["tickets"]
+
+
+def test_dense_only_when_the_lexical_index_is_empty(store, monkeypatch):
+    ingest("handbook", DOCS)
+    retrieval.lexical_index.__init__()
+    hits = search("ERR-404")
+    assert hits and all("rrf_score" not in h for h in hits)
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app import router
+from app.schemas.schemas_llm import FinalAnswer, ToolCall
+
+
+@pytest.mark.parametrize("question", ["what is 4+3*2", "calculate (2+3)*4", "12 / 4"])
+def test_classify_plain_math_goes_to_calc(question):
+    action = router.classify(question)
+    assert isinstance(action, ToolCall)
+    assert action.tool == "calc"
+
+
+@pytest.mark.parametrize("question", ["What is the reporting policy?", "Release 1.2.3 notes"])
+def test_classify_non_math_goes_to_rag(question):
+    assert isinstance(router.classify(question), FinalAnswer)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "How many vacation days for 5-10 years of service?",
+        "Is the 2023-2024 budget approved?",
+    ],
+)
+def test_router_rag_verdict_is_honored(monkeypatch, question):
+    calls = []
+
+    async def fake_route_action(q):
+        calls.append(q)
+        return FinalAnswer(type="final", answer="use_rag")
+
+    monkeypatch.setattr(router, "route_action", fake_route_action)
+    assert router.classify(question) is None
+    action = asyncio.run(router.route(question))
+    assert calls == [question]
+    assert isinstance(action, FinalAnswer)
+
+
+def test_router_failure_falls_back_to_calc(monkeypatch):
+    async def failed_route_action(q):
+        return None
+
+    monkeypatch.setattr(router, "route_action", failed_route_action)
+    action = asyncio.run(router.route("How many vacation days for 5-10 years of service?"))
+    assert isinstance(action, ToolCall)
+    assert action.args["expression"] == "5-10"
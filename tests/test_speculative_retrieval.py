@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.answer_cache import AnswerCache
+from app.schemas.schemas_llm import FinalAnswer, ToolCall
+
+# No context manager: lifespan (stores, backends, job workers) is not started.
+client = TestClient(main.app)
+
+HIT = {"id": "p1", "source": "doc", "chunk_index": 0, "text": "Twenty days of vacation.", "score": 0.9}
+
+
+@pytest.fixture
+def events(monkeypatch):
+    # The router waits (briefly) for retrieval to start, then answers with `decision`.
+    log = {"events": [], "decision": FinalAnswer(type="final", answer="use_rag")}
+
+    async def route(question):
+        log["events"].append("route_start")
+        for _ in range(20):
+            if "retrieve_start" in log["events"]:
+                break
+            await asyncio.sleep(0.005)
+        log["events"].append("route_end")
+        return log["decision"]
+
+    async def retrieve_hits(question, flt=None):
+        log["events"].append("retrieve_start")
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            log["events"].append("retrieve_cancelled")
+            raise
+        return [1.0, 0.0], [HIT]
+
+    async def llama_chat(messages, max_tokens=300, temperature=0.2):
+        return "Twenty days."
+
+    monkeypatch.setattr(main, "route", route)
+    monkeypatch.setattr(main, "retrieve_hits", retrieve_hits)
+    monkeypatch.setattr(main, "llama_chat", llama_chat)
+    monkeypatch.setattr(main, "answer_cache", AnswerCache(max_entries=10, threshold=0.99, ttl=0))
+    return log
+
+
+def ask(question):
+    r = client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": question}]})
+    assert r.status_code == 200
+    return r.json()["choices"][0]["message"]["content"]
+
+
+def test_retrieval_overlaps_the_router(events, monkeypatch):
+    monkeypatch.setattr(main, "SPECULATIVE_RETRIEVAL", True)
+    answer = ask("How many vacation days?")
+    assert events["events"].index("retrieve_start") < events["events"].index("route_end")
+    assert answer.startswith("Twenty days.") and "doc#chunk0" in answer
+
+
+def test_tool_call_cancels_the_speculative_retrieval(events, monkeypatch):
+    monkeypatch.setattr(main, "SPECULATIVE_RETRIEVAL", True)
+    events["decision"] = ToolCall(type="tool_call", tool="calc", args={"expression": "2+3"})
+    assert ask("2+3 and something else") == "The result is 5"
+    assert "retrieve_cancelled" in events["events"]
+
+
+def test_disabled_retrieval_waits_for_the_router(events, monkeypatch):
+    monkeypatch.setattr(main, "SPECULATIVE_RETRIEVAL", False)
+    ask("How many vacation days?")
+    assert events["events"] == ["route_start", "route_end", "retrieve_start"]
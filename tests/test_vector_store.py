@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import vector_store
+from app.config import EMBEDDINGS_MODEL
+
+
+def _meta(monkeypatch, meta=None, error=None, dim=16):
+    async def collection_meta(refresh=False):
+        if error is not None:
+            raise error
+        return meta
+
+    async def embedding_dimension():
+        return dim
+
+    monkeypatch.setattr(vector_store, "collection_meta", collection_meta)
+    monkeypatch.setattr(vector_store, "embedding_dimension", embedding_dimension)
+
+
+def test_unreachable_store_does_not_block_startup(monkeypatch):
+    _meta(monkeypatch, error=httpx.ConnectError("All connection attempts failed"))
+    asyncio.run(vector_store.check_embedding_model())
+
+
+def test_model_mismatch_fails_startup(monkeypatch):
+    _meta(monkeypatch, {"exists": True, "vector_size": 16, "embedding_model": "other-model"})
+    with pytest.raises(RuntimeError, match="other-model"):
+        asyncio.run(vector_store.check_embedding_model())
+
+
+def test_dimension_mismatch_fails_startup(monkeypatch):
+    _meta(monkeypatch, {"exists": True, "vector_size": 768, "embedding_model": EMBEDDINGS_MODEL}, dim=16)
+    with pytest.raises(RuntimeError, match="768-dim"):
+        asyncio.run(vector_store.check_embedding_model())